@@ -1,67 +1,195 @@
 # uvicorn app:app --host localhost --port 7860 --reload
 from datetime import datetime
+import json
 import os
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    Form,
+    Query,
+    Request,
+    UploadFile,
+    HTTPException,
+    status,
+)
+from typing import Any, Generic, List, Optional, TypeVar
 from pydantic import BaseModel
-from queue import Queue
-import threading
-import sqlite3
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+
+from cache import (
+    cacheado_async,
+    cerrar_cache,
+    get_cache,
+    invalidar_al_confirmar,
+    invalidar_tareas,
+    tareas_afectadas,
+)
+from conexion import (
+    DatabaseConnectionAsync,
+    cerrar_pool_async,
+    get_pool_async,
+)
+from archivos import (
+    DIRECTORIO_PDF,
+    ArchivoDemasiadoGrande,
+    guardar_blob,
+    huella_servida,
+    nombre_seguro,
+    preparar_directorios,
+    recibir_archivo,
+    respuesta_archivo,
+    ruta_disponible,
+    soltar_archivo_entrega,
+)
+from compactacion import (
+    cerrar_compactador,
+    compactar,
+    get_compactador,
+    ultima_compactacion,
+)
+from consultas import (
+    EXPORTABLES,
+    LIMITE_MAXIMO,
+    LIMITE_POR_DEFECTO,
+    TABLAS,
+    ConsultaInvalida,
+    buscar_entregas_json,
+    buscar_tareas_json,
+    cambios_json,
+    exportar_ndjson,
+    filas_json,
+    filtros_de,
+    listar_json,
+    objeto_json,
+    pares_json,
+)
+from escritor import cerrar_escritor, get_escritor
+from eventos import cerrar_broker, get_broker, publicar_al_confirmar, respuesta_eventos
+from extraccion import (
+    cerrar_extractor,
+    errores_definitivos,
+    extraer_al_confirmar,
+    get_extractor,
+    metricas_extraccion,
+    reintentar_errores,
+)
+from importacion import ArchivoInvalido, importar_roster, leer_roster
+from lotes import (
+    LoteInvalido,
+    actualizar_lote,
+    eliminar_lote,
+    insertar_lote,
+    resultados_actualizacion,
+    resultados_insercion,
+    resultados_por_id,
+    revisar_ids,
+    validar_lote,
+)
+from migraciones import migrar, reconstruir_estados
+from seguridad import (
+    HASH_FICTICIO,
+    Sesion,
+    cerrar_seguridad,
+    emitir_token,
+    es_hash,
+    get_revocaciones,
+    hashear_async,
+    hashear_lote_async,
+    revocar,
+    usuario_actual,
+    verificar_async,
+)
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # aplicar las migraciones pendientes antes de atender peticiones; con
+    # gunicorn ya las aplicó el maestro (gunicorn.conf.py) y esto no hace nada
+    preparar_directorios()
+    migrar()
+    get_escritor()
+    get_cache()
+    get_broker()
+    get_pool_async()
+    get_compactador()
+    get_extractor()
+    get_revocaciones()
+    yield
+    cerrar_broker()
+    cerrar_compactador()
+    cerrar_extractor()
+    cerrar_seguridad()
+    cerrar_escritor()
+    cerrar_cache()
+    cerrar_pool_async()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
+app = FastAPI(lifespan=lifespan)
 
-class DatabaseConnection:
-    _instance = None
-    _lock = threading.Lock()
-    _connection_pool = Queue(maxsize=5)
-    _database_name = "colegio.db"
 
-    def __new__(cls):
-        with cls._lock:
-            if cls._instance is None:
-                cls._instance = super().__new__(cls)
-                cls._instance.conn = cls._instance._create_connection()
-        return cls._instance
+class RespuestaJSON(JSONResponse):
+    """
+    Respuesta JSON que acepta el cuerpo ya serializado (texto o bytes), como
+    lo devuelven listar_json y filas_json: no pasa por jsonable_encoder ni
+    por json.dumps. Cualquier otro contenido se serializa como siempre.
+    """
+
+    def render(self, content):
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        if isinstance(content, bytes):
+            return content
+        return super().render(content)
 
-    def _create_connection(self):
-        if not self._connection_pool.empty():
-            return self._connection_pool.get()
-        else:
-            connection = sqlite3.connect(self._database_name)
-            connection.row_factory = sqlite3.Row
-            return connection
 
-    def __enter__(self):
-        self.conn = self._create_connection()
-        return self.conn
+Modelo = TypeVar("Modelo")
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        self.release_connection()
 
-    def release_connection(self):
-        if self._instance is not None:
-            self._connection_pool.put(self._instance.conn)
-            self._instance.conn = None
+# forma de los listados paginados, para la documentación de la API
+class Pagina(BaseModel, Generic[Modelo]):
+    datos: List[Modelo]
+    next_cursor: Optional[int] = None
+
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 # saludo
 @app.get("/")
-def read_root():
+async def read_root():
     return {"mensaje": "Bienvenido a la API del colegio JPC 2023"}
 
 
+# metricas de acceso a la base de datos
+@app.get("/metricas")
+async def get_metricas():
+    """
+    Obtener las métricas del pool de conexiones, del escritor, de la caché y
+    de los streams de eventos, el resumen de la última compactación y los
+    archivos cuyo texto extrajo este proceso.
+    """
+    return {
+        "pool": get_pool_async().metricas(),
+        "escritor": get_escritor().metricas(),
+        "cache": get_cache().metricas(),
+        "compactacion": ultima_compactacion(),
+        "sesiones": get_revocaciones().metricas(),
+        "eventos": get_broker().metricas(),
+        "extraccion": metricas_extraccion(),
+    }
+
+
 """
 CREATE TABLE Usuarios (
   idusuario INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -73,21 +201,42 @@ CREATE TABLE Usuarios (
 
 
 # metodos GET, POST, PUT, DELETE para la tabla Usuarios
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class UsuarioSalida(BaseModel):
+    idusuario: int
+    dni: Optional[str] = None
+    rol: Optional[str] = None
+
+
 # get
-@app.get("/usuarios")
-def get_usuarios():
+@app.get("/usuarios", responses={200: {"model": Pagina[UsuarioSalida]}})
+async def get_usuarios(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todos los usuarios.
+    Obtener los usuarios paginados por idusuario.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Usuarios")
-            usuarios = cursor.fetchall()
-            if usuarios is None:
-                return []
-            else:
-                return usuarios
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Usuarios",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Usuarios", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -106,19 +255,16 @@ class Usuario(BaseModel):
 
 # post
 @app.post("/usuarios")
-def post_usuario(usuario: Usuario):
+async def post_usuario(usuario: Usuario):
     """
     Crear un nuevo usuario.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO Usuarios (dni, contrasena, rol) VALUES (?, ?, ?)",
-                (usuario.dni, usuario.contrasena, usuario.rol),
-            )
-            conn.commit()
-            return {"mensaje": "Usuario creado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "INSERT INTO Usuarios (dni, contrasena, rol) VALUES (?, ?, ?)",
+            (usuario.dni, await hashear_async(usuario.contrasena), usuario.rol),
+        )
+        return {"mensaje": "Usuario creado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -135,21 +281,125 @@ class UsuarioUpdate(BaseModel):
     rol: str
 
 
+# clase model para el PUT por lotes
+class UsuarioLote(UsuarioUpdate):
+    """
+    Modelo para la actualización por lotes de un usuario.
+    """
+
+    idusuario: int
+
+
+# post por lotes
+@app.post("/usuarios/bulk")
+async def post_usuarios_bulk(usuarios: List[Any]):
+    """
+    Crear varios usuarios en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con el id creado o el error.
+    """
+    try:
+        validos, errores = validar_lote(Usuario, usuarios)
+        hashes = await hashear_lote_async(
+            [usuario.contrasena for _, usuario in validos]
+        )
+        ids = await get_escritor().ejecutar_async(
+            insertar_lote,
+            "Usuarios",
+            ("dni", "contrasena", "rol"),
+            [
+                (usuario.dni, huella, usuario.rol)
+                for (_, usuario), huella in zip(validos, hashes)
+            ],
+        )
+        return {
+            "mensaje": "Usuarios procesados",
+            "resultados": resultados_insercion(validos, errores, ids),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# put por lotes
+@app.put("/usuarios/bulk")
+async def put_usuarios_bulk(usuarios: List[Any]):
+    """
+    Actualizar varios usuarios en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con su id o el error.
+    """
+    try:
+        validos, errores = validar_lote(UsuarioLote, usuarios)
+        hashes = await hashear_lote_async(
+            [usuario.contrasena for _, usuario in validos]
+        )
+        existentes = await get_escritor().ejecutar_async(
+            actualizar_lote,
+            "Usuarios",
+            ("dni", "contrasena", "rol"),
+            [
+                (usuario.dni, huella, usuario.rol, usuario.idusuario)
+                for (_, usuario), huella in zip(validos, hashes)
+            ],
+        )
+        return {
+            "mensaje": "Usuarios actualizados",
+            "resultados": resultados_actualizacion(
+                validos,
+                errores,
+                [usuario.idusuario for _, usuario in validos],
+                existentes,
+            ),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# delete por lotes
+@app.delete("/usuarios/bulk")
+async def delete_usuarios_bulk(ids: List[int] = Query(...)):
+    """
+    Eliminar varios usuarios por lista de ids (`?ids=1&ids=2`).
+    """
+    try:
+        ids = revisar_ids(ids)
+        existentes = await get_escritor().ejecutar_async(eliminar_lote, "Usuarios", ids)
+        return {
+            "mensaje": "Usuarios eliminados",
+            "resultados": resultados_por_id(ids, existentes),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
 # put
 @app.put("/usuarios/{idusuario}")
-def put_usuario(idusuario: int, usuario: UsuarioUpdate):
+async def put_usuario(idusuario: int, usuario: UsuarioUpdate):
     """
     Actualizar un usuario.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE Usuarios SET dni = ?, contrasena = ?, rol = ? WHERE idusuario = ?",
-                (usuario.dni, usuario.contrasena, usuario.rol, idusuario),
-            )
-            conn.commit()
-            return {"mensaje": "Usuario actualizado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "UPDATE Usuarios SET dni = ?, contrasena = ?, rol = ? WHERE idusuario = ?",
+            (
+                usuario.dni,
+                await hashear_async(usuario.contrasena),
+                usuario.rol,
+                idusuario,
+            ),
+        )
+        return {"mensaje": "Usuario actualizado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -157,16 +407,15 @@ def put_usuario(idusuario: int, usuario: UsuarioUpdate):
 
 # delete
 @app.delete("/usuarios/{idusuario}")
-def delete_usuario(idusuario: int):
+async def delete_usuario(idusuario: int):
     """
     Eliminar un usuario.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM Usuarios WHERE idusuario = ?", (idusuario,))
-            conn.commit()
-            return {"mensaje": "Usuario eliminado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "DELETE FROM Usuarios WHERE idusuario = ?", (idusuario,)
+        )
+        return {"mensaje": "Usuario eliminado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -181,24 +430,92 @@ class Login(BaseModel):
     contrasena: str
 
 
+def _rehashear(conn, idusuario, anterior, nuevo):
+    # solo si nadie cambió la contraseña mientras tanto
+    conn.execute(
+        "UPDATE Usuarios SET contrasena = ? WHERE idusuario = ? AND contrasena = ?",
+        (nuevo, idusuario, anterior),
+    )
+
+
 # login
 @app.post("/login")
-def login(login: Login):
+async def login(login: Login):
     """
     Login de un usuario.
+
+    Verifica la contraseña contra su hash (en el pool de hashing, fuera
+    del event loop) y devuelve los datos del usuario con un token de
+    sesión firmado. Los endpoints autenticados lo reciben en
+    `Authorization: Bearer <token>` y lo validan sin consultar la base.
+    Las contraseñas que seguían en texto plano se reemplazan por su hash.
+    Con un DNI o una contraseña incorrectos responde 401.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM Usuarios WHERE dni = ? AND contrasena = ?",
-                (login.dni, login.contrasena),
+        async with DatabaseConnectionAsync() as conn:
+            candidatos = await conn.fetchall(
+                "SELECT idusuario, dni, contrasena, rol FROM Usuarios WHERE dni = ?",
+                (login.dni,),
             )
-            usuario = cursor.fetchone()
-            if usuario is None:
-                raise HTTPException(status_code=404, detail="Usuario no encontrado")
-            else:
-                return usuario
+        usuario = None
+        for candidato in candidatos:
+            if await verificar_async(login.contrasena, candidato["contrasena"]):
+                usuario = candidato
+                break
+        if not candidatos:
+            await verificar_async(login.contrasena, HASH_FICTICIO)
+        if usuario is None:
+            # mismo mensaje para dni inexistente y contraseña incorrecta
+            raise HTTPException(
+                status_code=401,
+                detail="DNI o contraseña incorrectos",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        if not es_hash(usuario["contrasena"]):
+            await get_escritor().ejecutar_async(
+                _rehashear,
+                usuario["idusuario"],
+                usuario["contrasena"],
+                await hashear_async(login.contrasena),
+            )
+
+        token, expira = emitir_token(usuario["idusuario"], usuario["rol"])
+        return {
+            "idusuario": usuario["idusuario"],
+            "dni": usuario["dni"],
+            "rol": usuario["rol"],
+            "token": token,
+            "token_type": "bearer",
+            "expira": expira,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        return []
+
+
+# sesion actual
+@app.get("/sesion")
+async def get_sesion(sesion: Sesion = Depends(usuario_actual)):
+    """
+    Obtener el usuario y el rol del token enviado, sin consultar la base.
+    """
+    return {"idusuario": sesion.idusuario, "rol": sesion.rol, "expira": sesion.expira}
+
+
+# logout
+@app.post("/logout")
+async def logout(sesion: Sesion = Depends(usuario_actual)):
+    """
+    Revocar el token enviado. Deja de valer de inmediato en este proceso y
+    en los demás workers en unos segundos (COLEGIO_REVOCACION_SEG).
+    """
+    try:
+        await get_escritor().ejecutar_async(revocar, sesion)
+        get_revocaciones().agregar(sesion.jti, sesion.expira)
+        return {"mensaje": "Sesión cerrada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -216,21 +533,44 @@ CREATE TABLE Profesores (
 
 
 # metodos GET, POST, PUT, DELETE para la tabla Profesores
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class ProfesorSalida(BaseModel):
+    idprofesor: int
+    nombre: Optional[str] = None
+    dni: Optional[str] = None
+    correo: Optional[str] = None
+    idusuario: Optional[int] = None
+
+
 # get
-@app.get("/profesores")
-def get_profesores():
+@app.get("/profesores", responses={200: {"model": Pagina[ProfesorSalida]}})
+async def get_profesores(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todos los profesores.
+    Obtener los profesores paginados por idprofesor.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Profesores")
-            profesores = cursor.fetchall()
-            if profesores is None:
-                return []
-            else:
-                return profesores
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Profesores",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Profesores", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -250,19 +590,16 @@ class Profesor(BaseModel):
 
 # post
 @app.post("/profesores")
-def post_profesor(profesor: Profesor):
+async def post_profesor(profesor: Profesor):
     """
     Crear un nuevo profesor.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO Profesores (nombre, dni, correo, idusuario) VALUES (?, ?, ?, ?)",
-                (profesor.nombre, profesor.dni, profesor.correo, profesor.idusuario),
-            )
-            conn.commit()
-            return {"mensaje": "Profesor creado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "INSERT INTO Profesores (nombre, dni, correo, idusuario) VALUES (?, ?, ?, ?)",
+            (profesor.nombre, profesor.dni, profesor.correo, profesor.idusuario),
+        )
+        return {"mensaje": "Profesor creado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -282,25 +619,22 @@ class ProfesorUpdate(BaseModel):
 
 # put
 @app.put("/profesores/{idprofesor}")
-def put_profesor(idprofesor: int, profesor: ProfesorUpdate):
+async def put_profesor(idprofesor: int, profesor: ProfesorUpdate):
     """
     Actualizar un profesor.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE Profesores SET nombre = ?, dni = ?, correo = ?, idusuario = ? WHERE idprofesor = ?",
-                (
-                    profesor.nombre,
-                    profesor.dni,
-                    profesor.correo,
-                    profesor.idusuario,
-                    idprofesor,
-                ),
-            )
-            conn.commit()
-            return {"mensaje": "Profesor actualizado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "UPDATE Profesores SET nombre = ?, dni = ?, correo = ?, idusuario = ? WHERE idprofesor = ?",
+            (
+                profesor.nombre,
+                profesor.dni,
+                profesor.correo,
+                profesor.idusuario,
+                idprofesor,
+            ),
+        )
+        return {"mensaje": "Profesor actualizado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -308,16 +642,15 @@ def put_profesor(idprofesor: int, profesor: ProfesorUpdate):
 
 # delete
 @app.delete("/profesores/{idprofesor}")
-def delete_profesor(idprofesor: int):
+async def delete_profesor(idprofesor: int):
     """
     Eliminar un profesor.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM Profesores WHERE idprofesor = ?", (idprofesor,))
-            conn.commit()
-            return {"mensaje": "Profesor eliminado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "DELETE FROM Profesores WHERE idprofesor = ?", (idprofesor,)
+        )
+        return {"mensaje": "Profesor eliminado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -335,21 +668,44 @@ CREATE TABLE Estudiantes (
 
 
 # metodos GET, POST, PUT, DELETE para la tabla Estudiantes
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class EstudianteSalida(BaseModel):
+    idestudiante: int
+    nombre: Optional[str] = None
+    dni: Optional[str] = None
+    idclase: Optional[int] = None
+    idusuario: Optional[int] = None
+
+
 # get
-@app.get("/estudiantes")
-def get_estudiantes():
+@app.get("/estudiantes", responses={200: {"model": Pagina[EstudianteSalida]}})
+async def get_estudiantes(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todos los estudiantes.
+    Obtener los estudiantes paginados por idestudiante.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Estudiantes")
-            estudiantes = cursor.fetchall()
-            if estudiantes is None:
-                return []
-            else:
-                return estudiantes
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Estudiantes",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Estudiantes", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -369,24 +725,21 @@ class Estudiante(BaseModel):
 
 # post
 @app.post("/estudiantes")
-def post_estudiante(estudiante: Estudiante):
+async def post_estudiante(estudiante: Estudiante):
     """
     Crear un nuevo estudiante.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO Estudiantes (nombre, dni, idclase, idusuario) VALUES (?, ?, ?, ?)",
-                (
-                    estudiante.nombre,
-                    estudiante.dni,
-                    estudiante.idclase,
-                    estudiante.idusuario,
-                ),
-            )
-            conn.commit()
-            return {"mensaje": "Estudiante creado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "INSERT INTO Estudiantes (nombre, dni, idclase, idusuario) VALUES (?, ?, ?, ?)",
+            (
+                estudiante.nombre,
+                estudiante.dni,
+                estudiante.idclase,
+                estudiante.idusuario,
+            ),
+        )
+        return {"mensaje": "Estudiante creado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -404,27 +757,156 @@ class EstudianteUpdate(BaseModel):
     idusuario: int
 
 
-# put
-@app.put("/estudiantes/{idestudiante}")
-def put_estudiante(idestudiante: int, estudiante: EstudianteUpdate):
+# clase model para el PUT por lotes
+class EstudianteLote(EstudianteUpdate):
     """
-    Actualizar un estudiante.
+    Modelo para la actualización por lotes de un estudiante.
+    """
+
+    idestudiante: int
+
+
+# post por lotes
+@app.post("/estudiantes/bulk")
+async def post_estudiantes_bulk(estudiantes: List[Any]):
+    """
+    Crear varios estudiantes en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con el id creado o el error.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE Estudiantes SET nombre = ?, dni = ?, idclase = ?, idusuario = ? WHERE idestudiante = ?",
+        validos, errores = validar_lote(Estudiante, estudiantes)
+        ids = await get_escritor().ejecutar_async(
+            insertar_lote,
+            "Estudiantes",
+            ("nombre", "dni", "idclase", "idusuario"),
+            [
                 (
                     estudiante.nombre,
                     estudiante.dni,
                     estudiante.idclase,
                     estudiante.idusuario,
-                    idestudiante,
-                ),
-            )
-            conn.commit()
-            return {"mensaje": "Estudiante actualizado exitosamente"}
+                )
+                for _, estudiante in validos
+            ],
+        )
+        return {
+            "mensaje": "Estudiantes procesados",
+            "resultados": resultados_insercion(validos, errores, ids),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# put por lotes
+@app.put("/estudiantes/bulk")
+async def put_estudiantes_bulk(estudiantes: List[Any]):
+    """
+    Actualizar varios estudiantes en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con su id o el error.
+    """
+    try:
+        validos, errores = validar_lote(EstudianteLote, estudiantes)
+        existentes = await get_escritor().ejecutar_async(
+            actualizar_lote,
+            "Estudiantes",
+            ("nombre", "dni", "idclase", "idusuario"),
+            [
+                (
+                    estudiante.nombre,
+                    estudiante.dni,
+                    estudiante.idclase,
+                    estudiante.idusuario,
+                    estudiante.idestudiante,
+                )
+                for _, estudiante in validos
+            ],
+        )
+        return {
+            "mensaje": "Estudiantes actualizados",
+            "resultados": resultados_actualizacion(
+                validos,
+                errores,
+                [estudiante.idestudiante for _, estudiante in validos],
+                existentes,
+            ),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# delete por lotes
+@app.delete("/estudiantes/bulk")
+async def delete_estudiantes_bulk(ids: List[int] = Query(...)):
+    """
+    Eliminar varios estudiantes por lista de ids (`?ids=1&ids=2`).
+    """
+    try:
+        ids = revisar_ids(ids)
+        existentes = await get_escritor().ejecutar_async(
+            eliminar_lote, "Estudiantes", ids
+        )
+        return {
+            "mensaje": "Estudiantes eliminados",
+            "resultados": resultados_por_id(ids, existentes),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# importacion de estudiantes desde CSV
+@app.post("/estudiantes/importar")
+def importar_estudiantes(archivo: UploadFile = File(...)):
+    """
+    Importar estudiantes desde un CSV con las columnas nombre, dni, idclase
+    y contrasena. Por cada fila se crea el usuario y el estudiante.
+
+    El archivo se lee fila por fila y se confirma en bloques; la respuesta
+    es NDJSON con una línea de avance por bloque y un resumen final con los
+    errores por línea.
+    """
+    try:
+        filas = leer_roster(archivo.file)
+    except (ArchivoInvalido, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    avance = importar_roster(filas, get_escritor())
+    return StreamingResponse(
+        (json.dumps(resumen, ensure_ascii=False) + "\n" for resumen in avance),
+        media_type="application/x-ndjson",
+    )
+
+
+# put
+@app.put("/estudiantes/{idestudiante}")
+async def put_estudiante(idestudiante: int, estudiante: EstudianteUpdate):
+    """
+    Actualizar un estudiante.
+    """
+    try:
+        await get_escritor().ejecutar_sql_async(
+            "UPDATE Estudiantes SET nombre = ?, dni = ?, idclase = ?, idusuario = ? WHERE idestudiante = ?",
+            (
+                estudiante.nombre,
+                estudiante.dni,
+                estudiante.idclase,
+                estudiante.idusuario,
+                idestudiante,
+            ),
+        )
+        return {"mensaje": "Estudiante actualizado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -432,18 +914,15 @@ def put_estudiante(idestudiante: int, estudiante: EstudianteUpdate):
 
 # delete
 @app.delete("/estudiantes/{idestudiante}")
-def delete_estudiante(idestudiante: int):
+async def delete_estudiante(idestudiante: int):
     """
     Eliminar un estudiante.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM Estudiantes WHERE idestudiante = ?", (idestudiante,)
-            )
-            conn.commit()
-            return {"mensaje": "Estudiante eliminado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "DELETE FROM Estudiantes WHERE idestudiante = ?", (idestudiante,)
+        )
+        return {"mensaje": "Estudiante eliminado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -459,21 +938,42 @@ CREATE TABLE Clases (
 
 
 # metodos GET, POST, PUT, DELETE para la tabla Clases
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class ClaseSalida(BaseModel):
+    idclase: int
+    nombre: Optional[str] = None
+    idprofesor: Optional[int] = None
+
+
 # get
-@app.get("/clases")
-def get_clases():
+@app.get("/clases", responses={200: {"model": Pagina[ClaseSalida]}})
+async def get_clases(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todas las clases.
+    Obtener las clases paginadas por idclase.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Clases")
-            clases = cursor.fetchall()
-            if clases is None:
-                return []
-            else:
-                return clases
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Clases",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Clases", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -491,19 +991,16 @@ class Clase(BaseModel):
 
 # post
 @app.post("/clases")
-def post_clase(clase: Clase):
+async def post_clase(clase: Clase):
     """
     Crear una nueva clase.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO Clases (nombre, idprofesor) VALUES (?, ?)",
-                (clase.nombre, clase.idprofesor),
-            )
-            conn.commit()
-            return {"mensaje": "Clase creada exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES (?, ?)",
+            (clase.nombre, clase.idprofesor),
+        )
+        return {"mensaje": "Clase creada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -521,19 +1018,28 @@ class ClaseUpdate(BaseModel):
 
 # put
 @app.put("/clases/{idclase}")
-def put_clase(idclase: int, clase: ClaseUpdate):
+async def put_clase(idclase: int, clase: ClaseUpdate):
     """
     Actualizar una clase.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+
+        def _actualizar(conn):
+            anteriores = conn.execute(
+                "SELECT idprofesor FROM Clases WHERE idclase = ?", (idclase,)
+            ).fetchall()
+            conn.execute(
                 "UPDATE Clases SET nombre = ?, idprofesor = ? WHERE idclase = ?",
                 (clase.nombre, clase.idprofesor, idclase),
             )
-            conn.commit()
-            return {"mensaje": "Clase actualizada exitosamente"}
+            # las tareas de la clase cambian de profesor
+            invalidar_al_confirmar(
+                [f"profesor:{fila['idprofesor']}" for fila in anteriores]
+                + [f"profesor:{clase.idprofesor}"]
+            )
+
+        await get_escritor().ejecutar_async(_actualizar)
+        return {"mensaje": "Clase actualizada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -541,16 +1047,23 @@ def put_clase(idclase: int, clase: ClaseUpdate):
 
 # delete
 @app.delete("/clases/{idclase}")
-def delete_clase(idclase: int):
+async def delete_clase(idclase: int):
     """
     Eliminar una clase.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM Clases WHERE idclase = ?", (idclase,))
-            conn.commit()
-            return {"mensaje": "Clase eliminada exitosamente"}
+
+        def _eliminar(conn):
+            anteriores = conn.execute(
+                "SELECT idprofesor FROM Clases WHERE idclase = ?", (idclase,)
+            ).fetchall()
+            conn.execute("DELETE FROM Clases WHERE idclase = ?", (idclase,))
+            invalidar_al_confirmar(
+                [f"profesor:{fila['idprofesor']}" for fila in anteriores]
+            )
+
+        await get_escritor().ejecutar_async(_eliminar)
+        return {"mensaje": "Clase eliminada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -564,27 +1077,109 @@ CREATE TABLE Tareas (
   fecha_vencimiento DATE,
   idclase INTEGER REFERENCES Clases(idclase),
   idestudiante INTEGER REFERENCES Estudiantes(idestudiante),
-  estado VARCHAR
+  estado VARCHAR,
+  idplantilla INTEGER REFERENCES PlantillasTarea(idplantilla)
+);
+
+CREATE TABLE PlantillasTarea (
+  idplantilla INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre_tarea VARCHAR,
+  instrucciones TEXT,
+  fecha_vencimiento DATE,
+  idclase INTEGER REFERENCES Clases(idclase)
 );
+
+Las tareas comunes dejan nombre_tarea, instrucciones y fecha_vencimiento en
+NULL y los toman de su plantilla; las lecturas usan la vista VistaTareas.
 """
 
 
 # metodos GET, POST, PUT, DELETE para la tabla Tareas
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class TareaSalida(BaseModel):
+    idtarea: int
+    nombre_tarea: Optional[str] = None
+    instrucciones: Optional[str] = None
+    fecha_vencimiento: Optional[str] = None
+    idclase: Optional[int] = None
+    idestudiante: Optional[int] = None
+    estado: Optional[str] = None
+    idplantilla: Optional[int] = None
+
+
 # get
-@app.get("/tareas")
-def get_tareas():
+@app.get("/tareas", responses={200: {"model": Pagina[TareaSalida]}})
+async def get_tareas(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todas las tareas.
+    Obtener las tareas paginadas por idtarea.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Tareas")
-            tareas = cursor.fetchall()
-            if tareas is None:
-                return []
-            else:
-                return tareas
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Tareas",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Tareas", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# modelo de salida de la búsqueda de tareas
+class ResultadoBusquedaTarea(BaseModel):
+    # 'comun' (una por plantilla, con idplantilla) o 'tarea' (con idtarea)
+    tipo: str
+    idtarea: Optional[int] = None
+    idplantilla: Optional[int] = None
+    nombre_tarea: Optional[str] = None
+    idclase: Optional[int] = None
+    fecha_vencimiento: Optional[str] = None
+    # texto alrededor de las palabras encontradas, marcadas con <b></b>
+    fragmento: Optional[str] = None
+    relevancia: float
+
+
+# busqueda de texto completo (antes de las rutas /tareas/{idtarea})
+@app.get("/tareas/buscar", responses={200: {"model": Pagina[ResultadoBusquedaTarea]}})
+async def buscar_tareas(
+    q: str,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    idclase: Optional[int] = None,
+    idprofesor: Optional[int] = None,
+):
+    """
+    Buscar tareas por palabras del nombre o de las instrucciones (sin
+    distinguir mayúsculas ni tildes; cada palabra vale como prefijo), de la
+    más a la menos relevante. Filtra por `idclase` o por las clases de
+    `idprofesor`. Se pagina con `cursor` (el next_cursor anterior) y
+    `limite`.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    buscar_tareas_json, q, cursor, limite, idclase, idprofesor
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -606,14 +1201,14 @@ class Tarea(BaseModel):
 
 # post
 @app.post("/tareas")
-def post_tarea(tarea: Tarea):
+async def post_tarea(tarea: Tarea):
     """
     Crear una nueva tarea.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+
+        def _crear(conn):
+            idtarea = conn.execute(
                 "INSERT INTO Tareas (nombre_tarea, instrucciones, fecha_vencimiento, idclase, idestudiante, estado) VALUES (?, ?, ?, ?, ?, ?)",
                 (
                     tarea.nombre_tarea,
@@ -623,9 +1218,23 @@ def post_tarea(tarea: Tarea):
                     tarea.idestudiante,
                     tarea.estado,
                 ),
+            ).lastrowid
+            invalidar_tareas(conn, [(tarea.idclase, tarea.idestudiante)])
+            publicar_al_confirmar(
+                conn,
+                "tarea_creada",
+                [(tarea.idclase, tarea.idestudiante)],
+                {
+                    "idtarea": idtarea,
+                    "idclase": tarea.idclase,
+                    "idestudiante": tarea.idestudiante,
+                    "nombre_tarea": tarea.nombre_tarea,
+                    "fecha_vencimiento": tarea.fecha_vencimiento,
+                },
             )
-            conn.commit()
-            return {"mensaje": "Tarea creada exitosamente"}
+
+        await get_escritor().ejecutar_async(_crear)
+        return {"mensaje": "Tarea creada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -645,46 +1254,226 @@ class TareaUpdate(BaseModel):
     estado: str
 
 
-# put
-@app.put("/tareas/{idtarea}")
-def put_tarea(idtarea: int, tarea: TareaUpdate):
+# clase model para el PUT por lotes
+class TareaLote(TareaUpdate):
     """
-    Actualizar una tarea.
+    Modelo para la actualización por lotes de una tarea.
+    """
+
+    idtarea: int
+
+
+# post por lotes
+@app.post("/tareas/bulk")
+async def post_tareas_bulk(tareas: List[Any]):
+    """
+    Crear varias tareas en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con el id creado o el error.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE Tareas SET nombre_tarea = ?, instrucciones = ?, fecha_vencimiento = ?, idclase = ?, idestudiante = ?, estado = ? WHERE idtarea = ?",
+        validos, errores = validar_lote(Tarea, tareas)
+
+        def _crear(conn):
+            ids = insertar_lote(
+                conn,
+                "Tareas",
                 (
-                    tarea.nombre_tarea,
-                    tarea.instrucciones,
-                    tarea.fecha_vencimiento,
-                    tarea.idclase,
-                    tarea.idestudiante,
-                    tarea.estado,
-                    idtarea,
+                    "nombre_tarea",
+                    "instrucciones",
+                    "fecha_vencimiento",
+                    "idclase",
+                    "idestudiante",
+                    "estado",
                 ),
+                [
+                    (
+                        tarea.nombre_tarea,
+                        tarea.instrucciones,
+                        tarea.fecha_vencimiento,
+                        tarea.idclase,
+                        tarea.idestudiante,
+                        tarea.estado,
+                    )
+                    for _, tarea in validos
+                ],
+            )
+            invalidar_tareas(
+                conn, [(tarea.idclase, tarea.idestudiante) for _, tarea in validos]
             )
-            conn.commit()
-            return {"mensaje": "Tarea actualizada exitosamente"}
+            return ids
+
+        ids = await get_escritor().ejecutar_async(_crear)
+        return {
+            "mensaje": "Tareas procesadas",
+            "resultados": resultados_insercion(validos, errores, ids),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
 
 
-# delete
-@app.delete("/tareas/{idtarea}")
-def delete_tarea(idtarea: int):
+# put por lotes
+@app.put("/tareas/bulk")
+async def put_tareas_bulk(tareas: List[Any]):
     """
-    Eliminar una tarea.
+    Actualizar varias tareas en una sola transacción.
+
+    Cada elemento se valida por separado; la respuesta trae un resultado
+    por elemento, en el mismo orden, con su id o el error.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM Tareas WHERE idtarea = ?", (idtarea,))
-            conn.commit()
-            return {"mensaje": "Tarea eliminada exitosamente"}
+        validos, errores = validar_lote(TareaLote, tareas)
+        tareas = [tarea for _, tarea in validos]
+        ids = list(dict.fromkeys(tarea.idtarea for tarea in tareas))
+
+        def _actualizar(conn):
+            anteriores = tareas_afectadas(conn, ids)
+            existentes = actualizar_lote(
+                conn,
+                "Tareas",
+                (
+                    "nombre_tarea",
+                    "instrucciones",
+                    "fecha_vencimiento",
+                    "idclase",
+                    "idestudiante",
+                    "estado",
+                ),
+                [
+                    (
+                        tarea.nombre_tarea,
+                        tarea.instrucciones,
+                        tarea.fecha_vencimiento,
+                        tarea.idclase,
+                        tarea.idestudiante,
+                        tarea.estado,
+                        tarea.idtarea,
+                    )
+                    for tarea in tareas
+                ],
+            )
+            invalidar_tareas(
+                conn,
+                anteriores
+                + [
+                    (tarea.idclase, tarea.idestudiante)
+                    for tarea in tareas
+                    if tarea.idtarea in existentes
+                ],
+            )
+            return existentes
+
+        existentes = await get_escritor().ejecutar_async(_actualizar)
+        return {
+            "mensaje": "Tareas actualizadas",
+            "resultados": resultados_actualizacion(
+                validos, errores, [tarea.idtarea for tarea in tareas], existentes
+            ),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# delete por lotes
+@app.delete("/tareas/bulk")
+async def delete_tareas_bulk(ids: List[int] = Query(...)):
+    """
+    Eliminar varias tareas por lista de ids (`?ids=1&ids=2`).
+    """
+    try:
+        ids = revisar_ids(ids)
+
+        def _eliminar(conn):
+            plantillas = conn.execute(
+                f"SELECT DISTINCT idplantilla FROM Tareas WHERE idplantilla IS NOT NULL AND idtarea IN ({', '.join('?' for _ in ids)})",
+                ids,
+            ).fetchall()
+            invalidar_tareas(conn, tareas_afectadas(conn, ids))
+            existentes = eliminar_lote(conn, "Tareas", ids)
+            # Borrar las plantillas que quedaron sin tareas
+            conn.executemany(
+                "DELETE FROM PlantillasTarea WHERE idplantilla = ? AND NOT EXISTS (SELECT 1 FROM Tareas WHERE idplantilla = ?)",
+                [(fila["idplantilla"], fila["idplantilla"]) for fila in plantillas],
+            )
+            return existentes
+
+        existentes = await get_escritor().ejecutar_async(_eliminar)
+        return {
+            "mensaje": "Tareas eliminadas",
+            "resultados": resultados_por_id(ids, existentes),
+        }
+    except LoteInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# put
+@app.put("/tareas/{idtarea}")
+async def put_tarea(idtarea: int, tarea: TareaUpdate):
+    """
+    Actualizar una tarea.
+    """
+    try:
+
+        def _actualizar(conn):
+            # la clase y el estudiante anteriores también pierden la tarea
+            anteriores = tareas_afectadas(conn, [idtarea])
+            conn.execute(
+                "UPDATE Tareas SET nombre_tarea = ?, instrucciones = ?, fecha_vencimiento = ?, idclase = ?, idestudiante = ?, estado = ? WHERE idtarea = ?",
+                (
+                    tarea.nombre_tarea,
+                    tarea.instrucciones,
+                    tarea.fecha_vencimiento,
+                    tarea.idclase,
+                    tarea.idestudiante,
+                    tarea.estado,
+                    idtarea,
+                ),
+            )
+            if anteriores:
+                invalidar_tareas(
+                    conn, anteriores + [(tarea.idclase, tarea.idestudiante)]
+                )
+
+        await get_escritor().ejecutar_async(_actualizar)
+        return {"mensaje": "Tarea actualizada exitosamente"}
+    except Exception as e:
+        print(e)
+        return []
+
+
+# delete
+@app.delete("/tareas/{idtarea}")
+async def delete_tarea(idtarea: int):
+    """
+    Eliminar una tarea.
+    """
+    try:
+
+        def _eliminar(conn):
+            plantilla = conn.execute(
+                "SELECT idplantilla FROM Tareas WHERE idtarea = ?", (idtarea,)
+            ).fetchone()
+            invalidar_tareas(conn, tareas_afectadas(conn, [idtarea]))
+            conn.execute("DELETE FROM Tareas WHERE idtarea = ?", (idtarea,))
+            # Borrar la plantilla cuando ya no la usa ninguna tarea
+            if plantilla is not None and plantilla["idplantilla"] is not None:
+                conn.execute(
+                    "DELETE FROM PlantillasTarea WHERE idplantilla = ? AND NOT EXISTS (SELECT 1 FROM Tareas WHERE idplantilla = ?)",
+                    (plantilla["idplantilla"], plantilla["idplantilla"]),
+                )
+
+        await get_escritor().ejecutar_async(_eliminar)
+        return {"mensaje": "Tarea eliminada exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -696,233 +1485,360 @@ def delete_tarea(idtarea: int):
   nombre_archivo VARCHAR,
   tipo_archivo VARCHAR,
   idtarea INTEGER REFERENCES Tareas(idtarea),
-  idestudiante INTEGER REFERENCES Estudiantes(idestudiante)
-);"""
+  idestudiante INTEGER REFERENCES Estudiantes(idestudiante),
+  hash_archivo VARCHAR REFERENCES Archivos(hash)
+);
+
+CREATE TABLE Archivos (
+  hash VARCHAR PRIMARY KEY,
+  tamano INTEGER,
+  referencias INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+Los archivos nuevos se guardan una sola vez por contenido en
+pdf/blobs/ab/cd/<sha256>; las entregas anteriores (sin hash_archivo)
+siguen en pdf/<nombre_archivo>.
+"""
+
+directorio_pdf = DIRECTORIO_PDF
+
 
-directorio_pdf = "pdf"
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class EntregaSalida(BaseModel):
+    identrega: int
+    fecha_entrega: Optional[str] = None
+    nombre_archivo: Optional[str] = None
+    tipo_archivo: Optional[str] = None
+    idtarea: Optional[int] = None
+    idestudiante: Optional[int] = None
+    hash_archivo: Optional[str] = None
 
 
 # get
-@app.get("/entregas")
-def get_entregas():
+@app.get("/entregas", responses={200: {"model": Pagina[EntregaSalida]}})
+async def get_entregas(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todas las entregas.
+    Obtener las entregas paginadas por identrega.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Entregas")
-            entregas = cursor.fetchall()
-            if entregas is None:
-                return []
-            else:
-                return entregas
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "Entregas",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("Entregas", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
 
 
-from datetime import datetime
+# modelo de salida de la búsqueda en el contenido de las entregas
+class ResultadoBusquedaEntrega(BaseModel):
+    identrega: int
+    idtarea: Optional[int] = None
+    idestudiante: Optional[int] = None
+    fecha_entrega: Optional[str] = None
+    nombre_archivo: Optional[str] = None
+    # el mismo hash en dos entregas es el mismo archivo
+    hash_archivo: Optional[str] = None
+    fragmento: Optional[str] = None
+    relevancia: float
 
-# ...
+
+# busqueda de texto completo en los archivos entregados
+@app.get(
+    "/entregas/buscar", responses={200: {"model": Pagina[ResultadoBusquedaEntrega]}}
+)
+async def buscar_entregas(
+    q: str,
+    idtarea: Optional[int] = None,
+    idestudiante: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+):
+    """
+    Buscar palabras en el texto de los PDF entregados, de la entrega más a
+    la menos relevante. El texto se extrae en segundo plano después de
+    cada entrega, así que un archivo recién subido aparece en unos
+    segundos. Filtra por `idtarea` o `idestudiante` y se pagina con
+    `cursor` y `limite`.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    buscar_entregas_json, q, cursor, limite, idtarea, idestudiante
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# archivos cuyo texto no se pudo extraer
+@app.get("/entregas/textos/errores")
+async def get_errores_extraccion(limite: int = Query(100, ge=1, le=1000)):
+    """
+    Listar los archivos cuya extracción de texto falló y no se reintenta
+    sola: no son un PDF, están dañados o agotaron los reintentos.
+    """
+    try:
+        return await run_in_threadpool(errores_definitivos, limite)
+    except Exception as e:
+        print(e)
+        return []
+
+
+@app.post("/entregas/textos/reintentar")
+async def post_reintentar_extraccion():
+    """
+    Volver a extraer el texto de los archivos con error definitivo, por
+    ejemplo después de actualizar pypdf.
+    """
+    try:
+        archivos = await get_escritor().ejecutar_async(reintentar_errores)
+        return {"mensaje": "Extracción reprogramada", "archivos": archivos}
+    except Exception as e:
+        print(e)
+        return JSONResponse(
+            content={"mensaje": "Error al reprogramar la extracción"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
 
 # post
 @app.post("/entregas")
-def post_entrega(idtarea: int, idestudiante: int, archivo: UploadFile = File(...)):
+async def post_entrega(
+    idtarea: int, idestudiante: int, archivo: UploadFile = File(...)
+):
     """
     Crear una nueva entrega y registrar un cambio de estado.
+
+    El archivo se copia por bloques a un temporal mientras se calcula su
+    SHA-256 y se guarda en el almacén por contenido; si otra entrega ya
+    subió el mismo archivo, se reutiliza. La transacción se abre recién
+    cuando el archivo ya está en disco.
     """
+    ruta_temporal = None
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
+        ruta_temporal, tamano, huella = await recibir_archivo(archivo)
+
+        # Establecer la fecha de entrega como la fecha actual
+        fecha_entrega = datetime.now().strftime("%Y-%m-%d")
 
-            # Establecer la fecha de entrega como la fecha actual
-            fecha_entrega = datetime.now().strftime("%Y-%m-%d")
+        # Obtener el tipo de archivo real del objeto UploadFile
+        tipo_archivo = archivo.content_type
 
-            # Obtener el tipo de archivo real del objeto UploadFile
-            tipo_archivo = archivo.content_type
+        def _registrar(conn):
+            guardar_blob(conn, ruta_temporal, huella, tamano)
 
             # Insertar la entrega en la base de datos
-            cursor.execute(
-                "INSERT INTO Entregas (fecha_entrega, nombre_archivo, tipo_archivo, idtarea, idestudiante) VALUES (?, ?, ?, ?, ?)",
+            identrega = conn.execute(
+                "INSERT INTO Entregas (fecha_entrega, nombre_archivo, tipo_archivo, idtarea, idestudiante, hash_archivo) VALUES (?, ?, ?, ?, ?, ?)",
                 (
                     fecha_entrega,
-                    archivo.filename,
+                    nombre_seguro(archivo.filename),
                     tipo_archivo,
                     idtarea,
                     idestudiante,
+                    huella,
                 ),
-            )
-
-            # Obtener el ID de la última fila insertada
-            id_entrega = cursor.lastrowid
-
-            # Crear el directorio si no existe
-            directorio_archivos = "pdf"
-            Path(directorio_archivos).mkdir(parents=True, exist_ok=True)
-
-            # Guardar el archivo en el sistema de archivos
-            ruta_archivo = Path(directorio_archivos) / archivo.filename
-
-            # Verificar si el archivo ya existe
-            if ruta_archivo.exists():
-                # Si existe, agregar un timestamp al nombre del archivo
-                nombre_archivo = (
-                    archivo.filename.split(".")[0]
-                    + "_"
-                    + datetime.now().strftime("%Y%m%d%H%M%S")
-                    + "."
-                    + archivo.filename.split(".")[1]
-                )
-                ruta_archivo = Path(directorio_archivos) / nombre_archivo
-            else:
-                nombre_archivo = archivo.filename
-
-            # Guardar el archivo en el sistema de archivos
-            with ruta_archivo.open("wb") as file:
-                file.write(archivo.file.read())
-
-            # Actualizar el nombre del archivo en la base de datos
-            cursor.execute(
-                "UPDATE Entregas SET nombre_archivo = ? WHERE identrega = ?",
-                (nombre_archivo, id_entrega),
-            )
+            ).lastrowid
 
             # Registrar un cambio de estado
             nuevo_estado = "entregado"  # Puedes cambiar esto según tus necesidades
             fecha_cambio = datetime.now().strftime("%Y-%m-%d")
-            cursor.execute(
+            conn.execute(
                 "INSERT INTO CambiosEstado (idtarea, nuevo_estado, fecha_cambio) VALUES (?, ?, ?)",
                 (idtarea, nuevo_estado, fecha_cambio),
             )
+            afectadas = tareas_afectadas(conn, [idtarea])
+            invalidar_tareas(conn, afectadas)
+            extraer_al_confirmar()
+            publicar_al_confirmar(
+                conn,
+                "entrega_creada",
+                afectadas,
+                {
+                    "identrega": identrega,
+                    "idtarea": idtarea,
+                    "idestudiante": idestudiante,
+                    "estado": nuevo_estado,
+                },
+            )
 
-            conn.commit()
+        await get_escritor().ejecutar_async(_registrar)
 
-            return {"mensaje": "Entrega creada exitosamente"}
+        return {"mensaje": "Entrega creada exitosamente"}
+    except ArchivoDemasiadoGrande:
+        raise HTTPException(
+            status_code=413, detail="El archivo supera el tamaño máximo permitido"
+        )
     except Exception as e:
         print(e)
         return {"mensaje": "Error al procesar la entrega"}
+    finally:
+        # si la transacción no llegó a guardar el temporal, se descarta
+        if ruta_temporal is not None:
+            ruta_temporal.unlink(missing_ok=True)
 
 
 # put
 @app.put("/entregas/{identrega}")
-def put_entrega(identrega: int, archivo: UploadFile = File(...)):
+async def put_entrega(identrega: int, archivo: UploadFile = File(...)):
     """
     Actualizar una entrega y registrar un cambio de estado.
+
+    Si la entrega no existe se responde 404 antes de recibir el archivo.
     """
+    ruta_temporal = None
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
+        async with DatabaseConnectionAsync() as conn:
+            existe = await conn.fetchone(
+                "SELECT 1 FROM Entregas WHERE identrega = ?", (identrega,)
+            )
+        if existe is None:
+            raise HTTPException(status_code=404, detail="Entrega no encontrada")
+
+        ruta_temporal, tamano, huella = await recibir_archivo(archivo)
 
-            # Establecer la fecha de entrega como la fecha actual
-            fecha_entrega = datetime.now().strftime("%Y-%m-%d")
+        # Establecer la fecha de entrega como la fecha actual
+        fecha_entrega = datetime.now().strftime("%Y-%m-%d")
 
-            # Obtener el tipo de archivo real del objeto UploadFile
-            tipo_archivo = archivo.content_type
+        # Obtener el tipo de archivo real del objeto UploadFile
+        tipo_archivo = archivo.content_type
+
+        def _actualizar(conn):
+            # Obtener la entrega actual para liberar su archivo
+            anterior = conn.execute(
+                "SELECT identrega, idtarea, nombre_archivo, hash_archivo FROM Entregas WHERE identrega = ?",
+                (identrega,),
+            ).fetchone()
+            if anterior is None:
+                raise LookupError(f"Entrega {identrega} no encontrada")
+
+            guardar_blob(conn, ruta_temporal, huella, tamano)
+            soltar_archivo_entrega(conn, anterior)
 
             # Actualizar la entrega en la base de datos
-            cursor.execute(
-                "UPDATE Entregas SET fecha_entrega = ?, nombre_archivo = ?, tipo_archivo = ? WHERE identrega = ?",
+            conn.execute(
+                "UPDATE Entregas SET fecha_entrega = ?, nombre_archivo = ?, tipo_archivo = ?, hash_archivo = ? WHERE identrega = ?",
                 (
                     fecha_entrega,
-                    archivo.filename,
+                    nombre_seguro(archivo.filename),
                     tipo_archivo,
+                    huella,
                     identrega,
                 ),
             )
 
-            # Obtener el idtarea asociado a la entrega
-            cursor.execute(
-                "SELECT idtarea FROM Entregas WHERE identrega = ?", (identrega,)
-            )
-            idtarea = cursor.fetchone()["idtarea"]
-
-            # Crear el directorio si no existe
-            directorio_archivos = "pdf"
-            Path(directorio_archivos).mkdir(parents=True, exist_ok=True)
-
-            # Guardar el archivo en el sistema de archivos
-            ruta_archivo = Path(directorio_archivos) / archivo.filename
-
-            # Verificar si el archivo ya existe
-            if ruta_archivo.exists():
-                # Si existe, agregar un timestamp al nombre del archivo
-                nombre_archivo = (
-                    archivo.filename.split(".")[0]
-                    + "_"
-                    + datetime.now().strftime("%Y%m%d%H%M%S")
-                    + "."
-                    + archivo.filename.split(".")[1]
-                )
-                ruta_archivo = Path(directorio_archivos) / nombre_archivo
-            else:
-                nombre_archivo = archivo.filename
-
-            # Guardar el archivo en el sistema de archivos
-            with ruta_archivo.open("wb") as file:
-                file.write(archivo.file.read())
-
-            # Actualizar el nombre del archivo en la base de datos
-            cursor.execute(
-                "UPDATE Entregas SET nombre_archivo = ? WHERE identrega = ?",
-                (nombre_archivo, identrega),
-            )
-
             # Registrar un cambio de estado
             nuevo_estado = "actualizado"  # Puedes cambiar esto según tus necesidades
             fecha_cambio = datetime.now().strftime("%Y-%m-%d")
-            cursor.execute(
+            conn.execute(
                 "INSERT INTO CambiosEstado (idtarea, nuevo_estado, fecha_cambio) VALUES (?, ?, ?)",
-                (idtarea, nuevo_estado, fecha_cambio),
+                (anterior["idtarea"], nuevo_estado, fecha_cambio),
+            )
+            afectadas = tareas_afectadas(conn, [anterior["idtarea"]])
+            invalidar_tareas(conn, afectadas)
+            extraer_al_confirmar()
+            publicar_al_confirmar(
+                conn,
+                "entrega_actualizada",
+                afectadas,
+                {
+                    "identrega": identrega,
+                    "idtarea": anterior["idtarea"],
+                    "estado": nuevo_estado,
+                },
             )
 
-            conn.commit()
+        await get_escritor().ejecutar_async(_actualizar)
 
-            return {"mensaje": "Entrega actualizada exitosamente"}
+        return {"mensaje": "Entrega actualizada exitosamente"}
+    except ArchivoDemasiadoGrande:
+        raise HTTPException(
+            status_code=413, detail="El archivo supera el tamaño máximo permitido"
+        )
+    except HTTPException:
+        raise
+    except LookupError:
+        # se eliminó mientras se recibía el archivo
+        raise HTTPException(status_code=404, detail="Entrega no encontrada")
     except Exception as e:
         print(e)
         return {"mensaje": "Error al procesar la entrega"}
+    finally:
+        if ruta_temporal is not None:
+            ruta_temporal.unlink(missing_ok=True)
 
 
 # delete
 @app.delete("/entregas/{identrega}")
-def delete_entrega(identrega: int):
+async def delete_entrega(identrega: int):
     """
     Eliminar una entrega y registrar un cambio de estado.
+
+    El archivo solo se borra del disco si ninguna otra entrega lo usa.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
 
+        def _eliminar(conn):
             # Obtener la información de la entrega antes de eliminarla
-            cursor.execute("SELECT * FROM Entregas WHERE identrega = ?", (identrega,))
-            entrega = cursor.fetchone()
+            entrega = conn.execute(
+                "SELECT * FROM Entregas WHERE identrega = ?", (identrega,)
+            ).fetchone()
 
             if entrega:
-                # Eliminar el archivo asociado si existe
-                directorio_archivos = "pdf"
-                ruta_archivo = Path(directorio_archivos) / entrega["nombre_archivo"]
-                if ruta_archivo.exists():
-                    ruta_archivo.unlink()
-
                 # Eliminar la entrega de la base de datos
-                cursor.execute("DELETE FROM Entregas WHERE identrega = ?", (identrega,))
+                conn.execute("DELETE FROM Entregas WHERE identrega = ?", (identrega,))
+                soltar_archivo_entrega(conn, entrega)
 
                 # Registrar un cambio de estado
                 nuevo_estado = "eliminado"  # Puedes cambiar esto según tus necesidades
                 fecha_cambio = datetime.now().strftime("%Y-%m-%d")
-                cursor.execute(
+                conn.execute(
                     "INSERT INTO CambiosEstado (idtarea, nuevo_estado, fecha_cambio) VALUES (?, ?, ?)",
                     (entrega["idtarea"], nuevo_estado, fecha_cambio),
                 )
+                afectadas = tareas_afectadas(conn, [entrega["idtarea"]])
+                invalidar_tareas(conn, afectadas)
+                publicar_al_confirmar(
+                    conn,
+                    "entrega_eliminada",
+                    afectadas,
+                    {
+                        "identrega": identrega,
+                        "idtarea": entrega["idtarea"],
+                        "estado": nuevo_estado,
+                    },
+                )
+                return True
+            return False
 
-                conn.commit()
-
-                return {"mensaje": "Entrega eliminada exitosamente"}
+        if await get_escritor().ejecutar_async(_eliminar):
+            return {"mensaje": "Entrega eliminada exitosamente"}
 
-            else:
-                return {"mensaje": "Entrega no encontrada"}
+        else:
+            return {"mensaje": "Entrega no encontrada"}
 
     except Exception as e:
         print(e)
@@ -930,39 +1846,44 @@ def delete_entrega(identrega: int):
 
 
 @app.get("/entregas/descargar/{identrega}")
-def get_entrega_archivo(identrega: int):
+async def get_entrega_archivo(identrega: int, request: Request):
     """
     Obtener el enlace al archivo de una entrega.
+
+    Admite Range (206), If-None-Match/If-Modified-Since (304) e If-Range.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-
-            # Obtener el nombre del archivo asociado a la entrega
-            cursor.execute(
-                "SELECT nombre_archivo FROM Entregas WHERE identrega = ?", (identrega,)
+        async with DatabaseConnectionAsync() as conn:
+            # Obtener el archivo asociado a la entrega
+            result = await conn.fetchone(
+                """
+                SELECT e.nombre_archivo, e.hash_archivo, a.paquete
+                FROM Entregas e
+                LEFT JOIN ArchivosArchivados a ON a.hash = e.hash_archivo
+                WHERE e.identrega = ?
+                """,
+                (identrega,),
             )
-            result = cursor.fetchone()
-
-            if result:
-                nombre_archivo = result[0]
-
-                # Construir la ruta completa del archivo
-                directorio_archivos = "pdf"
-                ruta_archivo = Path(directorio_archivos) / nombre_archivo
-
-                # Verificar si el archivo existe
-                if ruta_archivo.exists():
-                    # Retornar el enlace al archivo como respuesta
-                    return FileResponse(
-                        ruta_archivo,
-                        media_type="application/pdf",
-                        filename=nombre_archivo,
-                    )
-                else:
-                    raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+        if result:
+            # Ruta del archivo: almacén, pdf/ o copia extraída de su paquete
+            ruta_archivo = await ruta_disponible(result)
+
+            # Verificar si el archivo existe
+            if ruta_archivo is not None:
+                # Retornar el archivo como descarga
+                return respuesta_archivo(
+                    request,
+                    ruta_archivo,
+                    huella=await huella_servida(result, ruta_archivo),
+                    filename=result["nombre_archivo"],
+                )
             else:
-                raise HTTPException(status_code=404, detail="Entrega no encontrada")
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+        else:
+            raise HTTPException(status_code=404, detail="Entrega no encontrada")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -972,35 +1893,44 @@ def get_entrega_archivo(identrega: int):
 
 
 @app.get("/entregas/ver/{identrega}")
-def ver_entrega_pdf(identrega: int):
+async def ver_entrega_pdf(identrega: int, request: Request):
     """
     Ver el PDF de una entrega en el navegador.
+
+    Los visores de PDF piden solo los rangos de bytes de las páginas que
+    muestran y revalidan con el ETag en cada visita.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-
-            # Obtener el nombre del archivo asociado a la entrega
-            cursor.execute(
-                "SELECT nombre_archivo FROM Entregas WHERE identrega = ?", (identrega,)
+        async with DatabaseConnectionAsync() as conn:
+            # Obtener el archivo asociado a la entrega
+            result = await conn.fetchone(
+                """
+                SELECT e.nombre_archivo, e.hash_archivo, a.paquete
+                FROM Entregas e
+                LEFT JOIN ArchivosArchivados a ON a.hash = e.hash_archivo
+                WHERE e.identrega = ?
+                """,
+                (identrega,),
             )
-            result = cursor.fetchone()
-
-            if result:
-                nombre_archivo = result[0]
-
-                # Construir la ruta completa del archivo
-                directorio_archivos = "pdf"
-                ruta_archivo = Path(directorio_archivos) / nombre_archivo
 
-                # Verificar si el archivo existe
-                if ruta_archivo.exists():
-                    # Retornar el PDF como respuesta
-                    return FileResponse(ruta_archivo, media_type="application/pdf")
-                else:
-                    raise HTTPException(status_code=404, detail="Archivo no encontrado")
+        if result:
+            # Ruta del archivo: almacén, pdf/ o copia extraída de su paquete
+            ruta_archivo = await ruta_disponible(result)
+
+            # Verificar si el archivo existe
+            if ruta_archivo is not None:
+                # Retornar el PDF como respuesta
+                return respuesta_archivo(
+                    request,
+                    ruta_archivo,
+                    huella=await huella_servida(result, ruta_archivo),
+                )
             else:
-                raise HTTPException(status_code=404, detail="Entrega no encontrada")
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+        else:
+            raise HTTPException(status_code=404, detail="Entrega no encontrada")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -1020,21 +1950,43 @@ CREATE TABLE CambiosEstado (
 
 
 # metodos GET, POST, PUT, DELETE para la tabla CambiosEstado
+# modelo de salida de los listados (con `fields` llegan solo algunos campos)
+class CambioEstadoSalida(BaseModel):
+    idcambio: int
+    idtarea: Optional[int] = None
+    nuevo_estado: Optional[str] = None
+    fecha_cambio: Optional[str] = None
+
+
 # get
-@app.get("/cambios_estado")
-def get_cambios_estado():
+@app.get("/cambios_estado", responses={200: {"model": Pagina[CambioEstadoSalida]}})
+async def get_cambios_estado(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
     """
-    Obtener todos los cambios de estado.
+    Obtener los cambios de estado paginados por idcambio.
+
+    Acepta `cursor` (el next_cursor de la página anterior), `limite`,
+    `fields` (columnas separadas por comas) y filtros de igualdad por
+    columna (`?columna=valor`).
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM CambiosEstado")
-            cambios_estado = cursor.fetchall()
-            if cambios_estado is None:
-                return []
-            else:
-                return cambios_estado
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "CambiosEstado",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("CambiosEstado", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(e)
         return []
@@ -1053,14 +2005,14 @@ class CambioEstado(BaseModel):
 
 # post
 @app.post("/cambios_estado")
-def post_cambio_estado(cambio_estado: CambioEstado):
+async def post_cambio_estado(cambio_estado: CambioEstado):
     """
     Crear un nuevo cambio de estado.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+
+        def _crear(conn):
+            conn.execute(
                 "INSERT INTO CambiosEstado (idtarea, nuevo_estado, fecha_cambio) VALUES (?, ?, ?)",
                 (
                     cambio_estado.idtarea,
@@ -1068,8 +2020,19 @@ def post_cambio_estado(cambio_estado: CambioEstado):
                     cambio_estado.fecha_cambio,
                 ),
             )
-            conn.commit()
-            return {"mensaje": "Cambio de estado creado exitosamente"}
+            publicar_al_confirmar(
+                conn,
+                "estado_cambiado",
+                tareas_afectadas(conn, [cambio_estado.idtarea]),
+                {
+                    "idtarea": cambio_estado.idtarea,
+                    "estado": cambio_estado.nuevo_estado,
+                    "fecha_cambio": cambio_estado.fecha_cambio,
+                },
+            )
+
+        await get_escritor().ejecutar_async(_crear)
+        return {"mensaje": "Cambio de estado creado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -1088,24 +2051,21 @@ class CambioEstadoUpdate(BaseModel):
 
 # put
 @app.put("/cambios_estado/{idcambio}")
-def put_cambio_estado(idcambio: int, cambio_estado: CambioEstadoUpdate):
+async def put_cambio_estado(idcambio: int, cambio_estado: CambioEstadoUpdate):
     """
     Actualizar un cambio de estado.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE CambiosEstado SET idtarea = ?, nuevo_estado = ?, fecha_cambio = ? WHERE idcambio = ?",
-                (
-                    cambio_estado.idtarea,
-                    cambio_estado.nuevo_estado,
-                    cambio_estado.fecha_cambio,
-                    idcambio,
-                ),
-            )
-            conn.commit()
-            return {"mensaje": "Cambio de estado actualizado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "UPDATE CambiosEstado SET idtarea = ?, nuevo_estado = ?, fecha_cambio = ? WHERE idcambio = ?",
+            (
+                cambio_estado.idtarea,
+                cambio_estado.nuevo_estado,
+                cambio_estado.fecha_cambio,
+                idcambio,
+            ),
+        )
+        return {"mensaje": "Cambio de estado actualizado exitosamente"}
     except Exception as e:
         print(e)
         return []
@@ -1113,107 +2073,504 @@ def put_cambio_estado(idcambio: int, cambio_estado: CambioEstadoUpdate):
 
 # delete
 @app.delete("/cambios_estado/{idcambio}")
-def delete_cambio_estado(idcambio: int):
+async def delete_cambio_estado(idcambio: int):
     """
     Eliminar un cambio de estado.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM CambiosEstado WHERE idcambio = ?", (idcambio,))
-            conn.commit()
-            return {"mensaje": "Cambio de estado eliminado exitosamente"}
+        await get_escritor().ejecutar_sql_async(
+            "DELETE FROM CambiosEstado WHERE idcambio = ?", (idcambio,)
+        )
+        return {"mensaje": "Cambio de estado eliminado exitosamente"}
+    except Exception as e:
+        print(e)
+        return []
+
+
+class EstadoTareaSalida(BaseModel):
+    idtarea: int
+    estado: Optional[str] = None
+    fecha_cambio: Optional[str] = None
+    idcambio: Optional[int] = None
+
+
+# get del estado actual de las tareas
+@app.get("/estados_tareas", responses={200: {"model": Pagina[EstadoTareaSalida]}})
+async def get_estados_tareas(
+    request: Request,
+    cursor: Optional[int] = None,
+    limite: int = LIMITE_POR_DEFECTO,
+    fields: Optional[str] = None,
+):
+    """
+    Obtener el estado actual de las tareas (su último cambio de estado)
+    paginado por idtarea.
+
+    Acepta `cursor`, `limite`, `fields` y filtros de igualdad por columna,
+    por ejemplo `?estado=entregado`.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    listar_json,
+                    "EstadoActualTarea",
+                    cursor,
+                    limite,
+                    fields,
+                    filtros_de("EstadoActualTarea", request.query_params),
+                )
+            )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# reconstruir el estado actual desde el historial
+@app.post("/estados_tareas/reconstruir")
+async def post_reconstruir_estados():
+    """
+    Volver a calcular el estado actual de todas las tareas a partir de
+    CambiosEstado. Los triggers lo mantienen al día; esto es para reparar
+    la tabla si se modificó a mano.
+    """
+    try:
+        tareas = await get_escritor().ejecutar_async(reconstruir_estados)
+        return {"mensaje": "Estados reconstruidos exitosamente", "tareas": tareas}
+    except Exception as e:
+        print(e)
+        return JSONResponse(
+            content={"mensaje": "Error al reconstruir los estados"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+# metodo get para el estado actual de una tarea
+@app.get("/tareas/{idtarea}/estado", responses={200: {"model": EstadoTareaSalida}})
+async def get_estado_tarea(idtarea: int):
+    """
+    Obtener el estado actual de una tarea sin recorrer su historial.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            estado = await conn.fetchone(
+                f"SELECT {objeto_json(TABLAS['EstadoActualTarea'][1])} FROM EstadoActualTarea WHERE idtarea = ?",
+                (idtarea,),
+            )
+        if estado is None:
+            raise HTTPException(
+                status_code=404, detail="La tarea no tiene cambios de estado"
+            )
+        return RespuestaJSON(estado[0])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        return []
+
+
+# metodo get para el historial de estados de una tarea
+@app.get(
+    "/tareas/{idtarea}/historial",
+    responses={200: {"model": List[CambioEstadoSalida]}},
+)
+async def get_historial_tarea(
+    idtarea: int, desde: Optional[str] = None, hasta: Optional[str] = None
+):
+    """
+    Obtener los cambios de estado de una tarea en orden cronológico,
+    opcionalmente entre las fechas `desde` y `hasta` (AAAA-MM-DD, ambas
+    incluidas). Usa el índice (idtarea, fecha_cambio).
+    """
+    try:
+        condicion = "idtarea = ?"
+        parametros = [idtarea]
+        if desde is not None:
+            condicion += " AND fecha_cambio >= ?"
+            parametros.append(desde)
+        if hasta is not None:
+            condicion += " AND fecha_cambio <= ?"
+            parametros.append(hasta)
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(
+                await conn.run(
+                    filas_json,
+                    "CambiosEstado",
+                    condicion + " ORDER BY fecha_cambio, idcambio",
+                    parametros,
+                )
+            )
+    except Exception as e:
+        print(e)
+        return []
+
+
+# columnas de ResumenCambiosEstado
+COLUMNAS_RESUMEN_CAMBIOS = (
+    "idtarea",
+    "nuevo_estado",
+    "cambios",
+    "primera_fecha",
+    "ultima_fecha",
+)
+
+
+class ResumenCambiosSalida(BaseModel):
+    idtarea: int
+    nuevo_estado: str
+    cambios: int
+    primera_fecha: Optional[str] = None
+    ultima_fecha: Optional[str] = None
+
+
+# metodo get para el historial compactado de una tarea
+@app.get(
+    "/tareas/{idtarea}/historial/resumen",
+    responses={200: {"model": List[ResumenCambiosSalida]}},
+)
+async def get_resumen_historial_tarea(idtarea: int):
+    """
+    Obtener, por estado, cuántos cambios antiguos de la tarea se resumieron
+    al compactar CambiosEstado y entre qué fechas ocurrieron.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            filas = await conn.fetchall(
+                f"SELECT {objeto_json(COLUMNAS_RESUMEN_CAMBIOS)} FROM ResumenCambiosEstado WHERE idtarea = ? ORDER BY primera_fecha",
+                (idtarea,),
+            )
+        return RespuestaJSON("[" + ",".join(fila[0] for fila in filas) + "]")
     except Exception as e:
         print(e)
         return []
 
 
+# compactación a pedido
+@app.post("/compactacion")
+async def post_compactacion():
+    """
+    Ejecutar ahora la compactación que normalmente corre en segundo plano:
+    resume el historial viejo de CambiosEstado, archiva en paquetes zip los
+    archivos de entregas antiguas y libera páginas de la base.
+    """
+    try:
+        resultado = await run_in_threadpool(compactar)
+    except Exception as e:
+        print(e)
+        return JSONResponse(
+            content={"mensaje": "Error al compactar"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    if resultado is None:
+        raise HTTPException(status_code=409, detail="Ya hay una compactación en curso")
+    return resultado
+
+
 # metodo get para obtener todas las tareas de un estudiante por id
-@app.get("/tareas_estudiante/{idestudiante}")
-def get_tareas_estudiante(idestudiante: int):
+@app.get(
+    "/tareas_estudiante/{idestudiante}", responses={200: {"model": List[TareaSalida]}}
+)
+async def get_tareas_estudiante(idestudiante: int):
     """
     Obtener todas las tareas de un estudiante.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM Tareas WHERE idestudiante = ?", (idestudiante,)
+
+        async def _consultar():
+            async with DatabaseConnectionAsync() as conn:
+                return await conn.run(
+                    filas_json, "Tareas", "idestudiante = ?", (idestudiante,)
+                )
+
+        return RespuestaJSON(
+            await cacheado_async(
+                ("tareas_estudiante", idestudiante),
+                [f"estudiante:{idestudiante}"],
+                _consultar,
             )
-            tareas = cursor.fetchall()
-            if tareas is None:
-                return []
-            else:
-                return tareas
+        )
     except Exception as e:
         print(e)
         return []
 
 
 # metodo get para obtener todas las tareas de un profesor por id
-@app.get("/tareas_profesor/{idprofesor}")
-def get_tareas_profesor(idprofesor: int):
+@app.get("/tareas_profesor/{idprofesor}", responses={200: {"model": List[TareaSalida]}})
+async def get_tareas_profesor(idprofesor: int):
     """
     Obtener todas las tareas de un profesor.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM Tareas WHERE idclase IN (SELECT idclase FROM Clases WHERE idprofesor = ?)",
-                (idprofesor,),
+
+        async def _consultar():
+            async with DatabaseConnectionAsync() as conn:
+                return await conn.run(
+                    filas_json,
+                    "Tareas",
+                    "idclase IN (SELECT idclase FROM Clases WHERE idprofesor = ?)",
+                    (idprofesor,),
+                )
+
+        return RespuestaJSON(
+            await cacheado_async(
+                ("tareas_profesor", idprofesor), [f"profesor:{idprofesor}"], _consultar
             )
-            tareas = cursor.fetchall()
-            if tareas is None:
-                return []
-            else:
-                return tareas
+        )
     except Exception as e:
         print(e)
         return []
 
 
 # metodo get para obtener todas las tareas de una clase por id
-@app.get("/tareas_clase/{idclase}")
-def get_tareas_clase(idclase: int):
+@app.get("/tareas_clase/{idclase}", responses={200: {"model": List[TareaSalida]}})
+async def get_tareas_clase(idclase: int):
     """
     Obtener todas las tareas de una clase.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Tareas WHERE idclase = ?", (idclase,))
-            tareas = cursor.fetchall()
-            if tareas is None:
-                return []
-            else:
-                return tareas
+
+        async def _consultar():
+            async with DatabaseConnectionAsync() as conn:
+                return await conn.run(filas_json, "Tareas", "idclase = ?", (idclase,))
+
+        return RespuestaJSON(
+            await cacheado_async(
+                ("tareas_clase", idclase), [f"clase:{idclase}"], _consultar
+            )
+        )
     except Exception as e:
         print(e)
         return []
 
 
 # metodo get para obtener todas las tareas de un profesor por de de clase
-@app.get("/tareas_profesor_clase/{idprofesor}/{idclase}")
-def get_tareas_profesor_clase(idprofesor: int, idclase: int):
+@app.get(
+    "/tareas_profesor_clase/{idprofesor}/{idclase}",
+    responses={200: {"model": List[TareaSalida]}},
+)
+async def get_tareas_profesor_clase(idprofesor: int, idclase: int):
     """
     Obtener todas las tareas de un profesor por id de clase.
     """
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM Tareas WHERE idclase = ? AND idclase IN (SELECT idclase FROM Clases WHERE idprofesor = ?)",
-                (
-                    idclase,
-                    idprofesor,
-                ),
+
+        async def _consultar():
+            async with DatabaseConnectionAsync() as conn:
+                return await conn.run(
+                    filas_json,
+                    "Tareas",
+                    "idclase = ? AND idclase IN (SELECT idclase FROM Clases WHERE idprofesor = ?)",
+                    (idclase, idprofesor),
+                )
+
+        # cambia si cambian las tareas de la clase o el profesor de la clase
+        return RespuestaJSON(
+            await cacheado_async(
+                ("tareas_profesor_clase", idprofesor, idclase),
+                [f"clase:{idclase}", f"profesor:{idprofesor}"],
+                _consultar,
             )
-            tareas = cursor.fetchall()
-            if tareas is None:
-                return []
-            else:
-                return tareas
+        )
+    except Exception as e:
+        print(e)
+        return []
+
+
+# modelos de salida del tablero del estudiante
+class TareaTablero(TareaSalida):
+    entrega: Optional[EntregaSalida] = None
+    ultimo_cambio: Optional[CambioEstadoSalida] = None
+
+
+class TableroEstudiante(BaseModel):
+    estudiante: EstudianteSalida
+    tareas: List[TareaTablero]
+
+
+# Las tareas con su última entrega y su último cambio de estado, en una sola
+# consulta: cada subconsulta usa idx_entregas_idtarea o
+# idx_cambiosestado_idtarea_fecha y devuelve a lo sumo una fila. json()
+# conserva el objeto como JSON al pasar por la subconsulta.
+SQL_TABLERO = f"""
+SELECT json_object(
+  {pares_json(TABLAS["Tareas"][1], "t")},
+  'entrega', json((
+    SELECT {objeto_json(TABLAS["Entregas"][1], "e")}
+    FROM Entregas e
+    WHERE e.idtarea = t.idtarea AND e.idestudiante = t.idestudiante
+    ORDER BY e.identrega DESC
+    LIMIT 1
+  )),
+  'ultimo_cambio', json((
+    SELECT {objeto_json(TABLAS["CambiosEstado"][1], "c")}
+    FROM CambiosEstado c
+    WHERE c.idtarea = t.idtarea
+    ORDER BY c.fecha_cambio DESC, c.idcambio DESC
+    LIMIT 1
+  ))
+)
+FROM VistaTareas t
+WHERE t.idestudiante = ?
+ORDER BY t.fecha_vencimiento, t.idtarea
+"""
+
+
+# metodo get para el tablero de un estudiante
+@app.get(
+    "/estudiantes/{idestudiante}/dashboard",
+    responses={200: {"model": TableroEstudiante}},
+)
+async def get_tablero_estudiante(idestudiante: int):
+    """
+    Obtener en una sola llamada los datos de la pantalla principal de un
+    estudiante: sus tareas, cada una con su última entrega y su último
+    cambio de estado.
+    """
+    try:
+
+        def _consultar(conn):
+            estudiante = conn.execute(
+                f"SELECT {objeto_json(TABLAS['Estudiantes'][1])} FROM Estudiantes WHERE idestudiante = ?",
+                (idestudiante,),
+            ).fetchone()
+            if estudiante is None:
+                return None
+            tareas = conn.execute(SQL_TABLERO, (idestudiante,)).fetchall()
+            return (
+                '{"estudiante":'
+                + estudiante[0]
+                + ',"tareas":['
+                + ",".join(tarea[0] for tarea in tareas)
+                + "]}"
+            )
+
+        async with DatabaseConnectionAsync() as conn:
+            tablero = await conn.run(_consultar)
+        if tablero is None:
+            raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+        return RespuestaJSON(tablero)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        return []
+
+
+# modelos de salida de la cola de corrección del profesor
+class ResumenTareaProfesor(BaseModel):
+    # las tareas comunes se agrupan por plantilla; idtarea es la primera
+    idtarea: int
+    idplantilla: Optional[int] = None
+    nombre_tarea: Optional[str] = None
+    fecha_vencimiento: Optional[str] = None
+    idclase: Optional[int] = None
+    asignadas: int
+    entregadas: int
+    pendientes: int
+    tardias: int
+
+
+class EntregaPorRevisar(EntregaSalida):
+    nombre_tarea: Optional[str] = None
+    tardia: bool
+
+
+class PendientesProfesor(BaseModel):
+    tareas: List[ResumenTareaProfesor]
+    por_revisar: List[EntregaPorRevisar]
+
+
+# estado que deja el profesor al corregir; lo demás queda por revisar
+ESTADO_CALIFICADO = "calificado"
+
+# Los contadores salen de ResumenEntregas (una fila por tarea, mantenida por
+# triggers al insertar, cambiar o borrar entregas), así que el costo depende
+# de las tareas del profesor y no del total de entregas.
+SQL_RESUMEN_PROFESOR = """
+SELECT json_object(
+  'idtarea', MIN(t.idtarea),
+  'idplantilla', t.idplantilla,
+  'nombre_tarea', t.nombre_tarea,
+  'fecha_vencimiento', t.fecha_vencimiento,
+  'idclase', t.idclase,
+  'asignadas', COUNT(*),
+  'entregadas', COUNT(r.idtarea),
+  'pendientes', COUNT(*) - COUNT(r.idtarea),
+  'tardias', COUNT(CASE WHEN r.fecha_ultima > t.fecha_vencimiento THEN 1 END)
+)
+FROM Clases c
+JOIN VistaTareas t ON t.idclase = c.idclase
+LEFT JOIN ResumenEntregas r ON r.idtarea = t.idtarea
+WHERE c.idprofesor = ?
+GROUP BY COALESCE(-t.idplantilla, t.idtarea)
+ORDER BY t.fecha_vencimiento, MIN(t.idtarea)
+"""
+
+# La última entrega de cada tarea cuyo estado actual no es la corrección,
+# de la más antigua a la más nueva.
+SQL_POR_REVISAR = f"""
+SELECT json_object(
+  {pares_json(TABLAS["Entregas"][1], "e")},
+  'nombre_tarea', t.nombre_tarea,
+  'tardia', json(CASE WHEN e.fecha_entrega > t.fecha_vencimiento THEN 'true' ELSE 'false' END)
+)
+FROM Clases c
+JOIN VistaTareas t ON t.idclase = c.idclase
+JOIN ResumenEntregas r ON r.idtarea = t.idtarea
+JOIN Entregas e ON e.identrega = r.ultima_entrega
+LEFT JOIN EstadoActualTarea ea ON ea.idtarea = t.idtarea
+WHERE c.idprofesor = ? AND ea.estado IS NOT ?
+ORDER BY e.fecha_entrega, e.identrega
+LIMIT ?
+"""
+
+
+# metodo get para la cola de corrección de un profesor
+@app.get(
+    "/profesores/{idprofesor}/pendientes",
+    responses={200: {"model": PendientesProfesor}},
+)
+async def get_pendientes_profesor(idprofesor: int, limite: int = LIMITE_POR_DEFECTO):
+    """
+    Obtener, por cada tarea de las clases del profesor, cuántos estudiantes
+    entregaron, cuántos faltan y cuántos entregaron tarde, junto con las
+    entregas que todavía no se corrigieron (hasta `limite`).
+    """
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise HTTPException(
+            status_code=400, detail=f"limite debe estar entre 1 y {LIMITE_MAXIMO}"
+        )
+    try:
+
+        def _consultar(conn):
+            if (
+                conn.execute(
+                    "SELECT 1 FROM Profesores WHERE idprofesor = ?", (idprofesor,)
+                ).fetchone()
+                is None
+            ):
+                return None
+            tareas = conn.execute(SQL_RESUMEN_PROFESOR, (idprofesor,)).fetchall()
+            entregas = conn.execute(
+                SQL_POR_REVISAR, (idprofesor, ESTADO_CALIFICADO, limite)
+            ).fetchall()
+            return (
+                '{"tareas":['
+                + ",".join(tarea[0] for tarea in tareas)
+                + '],"por_revisar":['
+                + ",".join(entrega[0] for entrega in entregas)
+                + "]}"
+            )
+
+        async with DatabaseConnectionAsync() as conn:
+            pendientes = await conn.run(_consultar)
+        if pendientes is None:
+            raise HTTPException(status_code=404, detail="Profesor no encontrado")
+        return RespuestaJSON(pendientes)
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         return []
@@ -1229,45 +2586,179 @@ class TareaCreate(BaseModel):
 
 # Ruta para obtener todos los estudiantes de una clase y crear una tarea común para cada uno
 @app.post("/tareas/comun")
-def create_common_task(tarea_create: TareaCreate):
+async def create_common_task(tarea_create: TareaCreate):
     try:
-        with DatabaseConnection() as conn:
-            cursor = conn.cursor()
 
-            # Obtener todos los estudiantes de una clase
-            cursor.execute(
-                "SELECT idestudiante FROM Estudiantes WHERE idclase = ?",
-                (tarea_create.idclase,),
+        def _crear(conn):
+            # Guardar una sola vez los datos compartidos de la tarea
+            idplantilla = conn.execute(
+                "INSERT INTO PlantillasTarea (nombre_tarea, instrucciones, fecha_vencimiento, idclase) VALUES (?, ?, ?, ?)",
+                (
+                    tarea_create.nombre_tarea,
+                    tarea_create.instrucciones,
+                    tarea_create.fecha_vencimiento,
+                    tarea_create.idclase,
+                ),
+            ).lastrowid
+
+            # Asignar la tarea a todos los estudiantes de la clase en una sola sentencia
+            cursor = conn.execute(
+                """
+                INSERT INTO Tareas (idclase, idestudiante, estado, idplantilla)
+                SELECT idclase, idestudiante, ?, ?
+                FROM Estudiantes
+                WHERE idclase = ?
+                """,
+                (tarea_create.estado, idplantilla, tarea_create.idclase),
             )
-            estudiantes = cursor.fetchall()
-
-            # Insertar una tarea común para cada estudiante
-            for estudiante in estudiantes:
-                id_estudiante = estudiante["idestudiante"]
-                cursor.execute(
-                    """
-                    INSERT INTO Tareas (nombre_tarea, instrucciones, fecha_vencimiento, idclase, idestudiante, estado)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        tarea_create.nombre_tarea,
-                        tarea_create.instrucciones,
-                        tarea_create.fecha_vencimiento,
-                        tarea_create.idclase,
-                        id_estudiante,
-                        tarea_create.estado,
-                    ),
-                )
+            asignadas = conn.execute(
+                "SELECT DISTINCT idclase, idestudiante FROM Tareas WHERE idplantilla = ?",
+                (idplantilla,),
+            ).fetchall()
+            invalidar_tareas(conn, asignadas)
+            # un solo evento para toda la clase y su profesor
+            publicar_al_confirmar(
+                conn,
+                "tarea_comun_creada",
+                asignadas,
+                {
+                    "idplantilla": idplantilla,
+                    "idclase": tarea_create.idclase,
+                    "nombre_tarea": tarea_create.nombre_tarea,
+                    "fecha_vencimiento": tarea_create.fecha_vencimiento,
+                },
+            )
+            return idplantilla, cursor.rowcount
 
-            conn.commit()
+        idplantilla, asignadas = await get_escritor().ejecutar_async(_crear)
 
-            return JSONResponse(
-                content={"mensaje": "Tarea común creada exitosamente"},
-                status_code=status.HTTP_201_CREATED,
-            )
+        return JSONResponse(
+            content={
+                "mensaje": "Tarea común creada exitosamente",
+                "idplantilla": idplantilla,
+                "tareas": asignadas,
+            },
+            status_code=status.HTTP_201_CREATED,
+        )
     except Exception as e:
         print(e)
         return JSONResponse(
             content={"mensaje": "Error al crear tarea común"},
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+
+# modelos de salida del feed de cambios
+class CambioSalida(BaseModel):
+    seq: int
+    tabla: str
+    id: int
+    operacion: str
+    # fila actual con las columnas de los listados; null en las bajas
+    datos: Optional[dict] = None
+
+
+class FeedCambios(BaseModel):
+    datos: List[CambioSalida]
+    next_since: int
+    hay_mas: bool
+
+
+# feed de cambios para sincronización incremental
+@app.get("/cambios", responses={200: {"model": FeedCambios}})
+async def get_cambios(
+    since: int = 0,
+    limite: int = Query(LIMITE_POR_DEFECTO, alias="limit"),
+    tablas: Optional[str] = None,
+):
+    """
+    Obtener los registros que cambiaron después de `since` (el next_since
+    de la sincronización anterior; 0 trae todo), hasta `limit` por
+    llamada. Cada registro viene una sola vez con sus datos actuales, o
+    como baja con `operacion: "delete"`. Mientras `hay_mas` sea true se
+    vuelve a pedir con el nuevo next_since.
+    """
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            return RespuestaJSON(await conn.run(cambios_json, since, limite, tablas))
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(e)
+        return []
+
+
+# Eventos en vivo (Server-Sent Events) para no consultar cada pocos
+# segundos: el stream empieza con `conectado` y su seq; lo anterior a ese
+# seq se pide a /cambios. Si el cliente no lee a tiempo recibe `reiniciar`
+# y el stream se cierra: vuelve a sincronizar con /cambios y reconecta.
+SQL_SEQ_ACTUAL = "(SELECT COALESCE(MAX(seq), 0) FROM Cambios)"
+
+
+async def _stream(tabla, clave, id, canal, no_encontrado):
+    try:
+        async with DatabaseConnectionAsync() as conn:
+            fila = await conn.fetchone(
+                f"SELECT {SQL_SEQ_ACTUAL} FROM {tabla} WHERE {clave} = ?", (id,)
+            )
+    except Exception as e:
+        print(e)
+        return []
+    if fila is None:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    return respuesta_eventos(canal, fila[0])
+
+
+@app.get("/stream/estudiante/{idestudiante}")
+async def stream_estudiante(idestudiante: int):
+    """
+    Eventos de las tareas del estudiante: tarea_creada, tarea_comun_creada,
+    entrega_creada, entrega_actualizada, entrega_eliminada y
+    estado_cambiado.
+    """
+    return await _stream(
+        "Estudiantes",
+        "idestudiante",
+        idestudiante,
+        f"estudiante:{idestudiante}",
+        "Estudiante no encontrado",
+    )
+
+
+@app.get("/stream/profesor/{idprofesor}")
+async def stream_profesor(idprofesor: int):
+    """
+    Los mismos eventos para las tareas de las clases del profesor.
+    """
+    return await _stream(
+        "Profesores",
+        "idprofesor",
+        idprofesor,
+        f"profesor:{idprofesor}",
+        "Profesor no encontrado",
+    )
+
+
+# exportacion completa de una tabla en NDJSON
+@app.get("/export/{tabla}")
+async def export_tabla(request: Request, tabla: str, fields: Optional[str] = None):
+    """
+    Exportar una tabla completa como NDJSON (una fila JSON por línea).
+
+    Las filas se leen por bloques y se envían a medida que llegan, así que
+    la memoria usada no depende del tamaño de la tabla. Acepta `fields` y
+    los mismos filtros de igualdad que los listados.
+    """
+    if tabla not in EXPORTABLES:
+        raise HTTPException(status_code=404, detail="Tabla no encontrada")
+    nombre_tabla = EXPORTABLES[tabla]
+    try:
+        contenido = exportar_ndjson(
+            get_pool_async(),
+            nombre_tabla,
+            fields,
+            filtros_de(nombre_tabla, request.query_params),
+        )
+    except ConsultaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(contenido, media_type="application/x-ndjson")
@@ -0,0 +1,414 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+from escritor import get_escritor
+
+DIRECTORIO_PDF = os.environ.get("COLEGIO_DIRECTORIO_PDF", "pdf")
+# almacén por contenido: pdf/blobs/ab/cd/<sha256>
+DIRECTORIO_BLOBS = Path(DIRECTORIO_PDF) / "blobs"
+# paquetes zip con los archivos de entregas antiguas y sus copias extraídas
+DIRECTORIO_ARCHIVO = Path(DIRECTORIO_PDF) / "archivo"
+DIRECTORIO_RESTAURADOS = Path(DIRECTORIO_PDF) / "restaurados"
+TAMANO_BLOQUE = 1024 * 1024
+TAMANO_MAXIMO = int(os.environ.get("COLEGIO_MAX_ENTREGA_MB", "25")) * 1024 * 1024
+# segundos que el navegador puede reusar un archivo sin volver a preguntar
+CACHE_ENTREGAS = int(os.environ.get("COLEGIO_CACHE_ENTREGAS_SEG", "300"))
+# cabeceras que se repiten en una respuesta 304
+CABECERAS_VALIDACION = ("etag", "last-modified", "cache-control")
+# huellas recordadas de archivos anteriores al almacén por contenido
+HUELLAS_ANTIGUAS_MAXIMO = 4096
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """
+    La subida superó TAMANO_MAXIMO.
+    """
+
+
+def _escribir_bloque(destino, huella, bloque):
+    huella.update(bloque)
+    destino.write(bloque)
+
+
+def _cerrar_en_disco(destino):
+    destino.flush()
+    os.fsync(destino.fileno())
+    destino.close()
+
+
+async def recibir_archivo(
+    archivo, directorio=DIRECTORIO_PDF, tamano_maximo=TAMANO_MAXIMO
+):
+    """
+    Copiar la subida a un archivo temporal dentro de `directorio` en bloques
+    de TAMANO_BLOQUE, sin bloquear el event loop y sin juntar el archivo
+    completo en memoria. Corta apenas se supera `tamano_maximo`. Devuelve la
+    ruta temporal, el tamaño y el SHA-256 del contenido (calculado mientras
+    se copia); el archivo ya está sincronizado en disco.
+    """
+    Path(directorio).mkdir(parents=True, exist_ok=True)
+    tamano_declarado = getattr(archivo, "size", None)
+    if tamano_declarado is not None and tamano_declarado > tamano_maximo:
+        raise ArchivoDemasiadoGrande(tamano_declarado)
+
+    # mismo directorio que el destino final para que el rename sea atómico
+    destino = tempfile.NamedTemporaryFile(
+        dir=directorio, prefix=".subida-", suffix=".tmp", delete=False
+    )
+    ruta_temporal = Path(destino.name)
+    total = 0
+    huella = hashlib.sha256()
+    try:
+        while True:
+            bloque = await archivo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            total += len(bloque)
+            if total > tamano_maximo:
+                raise ArchivoDemasiadoGrande(total)
+            await run_in_threadpool(_escribir_bloque, destino, huella, bloque)
+        await run_in_threadpool(_cerrar_en_disco, destino)
+    except BaseException:
+        destino.close()
+        ruta_temporal.unlink(missing_ok=True)
+        raise
+    return ruta_temporal, total, huella.hexdigest()
+
+
+def preparar_directorios():
+    DIRECTORIO_BLOBS.mkdir(parents=True, exist_ok=True)
+    DIRECTORIO_ARCHIVO.mkdir(parents=True, exist_ok=True)
+    DIRECTORIO_RESTAURADOS.mkdir(parents=True, exist_ok=True)
+
+
+def nombre_seguro(nombre_original):
+    """
+    Quitar cualquier ruta del nombre enviado por el cliente.
+    """
+    nombre = Path(nombre_original or "").name.strip()
+    return nombre or "archivo"
+
+
+def ruta_blob(huella):
+    return DIRECTORIO_BLOBS / huella[:2] / huella[2:4] / huella
+
+
+def ruta_entrega(entrega):
+    """
+    Ruta en disco del archivo de una entrega. Las entregas anteriores al
+    almacén por contenido no tienen hash y siguen en pdf/<nombre_archivo>.
+    """
+    if entrega["hash_archivo"]:
+        return ruta_blob(entrega["hash_archivo"])
+    return Path(DIRECTORIO_PDF) / entrega["nombre_archivo"]
+
+
+@contextmanager
+def candado(ruta):
+    """
+    Bloqueo exclusivo entre procesos (flock sobre `ruta`) sin esperar: da
+    True si se obtuvo y False si lo tiene otro proceso.
+    """
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, "w") as archivo:
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def huella_archivo(ruta):
+    """
+    SHA-256 y tamaño de un archivo en disco, leído por bloques.
+    """
+    huella = hashlib.sha256()
+    total = 0
+    with open(ruta, "rb") as origen:
+        while bloque := origen.read(TAMANO_BLOQUE):
+            huella.update(bloque)
+            total += len(bloque)
+    return huella.hexdigest(), total
+
+
+def empaquetar(archivos, directorio=DIRECTORIO_ARCHIVO):
+    """
+    Comprimir en un zip nuevo los archivos dados como pares (huella, ruta);
+    cada uno queda guardado con su huella como nombre. Los que ya no están
+    en disco se omiten. El zip se escribe aparte y se renombra al terminar,
+    ya sincronizado en disco. Devuelve (nombre del paquete, huellas
+    guardadas), o (None, []) si no había nada que guardar.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    destino = tempfile.NamedTemporaryFile(
+        dir=directorio, prefix=".paquete-", suffix=".tmp", delete=False
+    )
+    ruta_temporal = Path(destino.name)
+    guardadas = []
+    try:
+        with zipfile.ZipFile(
+            destino, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6
+        ) as paquete:
+            for huella, ruta in archivos:
+                if huella in guardadas or not Path(ruta).exists():
+                    continue
+                paquete.write(ruta, arcname=huella)
+                guardadas.append(huella)
+        _cerrar_en_disco(destino)
+        if not guardadas:
+            ruta_temporal.unlink(missing_ok=True)
+            return None, []
+        nombre = (
+            f"entregas-{datetime.now():%Y%m%d-%H%M%S}-{ruta_temporal.stem[-8:]}.zip"
+        )
+        os.replace(ruta_temporal, directorio / nombre)
+    except BaseException:
+        destino.close()
+        ruta_temporal.unlink(missing_ok=True)
+        raise
+    return nombre, guardadas
+
+
+def restaurar_archivado(huella, paquete):
+    """
+    Extraer un archivo de su paquete a pdf/restaurados/<huella> (una sola
+    vez; las siguientes descargas usan la copia) y devolver la ruta. zipfile
+    verifica el CRC al leer el miembro completo.
+    """
+    destino = DIRECTORIO_RESTAURADOS / huella
+    if destino.exists():
+        return destino
+    DIRECTORIO_RESTAURADOS.mkdir(parents=True, exist_ok=True)
+    temporal = tempfile.NamedTemporaryFile(
+        dir=DIRECTORIO_RESTAURADOS, prefix=".restaurando-", delete=False
+    )
+    try:
+        with zipfile.ZipFile(DIRECTORIO_ARCHIVO / paquete) as zip_paquete:
+            with zip_paquete.open(huella) as origen:
+                shutil.copyfileobj(origen, temporal, TAMANO_BLOQUE)
+        temporal.close()
+        os.replace(temporal.name, destino)
+    except BaseException:
+        temporal.close()
+        Path(temporal.name).unlink(missing_ok=True)
+        raise
+    return destino
+
+
+async def ruta_disponible(entrega):
+    """
+    Ruta desde la que se puede servir el archivo de una entrega: el
+    almacén (o pdf/ para las antiguas) y, si el archivo ya se archivó, la
+    copia extraída de su paquete. `entrega` trae nombre_archivo,
+    hash_archivo y paquete. Devuelve None si el archivo no existe.
+    """
+    ruta = ruta_entrega(entrega)
+    if ruta.exists():
+        return ruta
+    if entrega["paquete"]:
+        return await run_in_threadpool(
+            restaurar_archivado, entrega["hash_archivo"], entrega["paquete"]
+        )
+    return None
+
+
+_huellas_antiguas = OrderedDict()
+_huellas_antiguas_lock = threading.Lock()
+
+
+def huella_antigua(ruta):
+    """
+    SHA-256 de un archivo de pdf/ anterior al almacén por contenido, para
+    su ETag. Se calcula en la primera lectura y se recuerda mientras el
+    archivo no cambie: la clave incluye st_ctime_ns, que cualquier
+    reescritura actualiza aunque conserve el tamaño y la fecha de
+    modificación.
+    """
+    estado = os.stat(ruta)
+    clave = (
+        str(ruta),
+        estado.st_ino,
+        estado.st_size,
+        estado.st_mtime_ns,
+        estado.st_ctime_ns,
+    )
+    with _huellas_antiguas_lock:
+        huella = _huellas_antiguas.get(clave)
+        if huella is not None:
+            _huellas_antiguas.move_to_end(clave)
+            return huella
+    huella, _ = huella_archivo(ruta)
+    with _huellas_antiguas_lock:
+        _huellas_antiguas[clave] = huella
+        while len(_huellas_antiguas) > HUELLAS_ANTIGUAS_MAXIMO:
+            _huellas_antiguas.popitem(last=False)
+    return huella
+
+
+async def huella_servida(entrega, ruta):
+    """
+    Huella del contenido que se sirve para una entrega: la del almacén o,
+    para las antiguas, la calculada (fuera del event loop) de su archivo.
+    """
+    if entrega["hash_archivo"]:
+        return entrega["hash_archivo"]
+    return await run_in_threadpool(huella_antigua, ruta)
+
+
+def _no_modificado(request, etag, modificado):
+    """
+    Evaluar If-None-Match (comparación débil, como pide RFC 9110 para GET)
+    y, solo si no viene, If-Modified-Since.
+    """
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide is not None:
+        etiquetas = {
+            etiqueta.strip().removeprefix("W/")
+            for etiqueta in si_no_coincide.split(",")
+        }
+        return "*" in etiquetas or etag.removeprefix("W/") in etiquetas
+    si_modificado = request.headers.get("if-modified-since")
+    if si_modificado is not None:
+        try:
+            fecha = parsedate_to_datetime(si_modificado)
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified tiene resolución de segundos
+        return int(modificado) <= fecha.timestamp()
+    return False
+
+
+def respuesta_archivo(request, ruta, huella=None, filename=None):
+    """
+    Servir el archivo de una entrega con validación de caché.
+
+    El ETag es fuerte y sale del SHA-256 del contenido (`huella`, ver
+    huella_servida); sin huella queda el ETag de Starlette (fecha y
+    tamaño). Con If-None-Match/If-Modified-Since
+    que coinciden se responde 304 sin cuerpo. FileResponse atiende Range
+    (206, varios rangos como multipart/byteranges) e If-Range.
+    """
+    estado = ruta.stat()
+    cabeceras = {"Cache-Control": f"private, max-age={CACHE_ENTREGAS}"}
+    if huella:
+        cabeceras["ETag"] = f'"{huella}"'
+    respuesta = FileResponse(
+        ruta,
+        media_type="application/pdf",
+        filename=filename,
+        stat_result=estado,
+        headers=cabeceras,
+    )
+    if _no_modificado(request, respuesta.headers["etag"], estado.st_mtime):
+        return Response(
+            status_code=304,
+            headers={
+                cabecera: respuesta.headers[cabecera]
+                for cabecera in CABECERAS_VALIDACION
+            },
+        )
+    return respuesta
+
+
+def guardar_blob(conn, ruta_temporal, huella, tamano):
+    """
+    Dentro de un trabajo del escritor: sumar una referencia al contenido y
+    dejar el temporal en el almacén (si ya estaba, el temporal queda para
+    que lo borre quien lo subió). El archivo se mueve antes del COMMIT, así
+    que un error de disco hace fallar el trabajo en vez de dejar un
+    registro sin archivo; si el trabajo o el lote se revierten, vuelve a
+    su lugar.
+
+    El rename corre en el hilo escritor, igual que los borrados de
+    soltar_blob, así que no compite con ellos.
+    """
+    destino = ruta_blob(huella)
+    if not destino.exists():
+        # vuelve a estar en uso: la próxima compactación decide si se archiva
+        conn.execute("DELETE FROM ArchivosArchivados WHERE hash = ?", (huella,))
+    conn.execute(
+        """
+        INSERT INTO Archivos (hash, tamano, referencias) VALUES (?, ?, 1)
+        ON CONFLICT(hash) DO UPDATE SET referencias = referencias + 1
+        """,
+        (huella, tamano),
+    )
+
+    # otro trabajo (o uno anterior del mismo lote) pudo haber subido el
+    # mismo contenido
+    if not destino.exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(ruta_temporal, destino)
+        get_escritor().al_revertir(lambda: os.replace(destino, ruta_temporal))
+
+
+def soltar_blob(conn, huella):
+    """
+    Dentro de un trabajo del escritor: restar una referencia. Si llega a
+    cero se borra el registro y, tras el COMMIT, el archivo (solo si ningún
+    trabajo posterior del mismo lote lo volvió a referenciar).
+    """
+    conn.execute(
+        "UPDATE Archivos SET referencias = referencias - 1 WHERE hash = ?", (huella,)
+    )
+    borrados = conn.execute(
+        "DELETE FROM Archivos WHERE hash = ? AND referencias <= 0", (huella,)
+    ).rowcount
+    if borrados:
+        # su copia en un paquete queda huérfana; el paquete se borra cuando
+        # ya no tiene archivos referenciados
+        conn.execute("DELETE FROM ArchivosArchivados WHERE hash = ?", (huella,))
+
+        def _borrar():
+            sigue = conn.execute(
+                "SELECT 1 FROM Archivos WHERE hash = ?", (huella,)
+            ).fetchone()
+            if sigue is None:
+                ruta_blob(huella).unlink(missing_ok=True)
+                (DIRECTORIO_RESTAURADOS / huella).unlink(missing_ok=True)
+
+        get_escritor().al_confirmar(_borrar)
+
+
+def soltar_archivo_entrega(conn, entrega):
+    """
+    Liberar el archivo de una entrega que se reemplaza o se elimina.
+
+    Un archivo antiguo de pdf/ solo se borra si ninguna otra entrega
+    antigua lo referencia por nombre.
+    """
+    if entrega["hash_archivo"]:
+        soltar_blob(conn, entrega["hash_archivo"])
+    elif entrega["nombre_archivo"]:
+        nombre = entrega["nombre_archivo"]
+        compartido = conn.execute(
+            """
+            SELECT 1 FROM Entregas
+            WHERE hash_archivo IS NULL AND nombre_archivo = ? AND identrega <> ?
+            """,
+            (nombre, entrega["identrega"]),
+        ).fetchone()
+        if compartido is None:
+            get_escritor().al_confirmar(lambda: eliminar_archivo(nombre))
+
+
+def eliminar_archivo(nombre_archivo, directorio=DIRECTORIO_PDF):
+    (Path(directorio) / nombre_archivo).unlink(missing_ok=True)
@@ -0,0 +1,514 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+from cliente_redis import ConexionRedis, ErrorRedis
+from escritor import get_escritor
+
+CACHE_TTL = float(os.environ.get("COLEGIO_CACHE_TTL", "30"))
+CACHE_MAXIMO = int(os.environ.get("COLEGIO_CACHE_MAXIMO", "1024"))
+# vacío: caché en memoria del proceso; redis://host:puerto/db: compartida
+CACHE_URL = os.environ.get("COLEGIO_CACHE_URL", "")
+CACHE_PREFIJO = os.environ.get("COLEGIO_CACHE_PREFIJO", "colegio:cache:")
+# tras un error de conexión no se vuelve a intentar durante estos segundos
+CACHE_ESPERA_REINTENTO = 1.0
+
+# Los backends exponen la misma interfaz: generacion, obtener(clave),
+# guardar(clave, valor, etiquetas, generacion), invalidar(etiquetas),
+# difundir(mensaje), limpiar(), metricas() y cerrar(). `bloqueante` indica
+# si hacen E/S de red y por lo tanto no se pueden llamar directo desde el
+# event loop.
+
+# funciones que reciben los mensajes difundidos (eventos.py registra la suya)
+_receptores = []
+
+
+def recibir_difusiones(receptor):
+    _receptores.append(receptor)
+
+
+def dejar_de_recibir(receptor):
+    if receptor in _receptores:
+        _receptores.remove(receptor)
+
+
+def _entregar(mensaje):
+    for receptor in list(_receptores):
+        try:
+            receptor(mensaje)
+        except Exception as e:
+            print(e)
+
+
+class CacheMemoria:
+    """
+    Caché en memoria del proceso con vencimiento (TTL) y expulsión LRU.
+
+    Cada entrada lleva etiquetas ("estudiante:3", "clase:1", ...) y las
+    escrituras invalidan por etiqueta solo las entradas afectadas. Una
+    lectura que empezó antes de una invalidación no guarda su resultado
+    (ver `generacion`), así no puede dejar datos viejos en la caché.
+    """
+
+    bloqueante = False
+
+    def __init__(self, ttl=CACHE_TTL, maximo=CACHE_MAXIMO):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        # clave -> (vence, valor, etiquetas), en orden de uso
+        self._entradas = OrderedDict()
+        self._por_etiqueta = {}
+        self._generacion = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidadas = 0
+        self._expulsadas = 0
+        self._vencidas = 0
+
+    @property
+    def generacion(self):
+        with self._lock:
+            return self._generacion
+
+    def _quitar(self, clave):
+        _, _, etiquetas = self._entradas.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def obtener(self, clave):
+        """
+        Devolver (True, valor) si la clave está vigente, (False, None) si no.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] <= time.monotonic():
+                self._quitar(clave)
+                self._vencidas += 1
+                entrada = None
+            if entrada is None:
+                self._fallos += 1
+                return False, None
+            self._entradas.move_to_end(clave)
+            self._aciertos += 1
+            return True, entrada[1]
+
+    def guardar(self, clave, valor, etiquetas, generacion=None):
+        """
+        Guardar `valor` salvo que haya habido una invalidación desde
+        `generacion` (la que se leyó antes de consultar la base).
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return False
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (
+                time.monotonic() + self.ttl,
+                valor,
+                tuple(etiquetas),
+            )
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while len(self._entradas) > self.maximo:
+                self._quitar(next(iter(self._entradas)))
+                self._expulsadas += 1
+            return True
+
+    def invalidar(self, etiquetas):
+        with self._lock:
+            self._generacion += 1
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self._invalidadas += 1
+
+    def difundir(self, mensaje):
+        # un solo proceso: el mensaje se entrega directo
+        _entregar(mensaje)
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+
+    def cerrar(self):
+        self.limpiar()
+
+    def metricas(self):
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "entradas": len(self._entradas),
+                "maximo": self.maximo,
+                "ttl_s": self.ttl,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": (
+                    round(self._aciertos / consultas, 4) if consultas else None
+                ),
+                "invalidadas": self._invalidadas,
+                "expulsadas": self._expulsadas,
+                "vencidas": self._vencidas,
+            }
+
+
+class CacheRedis:
+    """
+    Caché compartida entre workers sobre un servidor Redis, con una copia
+    local (CacheMemoria) en cada proceso para no ir a la red en cada
+    acierto.
+
+    Las invalidaciones borran las claves etiquetadas en Redis, suben el
+    contador de generación compartido y se publican en un canal; cada
+    worker escucha el canal y descarta las mismas etiquetas de su copia
+    local. Mientras no está suscrito, el worker no usa la copia local. Si
+    Redis no responde, las lecturas van directo a SQLite.
+
+    Por un segundo canal viajan los mensajes de difundir() (los eventos de
+    /stream), para que lleguen a los suscriptores de todos los workers.
+    """
+
+    bloqueante = True
+
+    def __init__(self, url, ttl=CACHE_TTL, maximo=CACHE_MAXIMO, prefijo=CACHE_PREFIJO):
+        self.url = url
+        self.ttl = ttl
+        self.local = CacheMemoria(ttl, maximo)
+        self._prefijo = prefijo
+        self._clave_generacion = prefijo + "generacion"
+        self.canal = prefijo + "invalidaciones"
+        self.canal_difusion = prefijo + "eventos"
+        self._conexiones = queue.LifoQueue()
+        self._sin_redis_hasta = 0.0
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._errores = 0
+        self._mensajes = 0
+        self._suscrito = threading.Event()
+        self._cerrado = threading.Event()
+        self._suscripcion = None
+        self._oyente = threading.Thread(
+            target=self._escuchar, name="cache-invalidaciones", daemon=True
+        )
+        self._oyente.start()
+
+    def _clave(self, clave):
+        return self._prefijo + ":".join(str(parte) for parte in clave)
+
+    def _etiqueta(self, etiqueta):
+        return self._prefijo + "etiqueta:" + etiqueta
+
+    def _contar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def _redis(self, accion):
+        """
+        Ejecutar `accion(conexion)` con una conexión del pool. Una conexión
+        que falla se descarta, no vuelve al pool; después de un error de
+        red se deja de intentar por CACHE_ESPERA_REINTENTO para no frenar
+        cada petición (ni al escritor) con el timeout de conexión.
+        """
+        if time.monotonic() < self._sin_redis_hasta:
+            raise ErrorRedis("Redis no disponible")
+        try:
+            conexion = self._conexiones.get_nowait()
+        except queue.Empty:
+            conexion = None
+        try:
+            if conexion is None:
+                conexion = ConexionRedis(self.url)
+            resultado = accion(conexion)
+        except BaseException as e:
+            if conexion is not None:
+                conexion.cerrar()
+            if isinstance(e, OSError):
+                self._sin_redis_hasta = time.monotonic() + CACHE_ESPERA_REINTENTO
+            raise
+        self._conexiones.put(conexion)
+        return resultado
+
+    @property
+    def generacion(self):
+        try:
+            compartida = self._redis(
+                lambda conexion: conexion.comando("GET", self._clave_generacion)
+            )
+        except (OSError, ErrorRedis) as e:
+            print(e)
+            self._contar("_errores")
+            compartida = False
+        return self.local.generacion, compartida
+
+    def obtener(self, clave):
+        if self._suscrito.is_set():
+            encontrado, valor = self.local.obtener(clave)
+            if encontrado:
+                return True, valor
+        generacion_local = self.local.generacion
+        try:
+            datos = self._redis(
+                lambda conexion: conexion.comando("GET", self._clave(clave))
+            )
+        except (OSError, ErrorRedis) as e:
+            print(e)
+            self._contar("_errores")
+            return False, None
+        if datos is None:
+            self._contar("_fallos")
+            return False, None
+        self._contar("_aciertos")
+        entrada = json.loads(datos)
+        if self._suscrito.is_set():
+            self.local.guardar(
+                clave, entrada["valor"], entrada["etiquetas"], generacion_local
+            )
+        return True, entrada["valor"]
+
+    def guardar(self, clave, valor, etiquetas, generacion=None):
+        generacion_local, compartida = generacion or (None, None)
+        if self._suscrito.is_set():
+            self.local.guardar(clave, valor, etiquetas, generacion_local)
+        if compartida is False:
+            # no se pudo leer la generación: no hay forma segura de guardar
+            return False
+        clave_redis = self._clave(clave)
+        datos = json.dumps(
+            {"valor": valor, "etiquetas": list(etiquetas)}, ensure_ascii=False
+        )
+        milisegundos = int(self.ttl * 1000)
+
+        def _guardar(conexion):
+            # WATCH: si una invalidación sube la generación antes del EXEC,
+            # la transacción se aborta y no queda un valor viejo
+            conexion.comando("WATCH", self._clave_generacion)
+            if conexion.comando("GET", self._clave_generacion) != compartida:
+                conexion.comando("UNWATCH")
+                return False
+            comandos = [("MULTI",), ("SET", clave_redis, datos, "PX", milisegundos)]
+            for etiqueta in etiquetas:
+                comandos.append(("SADD", self._etiqueta(etiqueta), clave_redis))
+                comandos.append(("PEXPIRE", self._etiqueta(etiqueta), milisegundos))
+            comandos.append(("EXEC",))
+            return conexion.canalizar(comandos)[-1] is not None
+
+        try:
+            return self._redis(_guardar)
+        except (OSError, ErrorRedis) as e:
+            print(e)
+            self._contar("_errores")
+            return False
+
+    def invalidar(self, etiquetas):
+        etiquetas = list(etiquetas)
+        self.local.invalidar(etiquetas)
+
+        def _invalidar(conexion):
+            respuestas = conexion.canalizar(
+                [("INCR", self._clave_generacion)]
+                + [("SMEMBERS", self._etiqueta(etiqueta)) for etiqueta in etiquetas]
+            )
+            claves = [
+                clave for miembros in respuestas[1:] or [] for clave in miembros or []
+            ]
+            claves += [self._etiqueta(etiqueta) for etiqueta in etiquetas]
+            conexion.canalizar(
+                [
+                    ("DEL", *claves),
+                    ("PUBLISH", self.canal, json.dumps(etiquetas)),
+                ]
+            )
+
+        try:
+            self._redis(_invalidar)
+        except (OSError, ErrorRedis) as e:
+            # sin Redis las demás copias locales no se enteran; se vacía la
+            # propia y las entradas compartidas vencen por TTL
+            print(e)
+            self._contar("_errores")
+
+    def difundir(self, mensaje):
+        try:
+            self._redis(
+                lambda conexion: conexion.comando(
+                    "PUBLISH", self.canal_difusion, mensaje
+                )
+            )
+        except (OSError, ErrorRedis) as e:
+            # sin Redis al menos se enteran los suscriptores de este worker
+            print(e)
+            self._contar("_errores")
+            _entregar(mensaje)
+
+    def limpiar(self):
+        self.local.limpiar()
+
+    def _escuchar(self):
+        while not self._cerrado.is_set():
+            try:
+                conexion = ConexionRedis(self.url)
+                conexion.sin_timeout()
+                self._suscripcion = conexion
+                conexion.enviar("SUBSCRIBE", self.canal, self.canal_difusion)
+                # una confirmación por canal
+                conexion.leer()
+                conexion.leer()
+                # mientras no estuvo suscrito pudo perder invalidaciones
+                self.local.limpiar()
+                self._suscrito.set()
+                while True:
+                    mensaje = conexion.leer()
+                    if not isinstance(mensaje, list) or mensaje[0] != b"message":
+                        continue
+                    if mensaje[1] == self.canal_difusion.encode("utf-8"):
+                        _entregar(mensaje[2].decode("utf-8"))
+                    else:
+                        self.local.invalidar(json.loads(mensaje[2]))
+                        self._contar("_mensajes")
+            except (OSError, ErrorRedis, ValueError) as e:
+                self._suscrito.clear()
+                self.local.limpiar()
+                if self._cerrado.is_set():
+                    break
+                print(e)
+                self._cerrado.wait(1)
+
+    def metricas(self):
+        metricas = self.local.metricas()
+        with self._lock:
+            metricas["redis"] = {
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "errores": self._errores,
+                "mensajes": self._mensajes,
+                "suscrito": self._suscrito.is_set(),
+            }
+        return metricas
+
+    def cerrar(self):
+        self._cerrado.set()
+        if self._suscripcion is not None:
+            self._suscripcion.cerrar()
+        self._oyente.join(timeout=2)
+        while True:
+            try:
+                self._conexiones.get_nowait().cerrar()
+            except queue.Empty:
+                break
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Caché compartida por todo el proceso (se crea en el primer uso). Con
+    COLEGIO_CACHE_URL=redis://... se comparte entre workers.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRedis(CACHE_URL) if CACHE_URL else CacheMemoria()
+        return _cache
+
+
+def cerrar_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.cerrar()
+            _cache = None
+
+
+async def _llamar(cache, fn, *args):
+    if cache.bloqueante:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+async def cacheado_async(clave, etiquetas, consulta):
+    """
+    Leer a través de la caché: si `clave` no está, esperar `consulta()` (una
+    corrutina) y guardar el resultado con sus etiquetas. Con la caché en
+    memoria no hay saltos de hilo; con Redis, la E/S de red va al
+    threadpool.
+    """
+    cache = get_cache()
+    encontrado, valor = await _llamar(cache, cache.obtener, clave)
+    if encontrado:
+        return valor
+    generacion = await _llamar(cache, lambda: cache.generacion)
+    valor = await consulta()
+    await _llamar(cache, cache.guardar, clave, valor, etiquetas, generacion)
+    return valor
+
+
+def invalidar_al_confirmar(etiquetas):
+    """
+    Dentro de un trabajo del escritor: invalidar las etiquetas después del
+    COMMIT (si el trabajo falla no se invalida nada).
+    """
+    etiquetas = set(etiquetas)
+    if etiquetas:
+        get_escritor().al_confirmar(lambda: get_cache().invalidar(etiquetas))
+
+
+def etiquetas_tareas(conn, filas):
+    """
+    Etiquetas estudiante:N, clase:N y profesor:N de las (idclase,
+    idestudiante) indicadas; el profesor se lee de la clase.
+    """
+    etiquetas = set()
+    clases = set()
+    for idclase, idestudiante in filas:
+        if idestudiante is not None:
+            etiquetas.add(f"estudiante:{idestudiante}")
+        if idclase is not None:
+            clases.add(idclase)
+    for idclase in clases:
+        etiquetas.add(f"clase:{idclase}")
+        for (idprofesor,) in conn.execute(
+            "SELECT idprofesor FROM Clases WHERE idclase = ?", (idclase,)
+        ):
+            etiquetas.add(f"profesor:{idprofesor}")
+    return etiquetas
+
+
+def invalidar_tareas(conn, filas):
+    """
+    Dentro de un trabajo del escritor: invalidar los listados de tareas de
+    las (idclase, idestudiante) indicadas, incluidos los del profesor de
+    cada clase.
+    """
+    invalidar_al_confirmar(etiquetas_tareas(conn, filas))
+
+
+def tareas_afectadas(conn, idtareas):
+    """
+    (idclase, idestudiante) actuales de las tareas indicadas.
+    """
+    filas = []
+    # SQLite limita la cantidad de parámetros por sentencia
+    for inicio in range(0, len(idtareas), 500):
+        parte = idtareas[inicio : inicio + 500]
+        marcadores = ", ".join("?" for _ in parte)
+        filas.extend(
+            conn.execute(
+                f"SELECT DISTINCT idclase, idestudiante FROM Tareas WHERE idtarea IN ({marcadores})",
+                parte,
+            ).fetchall()
+        )
+    return filas
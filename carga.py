@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def _leer_respuesta(lector):
+    estado = await lector.readline()
+    if not estado:
+        raise ConnectionError("El servidor cerró la conexión")
+    codigo = int(estado.split()[1])
+    largo = None
+    fragmentado = False
+    while True:
+        linea = await lector.readline()
+        if linea in (b"\r\n", b""):
+            break
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        nombre = nombre.strip().lower()
+        if nombre == "content-length":
+            largo = int(valor)
+        elif nombre == "transfer-encoding" and "chunked" in valor.lower():
+            fragmentado = True
+    if fragmentado:
+        while True:
+            tamano = int((await lector.readline()).split(b";")[0], 16)
+            await lector.readexactly(tamano + 2)
+            if tamano == 0:
+                break
+    elif largo:
+        await lector.readexactly(largo)
+    return codigo
+
+
+async def _cliente(host, puerto, peticion, hasta, latencias, errores):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        while time.monotonic() < hasta:
+            inicio = time.perf_counter()
+            escritor.write(peticion)
+            codigo = await _leer_respuesta(lector)
+            latencias.append(time.perf_counter() - inicio)
+            if codigo >= 400:
+                errores[codigo] = errores.get(codigo, 0) + 1
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+    finally:
+        escritor.close()
+
+
+def _latencias_ms(latencias):
+    if not latencias:
+        return None
+    ordenadas = sorted(latencias)
+
+    def percentil(p):
+        return round(
+            ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))] * 1000, 2
+        )
+
+    return {
+        "media": round(statistics.fmean(ordenadas) * 1000, 2),
+        "p50": percentil(0.50),
+        "p95": percentil(0.95),
+        "p99": percentil(0.99),
+        "max": round(ordenadas[-1] * 1000, 2),
+    }
+
+
+async def medir(url, conexiones, segundos):
+    partes = urlsplit(url)
+    host = partes.hostname or "127.0.0.1"
+    puerto = partes.port or 80
+    ruta = partes.path or "/"
+    if partes.query:
+        ruta += "?" + partes.query
+    peticion = (
+        f"GET {ruta} HTTP/1.1\r\nHost: {host}:{puerto}\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode("latin-1")
+
+    latencias = []
+    errores = {}
+    inicio = time.monotonic()
+    hasta = inicio + segundos
+    await asyncio.gather(
+        *(
+            _cliente(host, puerto, peticion, hasta, latencias, errores)
+            for _ in range(conexiones)
+        )
+    )
+    duracion = time.monotonic() - inicio
+    return {
+        "url": url,
+        "conexiones": conexiones,
+        "segundos": round(duracion, 2),
+        "peticiones": len(latencias),
+        "por_segundo": round(len(latencias) / duracion, 1),
+        "latencia_ms": _latencias_ms(latencias),
+        "errores": errores,
+    }
+
+
+# Prueba de carga simple, solo con la biblioteca estándar:
+#   python carga.py http://127.0.0.1:7860/tareas?limite=50 -c 64 -s 20
+# Abre -c conexiones keep-alive y cada una repite el GET durante -s
+# segundos. Informa peticiones por segundo y latencias (p50/p95/p99).
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument("url")
+    parser.add_argument("-c", "--conexiones", type=int, default=64)
+    parser.add_argument("-s", "--segundos", type=float, default=20)
+    argumentos = parser.parse_args()
+    resultado = asyncio.run(
+        medir(argumentos.url, argumentos.conexiones, argumentos.segundos)
+    )
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
@@ -0,0 +1,113 @@
+import socket
+from urllib.parse import unquote, urlparse
+
+PUERTO_REDIS = 6379
+TIMEOUT_REDIS = 2.0
+
+
+class ErrorRedis(Exception):
+    """
+    Respuesta de error del servidor (-ERR ...) o respuesta ilegible.
+    """
+
+
+def parsear_url(url):
+    """
+    redis://[:clave@]host[:puerto][/db] -> (host, puerto, db, clave)
+    """
+    partes = urlparse(url)
+    if partes.scheme != "redis":
+        raise ValueError(f"URL de caché no soportada: {url}")
+    db = partes.path.lstrip("/")
+    return (
+        partes.hostname or "localhost",
+        partes.port or PUERTO_REDIS,
+        int(db) if db else 0,
+        unquote(partes.password) if partes.password else None,
+    )
+
+
+def _codificar(argumentos):
+    partes = [b"*%d\r\n" % len(argumentos)]
+    for argumento in argumentos:
+        if isinstance(argumento, str):
+            argumento = argumento.encode("utf-8")
+        elif not isinstance(argumento, bytes):
+            argumento = str(argumento).encode("utf-8")
+        partes.append(b"$%d\r\n%s\r\n" % (len(argumento), argumento))
+    return b"".join(partes)
+
+
+class ConexionRedis:
+    """
+    Cliente mínimo del protocolo RESP2 de Redis: lo justo para la caché
+    (comandos sueltos, WATCH/MULTI/EXEC y PUBLISH/SUBSCRIBE). Una conexión
+    no es segura entre hilos; cada hilo toma la suya.
+    """
+
+    def __init__(self, url, timeout=TIMEOUT_REDIS):
+        host, puerto, db, clave = parsear_url(url)
+        self._socket = socket.create_connection((host, puerto), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lector = self._socket.makefile("rb")
+        if clave:
+            self.comando("AUTH", clave)
+        if db:
+            self.comando("SELECT", db)
+
+    def sin_timeout(self):
+        # para SUBSCRIBE, que espera mensajes indefinidamente
+        self._socket.settimeout(None)
+
+    def enviar(self, *argumentos):
+        self._socket.sendall(_codificar(argumentos))
+
+    def comando(self, *argumentos):
+        self.enviar(*argumentos)
+        respuesta = self.leer()
+        if isinstance(respuesta, ErrorRedis):
+            raise respuesta
+        return respuesta
+
+    def canalizar(self, comandos):
+        """
+        Enviar varios comandos juntos y leer todas las respuestas (pipeline).
+        """
+        self._socket.sendall(b"".join(_codificar(comando) for comando in comandos))
+        return [self.leer() for _ in comandos]
+
+    def leer(self):
+        """
+        Leer una respuesta completa. Los errores del servidor se devuelven
+        (no se lanzan) para no cortar la lectura de un EXEC a la mitad.
+        """
+        linea = self._lector.readline()
+        if not linea:
+            raise ConnectionError("Conexión cerrada por el servidor")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b"+":
+            return resto.decode("utf-8")
+        if tipo == b"-":
+            return ErrorRedis(resto.decode("utf-8"))
+        if tipo == b":":
+            return int(resto)
+        if tipo == b"$":
+            largo = int(resto)
+            if largo < 0:
+                return None
+            datos = self._lector.read(largo + 2)
+            return datos[:-2]
+        if tipo == b"*":
+            largo = int(resto)
+            if largo < 0:
+                return None
+            return [self.leer() for _ in range(largo)]
+        raise ErrorRedis(f"Respuesta RESP inválida: {linea!r}")
+
+    def cerrar(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._lector.close()
+        self._socket.close()
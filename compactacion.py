@@ -0,0 +1,374 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from archivos import (
+    DIRECTORIO_ARCHIVO,
+    DIRECTORIO_PDF,
+    DIRECTORIO_RESTAURADOS,
+    candado,
+    empaquetar,
+    huella_archivo,
+    ruta_blob,
+)
+from conexion import abrir_lectura
+from escritor import get_escritor
+
+# días de historial de CambiosEstado que se conservan fila por fila
+RETENCION_CAMBIOS_DIAS = int(os.environ.get("COLEGIO_RETENCION_CAMBIOS_DIAS", "365"))
+# días sin entregas nuevas tras los que un archivo pasa a un paquete zip
+# (0 = no se archiva; hay que activarlo explícitamente)
+ARCHIVAR_ENTREGAS_DIAS = int(os.environ.get("COLEGIO_ARCHIVAR_ENTREGAS_DIAS", "0"))
+# segundos entre pasadas en segundo plano (0 = solo a pedido)
+INTERVALO_COMPACTACION = float(os.environ.get("COLEGIO_COMPACTACION_SEG", "86400"))
+PRIMERA_COMPACTACION = min(600, INTERVALO_COMPACTACION)
+# filas o archivos por transacción del escritor / por paquete
+LOTE_COMPACTACION = int(os.environ.get("COLEGIO_COMPACTACION_LOTE", "2000"))
+# páginas que devuelve al sistema cada incremental_vacuum
+PAGINAS_VACUUM = int(os.environ.get("COLEGIO_VACUUM_PAGINAS", "2000"))
+# las copias extraídas de los paquetes se borran pasado este tiempo
+RETENCION_RESTAURADOS_SEG = 24 * 3600
+
+
+def fecha_corte(dias):
+    return (date.today() - timedelta(days=dias)).isoformat()
+
+
+def _resumir_cambios(conn, corte, lote):
+    """
+    Trabajo del escritor: sumar a ResumenCambiosEstado hasta `lote` cambios
+    anteriores a `corte` y borrarlos del historial. El último cambio de cada
+    tarea (el que apunta EstadoActualTarea) nunca se borra.
+    """
+    ids = [
+        fila[0]
+        for fila in conn.execute(
+            """
+            SELECT idcambio FROM CambiosEstado
+            WHERE fecha_cambio < ?
+              AND idtarea IS NOT NULL
+              AND nuevo_estado IS NOT NULL
+              AND idcambio NOT IN (
+                SELECT idcambio FROM EstadoActualTarea WHERE idcambio IS NOT NULL
+              )
+            ORDER BY idcambio
+            LIMIT ?
+            """,
+            (corte, lote),
+        )
+    ]
+    if not ids:
+        return 0
+    lista = json.dumps(ids)
+    conn.execute(
+        """
+        INSERT INTO ResumenCambiosEstado (idtarea, nuevo_estado, cambios, primera_fecha, ultima_fecha)
+        SELECT idtarea, nuevo_estado, COUNT(*), MIN(fecha_cambio), MAX(fecha_cambio)
+        FROM CambiosEstado
+        WHERE idcambio IN (SELECT value FROM json_each(?))
+        GROUP BY idtarea, nuevo_estado
+        ON CONFLICT(idtarea, nuevo_estado) DO UPDATE SET
+          cambios = cambios + excluded.cambios,
+          primera_fecha = MIN(primera_fecha, excluded.primera_fecha),
+          ultima_fecha = MAX(ultima_fecha, excluded.ultima_fecha)
+        """,
+        (lista,),
+    )
+    conn.execute(
+        "DELETE FROM CambiosEstado WHERE idcambio IN (SELECT value FROM json_each(?))",
+        (lista,),
+    )
+    return len(ids)
+
+
+def compactar_cambios(corte, lote=LOTE_COMPACTACION):
+    """
+    Resumir todo el historial anterior a `corte`, de a `lote` filas por
+    transacción para no frenar las demás escrituras.
+    """
+    total = 0
+    while True:
+        resumidos = get_escritor().ejecutar(_resumir_cambios, corte, lote)
+        total += resumidos
+        if resumidos < lote:
+            return total
+
+
+def _candidatos_archivo(corte, lote):
+    """
+    Recorrer por páginas de `lote` los archivos que ya no reciben entregas
+    desde `corte`: blobs del almacén todavía no archivados y archivos de
+    entregas antiguas (sin hash, en pdf/<nombre_archivo>).
+    """
+    conn = abrir_lectura()
+    try:
+        ultimo = ""
+        while True:
+            blobs = [
+                fila[0]
+                for fila in conn.execute(
+                    """
+                    SELECT a.hash FROM Archivos a
+                    WHERE a.hash > ?
+                      AND NOT EXISTS (SELECT 1 FROM ArchivosArchivados x WHERE x.hash = a.hash)
+                      AND (SELECT MAX(e.fecha_entrega) FROM Entregas e WHERE e.hash_archivo = a.hash) < ?
+                    ORDER BY a.hash
+                    LIMIT ?
+                    """,
+                    (ultimo, corte, lote),
+                )
+            ]
+            if not blobs:
+                break
+            yield blobs, []
+            ultimo = blobs[-1]
+
+        ultimo = ""
+        while True:
+            antiguos = [
+                fila[0]
+                for fila in conn.execute(
+                    """
+                    SELECT nombre_archivo FROM Entregas
+                    WHERE hash_archivo IS NULL AND nombre_archivo > ?
+                    GROUP BY nombre_archivo
+                    HAVING MAX(fecha_entrega) < ?
+                    ORDER BY nombre_archivo
+                    LIMIT ?
+                    """,
+                    (ultimo, corte, lote),
+                )
+            ]
+            if not antiguos:
+                break
+            yield [], antiguos
+            ultimo = antiguos[-1]
+    finally:
+        conn.close()
+
+
+def _registrar_paquete(conn, paquete, corte, blobs, antiguos, guardadas):
+    """
+    Trabajo del escritor: anotar en ArchivosArchivados lo que quedó en el
+    paquete y, tras el COMMIT, borrar los originales. Las entregas antiguas
+    pasan a referenciar su archivo por hash (entran al almacén). Se vuelve
+    a comprobar cada archivo porque pudo recibir entregas mientras se
+    armaba el paquete; esos se quedan en el almacén.
+    """
+    hoy = date.today().isoformat()
+    borrar = []
+    for nombre, (huella, tamano) in antiguos.items():
+        if huella not in guardadas:
+            continue
+        entregas = conn.execute(
+            "UPDATE Entregas SET hash_archivo = ? WHERE hash_archivo IS NULL AND nombre_archivo = ?",
+            (huella, nombre),
+        ).rowcount
+        if entregas:
+            conn.execute(
+                """
+                INSERT INTO Archivos (hash, tamano, referencias) VALUES (?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET referencias = referencias + excluded.referencias
+                """,
+                (huella, tamano, entregas),
+            )
+            borrar.append(Path(DIRECTORIO_PDF) / nombre)
+
+    archivados = 0
+    for huella in guardadas:
+        sin_uso = conn.execute(
+            """
+            SELECT 1 FROM Archivos a
+            WHERE a.hash = ?
+              AND (SELECT MAX(e.fecha_entrega) FROM Entregas e WHERE e.hash_archivo = a.hash) < ?
+            """,
+            (huella, corte),
+        ).fetchone()
+        if sin_uso is None:
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO ArchivosArchivados (hash, paquete, fecha_archivado) VALUES (?, ?, ?)",
+            (huella, paquete, hoy),
+        )
+        if huella in blobs:
+            borrar.append(ruta_blob(huella))
+        archivados += 1
+
+    def _borrar():
+        for ruta in borrar:
+            ruta.unlink(missing_ok=True)
+
+    get_escritor().al_confirmar(_borrar)
+    return archivados
+
+
+def archivar_entregas(corte, lote=LOTE_COMPACTACION):
+    """
+    Mover a paquetes zip (uno por página de candidatos) los archivos de
+    entregas que no reciben entregas nuevas desde `corte`. Siguen
+    disponibles en /entregas/descargar y /entregas/ver a través del índice
+    ArchivosArchivados.
+    """
+    total = 0
+    for blobs, nombres in _candidatos_archivo(corte, lote):
+        archivos = [(huella, ruta_blob(huella)) for huella in blobs]
+        antiguos = {}
+        for nombre in nombres:
+            ruta = Path(DIRECTORIO_PDF) / nombre
+            if ruta.is_file():
+                antiguos[nombre] = huella_archivo(ruta)
+                archivos.append((antiguos[nombre][0], ruta))
+        paquete, guardadas = empaquetar(archivos)
+        if paquete is None:
+            continue
+        total += get_escritor().ejecutar(
+            _registrar_paquete, paquete, corte, set(blobs), antiguos, set(guardadas)
+        )
+    return total
+
+
+def borrar_paquetes_huerfanos():
+    """
+    Borrar los paquetes de los que ya no se sirve ningún archivo (todas sus
+    entregas se eliminaron o volvieron a subirse).
+    """
+    conn = abrir_lectura()
+    try:
+        usados = {
+            fila[0]
+            for fila in conn.execute("SELECT DISTINCT paquete FROM ArchivosArchivados")
+        }
+    finally:
+        conn.close()
+    borrados = 0
+    for ruta in DIRECTORIO_ARCHIVO.glob("entregas-*.zip"):
+        if ruta.name not in usados:
+            ruta.unlink(missing_ok=True)
+            borrados += 1
+    return borrados
+
+
+def limpiar_restaurados(antiguedad=RETENCION_RESTAURADOS_SEG):
+    """
+    Borrar las copias extraídas de los paquetes que llevan más de
+    `antiguedad` segundos en disco; se vuelven a extraer si se piden.
+    """
+    limite = time.time() - antiguedad
+    borrados = 0
+    for ruta in DIRECTORIO_RESTAURADOS.iterdir():
+        try:
+            if ruta.stat().st_mtime < limite:
+                ruta.unlink()
+                borrados += 1
+        except FileNotFoundError:
+            pass
+    return borrados
+
+
+def _vacuum_incremental(conn, paginas):
+    """
+    Trabajo de mantenimiento del escritor (fuera de transacción): devolver
+    al sistema hasta `paginas` páginas libres. Las bases que todavía no
+    están en auto_vacuum=INCREMENTAL se saltean: convertirlas requiere un
+    VACUUM completo, que no se hace con la API en marcha (ver tablas.py).
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # cada paso del cursor libera una página: hay que leerlo completo
+    conn.execute(f"PRAGMA incremental_vacuum({int(paginas)})").fetchall()
+    return libres - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+_ultima = None
+
+
+def compactar():
+    """
+    Una pasada completa: resumir el historial viejo de CambiosEstado,
+    archivar los archivos de entregas antiguas, borrar paquetes y copias
+    que ya no se usan y liberar páginas de la base. Devuelve un resumen, o
+    None si otro proceso está compactando.
+    """
+    global _ultima
+    # una sola compactación a la vez entre todos los workers
+    with candado(DIRECTORIO_ARCHIVO / ".compactacion.lock") as propio:
+        if not propio:
+            return None
+        inicio = time.monotonic()
+        resultado = {
+            "cambios_resumidos": compactar_cambios(fecha_corte(RETENCION_CAMBIOS_DIAS)),
+            "archivos_archivados": (
+                archivar_entregas(fecha_corte(ARCHIVAR_ENTREGAS_DIAS))
+                if ARCHIVAR_ENTREGAS_DIAS > 0
+                else 0
+            ),
+            "paquetes_borrados": borrar_paquetes_huerfanos(),
+            "restaurados_borrados": limpiar_restaurados(),
+            "paginas_liberadas": get_escritor().mantenimiento(
+                _vacuum_incremental, PAGINAS_VACUUM
+            ),
+        }
+        resultado["segundos"] = round(time.monotonic() - inicio, 3)
+        resultado["fecha"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        _ultima = resultado
+        return resultado
+
+
+def ultima_compactacion():
+    return _ultima
+
+
+class Compactador:
+    """
+    Hilo que ejecuta compactar() cada `intervalo` segundos.
+    """
+
+    def __init__(self, intervalo=INTERVALO_COMPACTACION, primera=PRIMERA_COMPACTACION):
+        self.intervalo = intervalo
+        self.primera = primera
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="compactacion", daemon=True
+        )
+        self._hilo.start()
+
+    def _bucle(self):
+        espera = self.primera
+        while not self._detener.wait(espera):
+            espera = self.intervalo
+            try:
+                compactar()
+            except Exception as e:
+                print(e)
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join()
+
+
+_compactador = None
+_compactador_lock = threading.Lock()
+
+
+def get_compactador():
+    """
+    Compactador en segundo plano del proceso; None si
+    COLEGIO_COMPACTACION_SEG es 0.
+    """
+    global _compactador
+    with _compactador_lock:
+        if _compactador is None and INTERVALO_COMPACTACION > 0:
+            _compactador = Compactador()
+        return _compactador
+
+
+def cerrar_compactador():
+    global _compactador
+    with _compactador_lock:
+        if _compactador is not None:
+            _compactador.cerrar()
+            _compactador = None
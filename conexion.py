@@ -0,0 +1,289 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+DATABASE_NAME = os.environ.get("COLEGIO_DB", "colegio.db")
+POOL_SIZE = int(os.environ.get("COLEGIO_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("COLEGIO_POOL_TIMEOUT", "5"))
+
+# PRAGMAs de almacenamiento (cache_size negativo = KiB)
+PRAGMAS = {
+    "busy_timeout": int(os.environ.get("COLEGIO_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": os.environ.get("COLEGIO_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("COLEGIO_CACHE_KIB", "-20000")),
+    "mmap_size": int(os.environ.get("COLEGIO_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+
+def configurar_conexion(connection, solo_lectura=False):
+    """
+    Aplicar los PRAGMAs por conexión. journal_mode=WAL es persistente en el
+    archivo y lo fija el escritor al arrancar (ver escritor.py).
+    """
+    for nombre, valor in PRAGMAS.items():
+        connection.execute(f"PRAGMA {nombre} = {valor}")
+    if solo_lectura:
+        # las escrituras pasan por el escritor único
+        connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+def abrir_lectura(database=DATABASE_NAME):
+    """
+    Abrir una conexión de solo lectura con filas sqlite3.Row.
+    """
+    connection = sqlite3.connect(database, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    return configurar_conexion(connection, solo_lectura=True)
+
+
+class PoolAgotado(Exception):
+    """
+    No se pudo obtener una conexión del pool dentro del tiempo de espera.
+    """
+
+
+def _sana(connection):
+    if connection is None:
+        return True
+    try:
+        connection.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _cerrar_silencioso(connection):
+    try:
+        connection.close()
+    except sqlite3.Error:
+        pass
+
+
+class ConexionAsync:
+    """
+    Conexión de solo lectura con un hilo propio: los endpoints async le
+    mandan trabajos con `await conn.run(fn, *args)` (se ejecuta
+    `fn(connection, *args)` en ese hilo) y esperan sin ocupar un hilo del
+    threadpool. Los trabajos de una misma conexión corren en orden. Si un
+    trabajo falla y la conexión ya no responde, se descarta y se abre otra
+    para el siguiente.
+    """
+
+    def __init__(self, database=DATABASE_NAME):
+        self.database = database
+        self.descartadas = 0
+        self._trabajos = queue.SimpleQueue()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="sqlite-lectura", daemon=True
+        )
+        self._hilo.start()
+
+    def _bucle(self):
+        connection = None
+        while True:
+            trabajo = self._trabajos.get()
+            if trabajo is None:
+                break
+            futuro, fn, args = trabajo
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                if connection is None:
+                    connection = abrir_lectura(self.database)
+                futuro.set_result(fn(connection, *args))
+            except BaseException as e:
+                futuro.set_exception(e)
+                if isinstance(e, sqlite3.Error) and not _sana(connection):
+                    # se reabre en el próximo trabajo
+                    _cerrar_silencioso(connection)
+                    connection = None
+                    self.descartadas += 1
+            try:
+                if connection is not None and connection.in_transaction:
+                    # que el siguiente trabajo no herede la instantánea
+                    connection.rollback()
+            except sqlite3.Error:
+                _cerrar_silencioso(connection)
+                connection = None
+                self.descartadas += 1
+        if connection is not None:
+            _cerrar_silencioso(connection)
+
+    def enviar(self, fn, *args):
+        """
+        Encolar `fn(connection, *args)` sin esperar; devuelve un Future.
+        """
+        futuro = Future()
+        self._trabajos.put((futuro, fn, args))
+        return futuro
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.enviar(fn, *args))
+
+    async def fetchall(self, sql, parametros=()):
+        return await self.run(lambda conn: conn.execute(sql, parametros).fetchall())
+
+    async def fetchone(self, sql, parametros=()):
+        return await self.run(lambda conn: conn.execute(sql, parametros).fetchone())
+
+    def cerrar(self):
+        self._trabajos.put(None)
+        self._hilo.join(timeout=5)
+
+
+class PoolAsync:
+    """
+    Pool acotado de ConexionAsync para los endpoints async. Pedir una
+    conexión no bloquea el event loop: si no hay libres, la corrutina
+    espera en una cola hasta POOL_TIMEOUT segundos.
+
+    Se crea y se usa dentro de un único event loop (el de la aplicación).
+    """
+
+    def __init__(self, database=DATABASE_NAME, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._libres = []
+        self._todas = []
+        self._esperando = deque()
+        self._en_uso = 0
+        self._cerrado = False
+        # métricas
+        self._prestamos = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._tiempo_espera = 0.0
+        self._espera_maxima = 0.0
+
+    def _anotar(self, inicio, espero):
+        espera = time.monotonic() - inicio
+        self._prestamos += 1
+        self._esperas += espero
+        self._tiempo_espera += espera
+        self._espera_maxima = max(self._espera_maxima, espera)
+        self._en_uso += 1
+
+    async def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        if self._cerrado:
+            raise PoolAgotado("El pool de conexiones está cerrado")
+        if self._libres:
+            self._anotar(inicio, False)
+            return self._libres.pop()
+        if len(self._todas) < self.size:
+            conexion = ConexionAsync(self.database)
+            self._todas.append(conexion)
+            self._anotar(inicio, False)
+            return conexion
+
+        espera = asyncio.get_running_loop().create_future()
+        self._esperando.append(espera)
+        try:
+            conexion = await asyncio.wait_for(espera, timeout)
+        except asyncio.TimeoutError:
+            self._recuperar(espera)
+            self._timeouts += 1
+            raise PoolAgotado(
+                f"Sin conexiones libres tras {timeout:.1f}s ({self.size} en uso)"
+            )
+        except asyncio.CancelledError:
+            self._recuperar(espera)
+            raise
+        finally:
+            if espera in self._esperando:
+                self._esperando.remove(espera)
+        self._anotar(inicio, True)
+        return conexion
+
+    def _recuperar(self, espera):
+        # release() pudo entregar la conexión justo antes del timeout o de
+        # la cancelación: si nadie la va a usar, vuelve al pool
+        if espera.done() and not espera.cancelled():
+            self._entregar(espera.result())
+
+    def release(self, conexion):
+        self._en_uso -= 1
+        self._entregar(conexion)
+
+    def _entregar(self, conexion):
+        # pasar la conexión directamente al primero que espera
+        while self._esperando:
+            espera = self._esperando.popleft()
+            if not espera.done():
+                espera.set_result(conexion)
+                return
+        self._libres.append(conexion)
+
+    def metricas(self):
+        return {
+            "tamano": self.size,
+            "abiertas": len(self._todas),
+            "en_uso": self._en_uso,
+            "libres": len(self._libres),
+            "esperando": len(self._esperando),
+            "prestamos": self._prestamos,
+            "esperas": self._esperas,
+            "timeouts": self._timeouts,
+            "descartadas": sum(conexion.descartadas for conexion in self._todas),
+            "espera_total_ms": round(self._tiempo_espera * 1000, 3),
+            "espera_maxima_ms": round(self._espera_maxima * 1000, 3),
+        }
+
+    def close(self):
+        self._cerrado = True
+        for conexion in self._todas:
+            conexion.cerrar()
+        self._todas = []
+        self._libres = []
+
+
+_pool_async = None
+
+
+def get_pool_async():
+    """
+    Pool async compartido (se crea en el primer uso, dentro del event loop).
+    """
+    global _pool_async
+    if _pool_async is None:
+        _pool_async = PoolAsync()
+    return _pool_async
+
+
+def cerrar_pool_async():
+    global _pool_async
+    if _pool_async is not None:
+        _pool_async.close()
+        _pool_async = None
+
+
+class DatabaseConnectionAsync:
+    """
+    Préstamo de una conexión del pool async para un bloque `async with`:
+
+        async with DatabaseConnectionAsync() as conn:
+            filas = await conn.fetchall(sql, parametros)
+    """
+
+    def __init__(self, pool=None, timeout=None):
+        self.pool = pool or get_pool_async()
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self):
+        self.conn = await self.pool.acquire(self.timeout)
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
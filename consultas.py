@@ -0,0 +1,453 @@
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+LOTE_EXPORTACION = 500
+
+# tabla -> (clave primaria, columnas visibles)
+TABLAS = {
+    # contrasena guarda el hash y nunca se devuelve
+    "Usuarios": ("idusuario", ("idusuario", "dni", "rol")),
+    "Profesores": (
+        "idprofesor",
+        ("idprofesor", "nombre", "dni", "correo", "idusuario"),
+    ),
+    "Estudiantes": (
+        "idestudiante",
+        ("idestudiante", "nombre", "dni", "idclase", "idusuario"),
+    ),
+    "Clases": ("idclase", ("idclase", "nombre", "idprofesor")),
+    "Tareas": (
+        "idtarea",
+        (
+            "idtarea",
+            "nombre_tarea",
+            "instrucciones",
+            "fecha_vencimiento",
+            "idclase",
+            "idestudiante",
+            "estado",
+            "idplantilla",
+        ),
+    ),
+    "Entregas": (
+        "identrega",
+        (
+            "identrega",
+            "fecha_entrega",
+            "nombre_archivo",
+            "tipo_archivo",
+            "idtarea",
+            "idestudiante",
+            "hash_archivo",
+        ),
+    ),
+    "CambiosEstado": (
+        "idcambio",
+        ("idcambio", "idtarea", "nuevo_estado", "fecha_cambio"),
+    ),
+    "EstadoActualTarea": (
+        "idtarea",
+        ("idtarea", "estado", "fecha_cambio", "idcambio"),
+    ),
+}
+
+# las tareas comunes guardan su texto en PlantillasTarea; se leen por la vista
+FUENTES = {"Tareas": "VistaTareas"}
+
+# tablas que se pueden exportar completas, por nombre en la URL
+EXPORTABLES = {
+    "usuarios": "Usuarios",
+    "profesores": "Profesores",
+    "estudiantes": "Estudiantes",
+    "clases": "Clases",
+    "tareas": "Tareas",
+    "entregas": "Entregas",
+    "cambios_estado": "CambiosEstado",
+    "estados_tareas": "EstadoActualTarea",
+}
+
+# parámetros de consulta que no son filtros
+PARAMETROS_RESERVADOS = {"cursor", "limite", "fields"}
+
+
+class ConsultaInvalida(ValueError):
+    """
+    Parámetros de paginación, proyección o filtro no válidos.
+    """
+
+
+def columnas_de(tabla, fields=None):
+    """
+    Resolver `fields` (lista separada por comas) contra las columnas de la
+    tabla. La clave primaria siempre se incluye porque es el cursor.
+    """
+    clave, columnas = TABLAS[tabla]
+    if not fields:
+        return list(columnas)
+    pedidas = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    desconocidas = [campo for campo in pedidas if campo not in columnas]
+    if desconocidas:
+        raise ConsultaInvalida(
+            f"Campos desconocidos en {tabla}: {', '.join(desconocidas)}"
+        )
+    seleccion = [clave] + [campo for campo in pedidas if campo != clave]
+    return list(dict.fromkeys(seleccion))
+
+
+def filtros_de(tabla, query_params):
+    """
+    Tomar de los parámetros de la petición los filtros de igualdad que
+    correspondan a columnas de la tabla; el resto se ignora.
+    """
+    _, columnas = TABLAS[tabla]
+    return {
+        nombre: valor
+        for nombre, valor in query_params.items()
+        if nombre in columnas and nombre not in PARAMETROS_RESERVADOS
+    }
+
+
+def pares_json(columnas, alias=None):
+    """
+    Argumentos 'col', col, ... de json_object. `alias` califica las columnas
+    (alias.col) cuando la consulta junta varias tablas.
+    """
+    prefijo = f"{alias}." if alias else ""
+    return ", ".join(f"'{c}', {prefijo}{c}" for c in columnas)
+
+
+def objeto_json(columnas, alias=None):
+    """
+    Expresión json_object('col', col, ...): SQLite arma el JSON de cada fila
+    en C y Python solo recibe el texto ya serializado.
+    """
+    return f"json_object({pares_json(columnas, alias)})"
+
+
+def _sin_row(connection):
+    # cursor de tuplas: no hace falta sqlite3.Row para leer una o dos columnas
+    cursor = connection.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def _select(tabla, fields=None, filtros=None, cursor=None):
+    """
+    Construir el SELECT (sin LIMIT) para una tabla, con sus parámetros.
+    Cada fila trae la clave primaria y el objeto JSON de las columnas
+    pedidas.
+    """
+    clave, columnas = TABLAS[tabla]
+    seleccion = columnas_de(tabla, fields)
+
+    condiciones = []
+    parametros = []
+    if cursor is not None:
+        condiciones.append(f"{clave} > ?")
+        parametros.append(cursor)
+    for nombre, valor in (filtros or {}).items():
+        if nombre not in columnas:
+            raise ConsultaInvalida(f"No se puede filtrar {tabla} por {nombre}")
+        condiciones.append(f"{nombre} = ?")
+        parametros.append(valor)
+
+    sql = f"SELECT {clave}, {objeto_json(seleccion)} FROM {FUENTES.get(tabla, tabla)}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {clave}"
+    return sql, parametros
+
+
+def listar_json(
+    conn, tabla, cursor=None, limite=LIMITE_POR_DEFECTO, fields=None, filtros=None
+):
+    """
+    Obtener una página de `tabla` ordenada por su clave primaria, ya como
+    JSON: {"datos": [...], "next_cursor": ...}.
+
+    Paginación por cursor (keyset): `cursor` es la última clave vista y la
+    consulta usa `clave > cursor`, de modo que cada página cuesta lo mismo
+    sin importar cuántas filas haya antes. next_cursor es None si no hay
+    más páginas.
+    """
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise ConsultaInvalida(f"limite debe estar entre 1 y {LIMITE_MAXIMO}")
+    sql, parametros = _select(tabla, fields, filtros, cursor)
+    # una fila de más para saber si existe otra página
+    sql += " LIMIT ?"
+    parametros.append(limite + 1)
+
+    filas = _sin_row(conn).execute(sql, parametros).fetchall()
+    siguiente = "null"
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = str(filas[-1][0])
+    return (
+        '{"datos":['
+        + ",".join(fila[1] for fila in filas)
+        + '],"next_cursor":'
+        + siguiente
+        + "}"
+    )
+
+
+def filas_json(conn, tabla, condicion, parametros=()):
+    """
+    Filas de `tabla` (por su fuente de lectura) que cumplen `condicion`,
+    como arreglo JSON armado por SQLite.
+    """
+    _, columnas = TABLAS[tabla]
+    filas = _sin_row(conn).execute(
+        f"SELECT {objeto_json(columnas)} FROM {FUENTES.get(tabla, tabla)} WHERE {condicion}",
+        parametros,
+    )
+    return "[" + ",".join(fila[0] for fila in filas) + "]"
+
+
+def _sql_cambios(nombres=None):
+    # el registro guarda solo la clave: los datos se leen al consultar y, si
+    # el registro ya no existe, el cambio es una baja (lápida)
+    casos = " ".join(
+        f"WHEN '{nombre}' THEN (SELECT {objeto_json(TABLAS[tabla][1])} "
+        f"FROM {FUENTES.get(tabla, tabla)} WHERE {TABLAS[tabla][0]} = c.clave)"
+        for nombre, tabla in EXPORTABLES.items()
+    )
+    condicion = "c.seq > ?"
+    if nombres:
+        condicion += f" AND c.tabla IN ({', '.join('?' for _ in nombres)})"
+    return f"""
+        SELECT seq, json_object(
+          'seq', seq,
+          'tabla', tabla,
+          'id', clave,
+          'operacion', CASE WHEN datos IS NULL THEN 'delete' ELSE 'upsert' END,
+          'datos', json(datos)
+        )
+        FROM (
+          SELECT c.seq, c.tabla, c.clave, CASE c.tabla {casos} END AS datos
+          FROM Cambios c
+          WHERE {condicion}
+          ORDER BY c.seq
+          LIMIT ?
+        )
+        """
+
+
+def cambios_json(conn, since=0, limite=LIMITE_POR_DEFECTO, tablas=None):
+    """
+    Cambios con seq mayor a `since`, en orden, ya como JSON:
+    {"datos": [...], "next_since": ..., "hay_mas": ...}.
+
+    Cada registro aparece una sola vez, con su estado actual ('upsert') o
+    como baja ('delete', datos null). El cliente guarda next_since y lo
+    envía en la siguiente sincronización. `tablas` (separadas por comas)
+    limita el feed a algunas tablas.
+    """
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise ConsultaInvalida(f"limit debe estar entre 1 y {LIMITE_MAXIMO}")
+    nombres = []
+    if tablas:
+        nombres = [nombre.strip() for nombre in tablas.split(",") if nombre.strip()]
+        desconocidas = [nombre for nombre in nombres if nombre not in EXPORTABLES]
+        if desconocidas:
+            raise ConsultaInvalida(f"Tablas desconocidas: {', '.join(desconocidas)}")
+    filas = (
+        _sin_row(conn)
+        .execute(_sql_cambios(nombres), [since, *nombres, limite + 1])
+        .fetchall()
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    siguiente = filas[-1][0] if filas else since
+    return (
+        '{"datos":['
+        + ",".join(fila[1] for fila in filas)
+        + '],"next_since":'
+        + str(siguiente)
+        + ',"hay_mas":'
+        + ("true" if hay_mas else "false")
+        + "}"
+    )
+
+
+def consulta_fts(texto):
+    """
+    Convertir lo que escribe el usuario en una consulta FTS5: cada palabra
+    entre comillas (los operadores y la sintaxis de FTS5 se toman como
+    texto) y como prefijo, todas obligatorias. Devuelve None si no queda
+    ninguna palabra.
+    """
+    palabras = [
+        palabra
+        for palabra in (texto or "").split()
+        if any(caracter.isalnum() for caracter in palabra)
+    ]
+    if not palabras:
+        return None
+    return " ".join('"' + palabra.replace('"', '""') + '"*' for palabra in palabras)
+
+
+# Una fila por texto indexado (sin alias: MATCH, rank y snippet se refieren
+# a la tabla por su nombre): rowid negativo para las tareas comunes
+# (-idplantilla) y positivo para las sueltas y las comunes con nombre o
+# instrucciones propios (idtarea). El orden por rank
+# usa los pesos guardados en la tabla (nombre 10, instrucciones 1).
+SQL_BUSCAR_TAREAS = """
+SELECT json_object(
+  'tipo', CASE WHEN BusquedaTareas.rowid < 0 THEN 'comun' ELSE 'tarea' END,
+  'idtarea', CASE WHEN BusquedaTareas.rowid > 0 THEN BusquedaTareas.rowid END,
+  'idplantilla', CASE WHEN BusquedaTareas.rowid < 0 THEN -BusquedaTareas.rowid END,
+  'nombre_tarea', BusquedaTareas.nombre_tarea,
+  'idclase', BusquedaTareas.idclase,
+  'fecha_vencimiento', COALESCE(p.fecha_vencimiento, t.fecha_vencimiento),
+  'fragmento', snippet(BusquedaTareas, -1, '<b>', '</b>', '…', 16),
+  'relevancia', -BusquedaTareas.rank
+)
+FROM BusquedaTareas
+LEFT JOIN VistaTareas t ON BusquedaTareas.rowid > 0 AND t.idtarea = BusquedaTareas.rowid
+LEFT JOIN PlantillasTarea p ON BusquedaTareas.rowid < 0 AND p.idplantilla = -BusquedaTareas.rowid
+WHERE BusquedaTareas MATCH ?{condiciones}
+ORDER BY BusquedaTareas.rank, BusquedaTareas.rowid
+LIMIT ? OFFSET ?
+"""
+
+
+def _busqueda_json(conn, sql, q, cursor, limite, filtros):
+    """
+    Ejecutar una búsqueda de texto completo (`sql` con {condiciones})
+    paginada por posición en el ranking. `filtros` son pares (condición,
+    valor) que se agregan solo si el valor no es None.
+    """
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise ConsultaInvalida(f"limite debe estar entre 1 y {LIMITE_MAXIMO}")
+    consulta = consulta_fts(q)
+    if consulta is None:
+        raise ConsultaInvalida("q debe tener al menos una palabra")
+    desde = cursor or 0
+    if desde < 0:
+        raise ConsultaInvalida("cursor no válido")
+
+    condiciones = ""
+    parametros = [consulta]
+    for condicion, valor in filtros:
+        if valor is not None:
+            condiciones += f" AND {condicion}"
+            parametros.append(valor)
+    parametros += [limite + 1, desde]
+
+    filas = (
+        _sin_row(conn)
+        .execute(sql.format(condiciones=condiciones), parametros)
+        .fetchall()
+    )
+    siguiente = "null"
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = str(desde + limite)
+    return (
+        '{"datos":['
+        + ",".join(fila[0] for fila in filas)
+        + '],"next_cursor":'
+        + siguiente
+        + "}"
+    )
+
+
+def buscar_tareas_json(
+    conn, q, cursor=None, limite=LIMITE_POR_DEFECTO, idclase=None, idprofesor=None
+):
+    """
+    Tareas cuyo nombre o instrucciones contienen las palabras de `q`, de la
+    más a la menos relevante, ya como JSON: {"datos": [...],
+    "next_cursor": ...}. Cada tarea común aparece una vez (no una por
+    estudiante). Aquí el cursor es la posición en el ranking.
+    """
+    return _busqueda_json(
+        conn,
+        SQL_BUSCAR_TAREAS,
+        q,
+        cursor,
+        limite,
+        [
+            ("BusquedaTareas.idclase = ?", idclase),
+            (
+                "BusquedaTareas.idclase IN"
+                " (SELECT idclase FROM Clases WHERE idprofesor = ?)",
+                idprofesor,
+            ),
+        ],
+    )
+
+
+# El texto se indexa una vez por contenido (TextosArchivos.idtexto es el
+# rowid); cada entrega con ese contenido es un resultado. Las entregas que
+# comparten hash_archivo subieron exactamente el mismo archivo.
+SQL_BUSCAR_ENTREGAS = """
+SELECT json_object(
+  'identrega', e.identrega,
+  'idtarea', e.idtarea,
+  'idestudiante', e.idestudiante,
+  'fecha_entrega', e.fecha_entrega,
+  'nombre_archivo', e.nombre_archivo,
+  'hash_archivo', e.hash_archivo,
+  'fragmento', snippet(BusquedaEntregas, 0, '<b>', '</b>', '…', 24),
+  'relevancia', -BusquedaEntregas.rank
+)
+FROM BusquedaEntregas
+JOIN TextosArchivos x ON x.idtexto = BusquedaEntregas.rowid
+JOIN Entregas e ON e.hash_archivo = x.hash
+  OR (e.hash_archivo IS NULL AND e.nombre_archivo = x.nombre_archivo)
+WHERE BusquedaEntregas MATCH ?{condiciones}
+ORDER BY BusquedaEntregas.rank, e.identrega
+LIMIT ? OFFSET ?
+"""
+
+
+def buscar_entregas_json(
+    conn, q, cursor=None, limite=LIMITE_POR_DEFECTO, idtarea=None, idestudiante=None
+):
+    """
+    Entregas cuyo archivo contiene las palabras de `q`, de la más a la menos
+    relevante, con el mismo formato y paginación que buscar_tareas_json.
+    """
+    return _busqueda_json(
+        conn,
+        SQL_BUSCAR_ENTREGAS,
+        q,
+        cursor,
+        limite,
+        [("e.idtarea = ?", idtarea), ("e.idestudiante = ?", idestudiante)],
+    )
+
+
+def exportar_ndjson(pool, tabla, fields=None, filtros=None, lote=LOTE_EXPORTACION):
+    """
+    Recorrer la tabla completa y producir NDJSON (una fila por línea) en
+    bloques de `lote` filas leídos con fetchmany, sin materializar la tabla.
+
+    Los parámetros se validan aquí (ConsultaInvalida) antes de empezar a
+    responder. `pool` es el PoolAsync; la conexión queda prestada mientras
+    dura la descarga y el SELECT ve una sola instantánea de la base aunque
+    haya escrituras en paralelo (WAL).
+    """
+    sql, parametros = _select(tabla, fields, filtros)
+    return _bloques_ndjson(pool, sql, parametros, lote)
+
+
+async def _bloques_ndjson(pool, sql, parametros, lote):
+    conn = await pool.acquire()
+    cursor = None
+    try:
+        cursor = await conn.run(
+            lambda connection: _sin_row(connection).execute(sql, parametros)
+        )
+        while True:
+            filas = await conn.run(lambda _: cursor.fetchmany(lote))
+            if not filas:
+                break
+            yield "".join(fila[1] + "\n" for fila in filas).encode("utf-8")
+    finally:
+        # sin await: si el cliente se desconecta la tarea ya está cancelada;
+        # el cierre se encola en el hilo de la conexión
+        if cursor is not None:
+            conn.enviar(lambda _: cursor.close())
+        pool.release(conn)
@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from conexion import DATABASE_NAME, configurar_conexion
+
+logger = logging.getLogger(__name__)
+
+LOTE_MAXIMO = int(os.environ.get("COLEGIO_ESCRITOR_LOTE", "64"))
+ESPERA_LOTE = float(os.environ.get("COLEGIO_ESCRITOR_ESPERA_MS", "2")) / 1000
+TIMEOUT_ESCRITURA = float(os.environ.get("COLEGIO_ESCRITOR_TIMEOUT", "30"))
+
+Resultado = namedtuple("Resultado", ["lastrowid", "rowcount"])
+# trabajo que corre solo, fuera de toda transacción
+Mantenimiento = namedtuple("Mantenimiento", ["fn", "args", "futuro"])
+
+
+class EscritorSQLite:
+    """
+    Hilo único de escritura sobre colegio.db.
+
+    Las escrituras se encolan como funciones `fn(conn)`; el hilo toma todas
+    las que estén esperando (hasta LOTE_MAXIMO) y las ejecuta en una sola
+    transacción, cada una dentro de su propio SAVEPOINT para que el fallo
+    de una no arrastre a las demás. Los resultados se entregan solo después
+    del COMMIT del lote.
+    """
+
+    def __init__(
+        self, database=DATABASE_NAME, lote_maximo=LOTE_MAXIMO, espera_lote=ESPERA_LOTE
+    ):
+        self.database = database
+        self.lote_maximo = lote_maximo
+        self.espera_lote = espera_lote
+        self._cola = queue.Queue()
+        self._listo = threading.Event()
+        self._error_inicio = None
+        self._lotes = 0
+        self._escrituras = 0
+        # (indice del trabajo en el lote, accion)
+        self._acciones = []
+        self._reversiones = []
+        self._trabajo = None
+        self._reservado = None
+        self._hilo = threading.Thread(
+            target=self._bucle, name="escritor-sqlite", daemon=True
+        )
+        self._hilo.start()
+        self._listo.wait()
+        if self._error_inicio is not None:
+            raise self._error_inicio
+
+    def _abrir(self):
+        connection = sqlite3.connect(self.database, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode = WAL")
+        return configurar_conexion(connection)
+
+    def enviar(self, fn, *args):
+        """
+        Encolar `fn(conn, *args)` y devolver un Future con su resultado.
+        """
+        futuro = Future()
+        self._cola.put((fn, args, futuro))
+        return futuro
+
+    def ejecutar(self, fn, *args, timeout=TIMEOUT_ESCRITURA):
+        """
+        Encolar `fn(conn, *args)` y esperar su resultado (ya confirmado).
+        """
+        return self.enviar(fn, *args).result(timeout)
+
+    async def ejecutar_async(self, fn, *args):
+        """
+        Versión para endpoints async: espera el resultado sin ocupar un hilo.
+        """
+        return await asyncio.wrap_future(self.enviar(fn, *args))
+
+    def ejecutar_sql(self, sql, parametros=(), timeout=TIMEOUT_ESCRITURA):
+        """
+        Atajo para una sola sentencia. Devuelve lastrowid y rowcount.
+        """
+
+        def _sentencia(conn):
+            cursor = conn.execute(sql, parametros)
+            return Resultado(cursor.lastrowid, cursor.rowcount)
+
+        return self.ejecutar(_sentencia, timeout=timeout)
+
+    async def ejecutar_sql_async(self, sql, parametros=()):
+        """
+        Versión async de ejecutar_sql.
+        """
+
+        def _sentencia(conn):
+            cursor = conn.execute(sql, parametros)
+            return Resultado(cursor.lastrowid, cursor.rowcount)
+
+        return await self.ejecutar_async(_sentencia)
+
+    def mantenimiento(self, fn, *args, timeout=None):
+        """
+        Ejecutar `fn(conn, *args)` entre dos lotes, fuera de toda transacción
+        (VACUUM, incremental_vacuum) y esperar su resultado. Las escrituras
+        que lleguen mientras tanto esperan en la cola.
+        """
+        futuro = Future()
+        self._cola.put(Mantenimiento(fn, args, futuro))
+        return futuro.result(timeout)
+
+    def metricas(self):
+        return {
+            "lotes": self._lotes,
+            "escrituras": self._escrituras,
+            "pendientes": self._cola.qsize(),
+        }
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _tomar_lote(self, primero):
+        lote = [primero]
+        limite = time.monotonic() + self.espera_lote
+        while len(lote) < self.lote_maximo:
+            restante = limite - time.monotonic()
+            try:
+                if restante > 0:
+                    trabajo = self._cola.get(timeout=restante)
+                else:
+                    trabajo = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if trabajo is None:
+                # volver a poner la señal de cierre para después del lote
+                self._cola.put(None)
+                break
+            if isinstance(trabajo, Mantenimiento):
+                # no se mezcla con el lote: corre apenas este termine
+                self._reservado = trabajo
+                break
+            lote.append(trabajo)
+        return lote
+
+    def _bucle(self):
+        try:
+            conn = self._abrir()
+        except Exception as e:
+            self._error_inicio = e
+            self._listo.set()
+            return
+        self._listo.set()
+        try:
+            while True:
+                trabajo = self._reservado or self._cola.get()
+                self._reservado = None
+                if trabajo is None:
+                    break
+                if isinstance(trabajo, Mantenimiento):
+                    self._ejecutar_mantenimiento(conn, trabajo)
+                    continue
+                self._ejecutar_lote(conn, self._tomar_lote(trabajo))
+        finally:
+            # actualizar las estadísticas de los índices que lo necesiten
+            try:
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            conn.close()
+
+    def al_confirmar(self, accion):
+        """
+        Registrar `accion()` para que corra en el hilo escritor justo después
+        del COMMIT del lote actual (por ejemplo, borrar un archivo que la
+        transacción dejó sin referencias). Solo se puede llamar desde un
+        trabajo; si ese trabajo falla, sus acciones se descartan. Si la
+        acción falla, el error llega al futuro del trabajo aunque sus
+        cambios ya estén confirmados.
+        """
+        self._acciones.append((self._trabajo, accion))
+
+    def al_revertir(self, accion):
+        """
+        Registrar `accion()` para deshacer un cambio fuera de la base hecho
+        por el trabajo actual (por ejemplo, mover un archivo al almacén antes
+        del COMMIT). Corre si el trabajo o el lote se revierten y se descarta
+        tras el COMMIT.
+        """
+        self._reversiones.append(accion)
+
+    def _revertir(self, desde=0):
+        # en orden inverso, como se hicieron
+        for accion in reversed(self._reversiones[desde:]):
+            try:
+                accion()
+            except Exception:
+                logger.exception("no se pudo revertir un cambio fuera de la base")
+        del self._reversiones[desde:]
+
+    def _ejecutar_mantenimiento(self, conn, trabajo):
+        if not trabajo.futuro.set_running_or_notify_cancel():
+            return
+        try:
+            resultado = trabajo.fn(conn, *trabajo.args)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            trabajo.futuro.set_exception(e)
+        else:
+            trabajo.futuro.set_result(resultado)
+
+    def _ejecutar_lote(self, conn, lote):
+        resultados = []
+        self._acciones = []
+        self._reversiones = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, futuro in lote:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT escritura")
+                marca = len(self._acciones)
+                marca_reversiones = len(self._reversiones)
+                self._trabajo = len(resultados)
+                try:
+                    resultado = fn(conn, *args)
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO escritura")
+                    conn.execute("RELEASE escritura")
+                    del self._acciones[marca:]
+                    self._revertir(marca_reversiones)
+                    resultados.append((futuro, None, e))
+                else:
+                    conn.execute("RELEASE escritura")
+                    resultados.append((futuro, resultado, None))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            self._revertir()
+            for fn, args, futuro in lote:
+                if not futuro.done():
+                    # los que ya estaban corriendo o pendientes fallan juntos
+                    if futuro.running():
+                        futuro.set_exception(e)
+                    elif futuro.set_running_or_notify_cancel():
+                        futuro.set_exception(e)
+            return
+
+        self._reversiones = []
+        self._trabajo = None
+        # antes de entregar resultados y de tomar el siguiente lote
+        for indice, accion in self._acciones:
+            try:
+                accion()
+            except Exception as e:
+                logger.exception("falló una acción posterior al COMMIT")
+                futuro, resultado, error = resultados[indice]
+                if error is None:
+                    resultados[indice] = (futuro, None, e)
+        self._acciones = []
+
+        self._lotes += 1
+        self._escrituras += len(resultados)
+        for futuro, resultado, error in resultados:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(error)
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def get_escritor():
+    """
+    Escritor compartido por todo el proceso (se crea en el primer uso).
+    """
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = EscritorSQLite()
+        return _escritor
+
+
+def cerrar_escritor():
+    global _escritor
+    with _escritor_lock:
+        if _escritor is not None:
+            _escritor.cerrar()
+            _escritor = None
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import threading
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from cache import dejar_de_recibir, etiquetas_tareas, get_cache, recibir_difusiones
+from escritor import get_escritor
+
+# eventos que puede acumular cada suscriptor antes de considerarlo lento
+COLA_EVENTOS = int(os.environ.get("COLEGIO_EVENTOS_COLA", "100"))
+# conexiones /stream abiertas a la vez en cada worker
+MAXIMO_SUSCRIPTORES = int(os.environ.get("COLEGIO_EVENTOS_MAXIMO", "1000"))
+# cada cuántos segundos se envía un comentario para mantener viva la conexión
+LATIDO_EVENTOS = float(os.environ.get("COLEGIO_EVENTOS_LATIDO", "15"))
+
+# se encola en lugar de un evento para cerrar el stream con `reiniciar`
+_REINICIAR = None
+
+
+class Suscriptor:
+    """
+    Una conexión /stream: su canal (estudiante:N o profesor:N) y su cola
+    acotada de eventos ya formateados para SSE.
+    """
+
+    def __init__(self, canal, maximo):
+        self.canal = canal
+        self.cola = asyncio.Queue(maxsize=maximo)
+        self.desbordado = False
+
+    def reiniciar(self):
+        # vaciar y dejar solo el aviso: el cliente se resincroniza con
+        # /cambios en lugar de recibir una parte de los eventos
+        self.desbordado = True
+        while not self.cola.empty():
+            self.cola.get_nowait()
+        self.cola.put_nowait(_REINICIAR)
+
+
+class Broker:
+    """
+    Reparte los eventos de escritura entre los suscriptores de este proceso.
+
+    Los eventos llegan por la caché (difundir), desde el hilo escritor o el
+    oyente de Redis, y se pasan al event loop con call_soon_threadsafe. Cada
+    suscriptor tiene una cola de hasta COLA_EVENTOS eventos: si se llena
+    porque el cliente no lee, no se bloquea a nadie ni se guardan eventos
+    sin límite; el suscriptor recibe `reiniciar` y su stream se cierra.
+    """
+
+    def __init__(self, maximo=COLA_EVENTOS, maximo_suscriptores=MAXIMO_SUSCRIPTORES):
+        self.maximo = maximo
+        self.maximo_suscriptores = maximo_suscriptores
+        self._loop = None
+        self._suscriptores = {}
+        self._cantidad = 0
+        self._recibidos = 0
+        self._entregados = 0
+        self._desbordes = 0
+        recibir_difusiones(self.recibir)
+
+    @property
+    def lleno(self):
+        return self._cantidad >= self.maximo_suscriptores
+
+    def suscribir(self, canal):
+        """
+        Desde el event loop. Devuelve None si ya hay demasiadas conexiones.
+        """
+        if self.lleno:
+            return None
+        self._loop = asyncio.get_running_loop()
+        suscriptor = Suscriptor(canal, self.maximo)
+        self._suscriptores.setdefault(canal, set()).add(suscriptor)
+        self._cantidad += 1
+        return suscriptor
+
+    def desuscribir(self, suscriptor):
+        suscriptores = self._suscriptores.get(suscriptor.canal)
+        if suscriptores is None or suscriptor not in suscriptores:
+            return
+        suscriptores.discard(suscriptor)
+        if not suscriptores:
+            del self._suscriptores[suscriptor.canal]
+        self._cantidad -= 1
+
+    def recibir(self, mensaje):
+        # desde cualquier hilo; sin suscriptores todavía no hay loop
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._repartir, mensaje)
+        except RuntimeError:
+            # el loop ya se cerró
+            pass
+
+    def _repartir(self, mensaje):
+        evento = json.loads(mensaje)
+        self._recibidos += 1
+        destinatarios = [
+            suscriptor
+            for canal in evento["canales"]
+            for suscriptor in self._suscriptores.get(canal, ())
+            if not suscriptor.desbordado
+        ]
+        if not destinatarios:
+            return
+        # los canales no se envían: un estudiante no necesita saber a quién
+        # más le llegó el evento
+        marco = (
+            f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: "
+            + json.dumps(
+                {"seq": evento["seq"], **evento["datos"]},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            + "\n\n"
+        )
+        for suscriptor in destinatarios:
+            try:
+                suscriptor.cola.put_nowait(marco)
+                self._entregados += 1
+            except asyncio.QueueFull:
+                suscriptor.reiniciar()
+                self._desbordes += 1
+
+    def metricas(self):
+        return {
+            "suscriptores": self._cantidad,
+            "canales": len(self._suscriptores),
+            "recibidos": self._recibidos,
+            "entregados": self._entregados,
+            "desbordes": self._desbordes,
+            "cola": self.maximo,
+        }
+
+    def cerrar(self):
+        dejar_de_recibir(self.recibir)
+        for suscriptores in self._suscriptores.values():
+            for suscriptor in suscriptores:
+                suscriptor.reiniciar()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = Broker()
+        return _broker
+
+
+def cerrar_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is not None:
+            _broker.cerrar()
+            _broker = None
+
+
+def publicar_al_confirmar(conn, tipo, filas, datos):
+    """
+    Dentro de un trabajo del escritor: publicar el evento `tipo` a los
+    estudiantes y profesores de las (idclase, idestudiante) indicadas,
+    después del COMMIT (si el trabajo falla no se publica nada).
+
+    El evento lleva el seq del feed de cambios que incluye esta escritura:
+    el cliente puede seguir con /cambios?since=<último seq aplicado>.
+    """
+    canales = sorted(
+        etiqueta
+        for etiqueta in etiquetas_tareas(conn, filas)
+        if not etiqueta.startswith("clase:")
+    )
+    if not canales:
+        return
+    (seq,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM Cambios").fetchone()
+    mensaje = json.dumps(
+        {"tipo": tipo, "seq": seq, "canales": canales, "datos": datos},
+        ensure_ascii=False,
+    )
+    get_escritor().al_confirmar(lambda: get_cache().difundir(mensaje))
+
+
+async def _flujo(broker, canal, seq, latido):
+    suscriptor = broker.suscribir(canal)
+    if suscriptor is None:
+        yield "event: reiniciar\ndata: {}\n\n"
+        return
+    try:
+        # punto de partida: lo anterior a seq se obtiene de /cambios
+        yield f"id: {seq}\nevent: conectado\ndata: " + json.dumps(
+            {"canal": canal, "seq": seq}
+        ) + "\n\n"
+        while True:
+            try:
+                marco = await asyncio.wait_for(suscriptor.cola.get(), latido)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            if marco is _REINICIAR:
+                yield "event: reiniciar\ndata: {}\n\n"
+                return
+            yield marco
+    finally:
+        # también al desconectarse el cliente (la tarea se cancela)
+        broker.desuscribir(suscriptor)
+
+
+def respuesta_eventos(canal, seq, latido=LATIDO_EVENTOS):
+    """
+    Respuesta text/event-stream con los eventos de `canal`. Con demasiadas
+    conexiones abiertas responde 503 para que el cliente vuelva a intentar
+    más tarde (o siga consultando).
+    """
+    broker = get_broker()
+    if broker.lleno:
+        raise HTTPException(
+            status_code=503,
+            detail="Demasiadas conexiones de eventos",
+            headers={"Retry-After": "30"},
+        )
+    return StreamingResponse(
+        _flujo(broker, canal, seq, latido),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
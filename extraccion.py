@@ -0,0 +1,369 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+from archivos import DIRECTORIO_PDF, candado, restaurar_archivado, ruta_entrega
+from conexion import abrir_lectura
+from escritor import get_escritor
+from texto_pdf import extraer_texto
+
+logger = logging.getLogger(__name__)
+
+# cada cuántos segundos se buscan archivos sin extraer, además del aviso de
+# cada entrega de este proceso; 0 desactiva la extracción
+INTERVALO_EXTRACCION = float(os.environ.get("COLEGIO_EXTRACCION_SEG", "300"))
+# procesos que extraen en paralelo (la extracción usa CPU, no el GIL del worker)
+PROCESOS_EXTRACCION = int(os.environ.get("COLEGIO_EXTRACCION_PROCESOS", "1"))
+# archivos por transacción
+LOTE_EXTRACCION = int(os.environ.get("COLEGIO_EXTRACCION_LOTE", "20"))
+# segundos por archivo; pasado ese tiempo se abandona y queda con error
+TIEMPO_EXTRACCION = float(os.environ.get("COLEGIO_EXTRACCION_TIMEOUT", "60"))
+# caracteres que se indexan de cada archivo
+TEXTO_MAXIMO = int(os.environ.get("COLEGIO_TEXTO_MAXIMO", "200000"))
+# segundos hasta el primer reintento tras un error pasajero (tiempo agotado,
+# lectura del disco); se duplica en cada intento
+REINTENTO_EXTRACCION = float(os.environ.get("COLEGIO_EXTRACCION_REINTENTO_SEG", "300"))
+# intentos por archivo antes de dejar el error como definitivo
+INTENTOS_EXTRACCION = 5
+# archivos que procesa cada proceso antes de reemplazarlo (acota la memoria)
+ARCHIVOS_POR_PROCESO = 50
+
+
+def _pendientes(lote, ahora):
+    """
+    Archivos sin texto extraído o con un error pasajero cuyo reintento ya
+    venció: (hash, nombre_archivo, paquete). Los del almacén tienen hash (y
+    paquete si ya se archivaron); los de las entregas anteriores al almacén
+    solo nombre_archivo.
+    """
+    conn = abrir_lectura()
+    try:
+        return conn.execute(
+            """
+            SELECT a.hash, NULL, aa.paquete
+            FROM Archivos a
+            LEFT JOIN TextosArchivos x ON x.hash = a.hash
+            LEFT JOIN ArchivosArchivados aa ON aa.hash = a.hash
+            WHERE x.idtexto IS NULL OR x.reintentar_desde <= :ahora
+            UNION ALL
+            SELECT NULL, e.nombre_archivo, NULL
+            FROM Entregas e
+            LEFT JOIN TextosArchivos x ON x.nombre_archivo = e.nombre_archivo
+            WHERE e.hash_archivo IS NULL
+              AND e.nombre_archivo IS NOT NULL
+              AND (x.idtexto IS NULL OR x.reintentar_desde <= :ahora)
+            GROUP BY e.nombre_archivo
+            LIMIT :lote
+            """,
+            {"ahora": ahora, "lote": lote},
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+# solo lo usa el hilo extractor (y cerrar_extractor, con el hilo detenido)
+_pool = None
+
+
+def _pool_procesos():
+    global _pool
+    if _pool is None:
+        # spawn: los procesos no heredan hilos ni conexiones del worker
+        _pool = multiprocessing.get_context("spawn").Pool(
+            PROCESOS_EXTRACCION, maxtasksperchild=ARCHIVOS_POR_PROCESO
+        )
+    return _pool
+
+
+def _terminar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+
+
+def _error(e):
+    # str() de algunos errores está vacío
+    return str(e) or type(e).__name__
+
+
+def _extraer_lote(pendientes):
+    """
+    Extraer en el pool los archivos dados. Devuelve por archivo (hash,
+    nombre_archivo, texto, paginas, error, pasajero); `pasajero` marca los
+    errores que se reintentan (tiempo agotado, lectura del disco). Si uno
+    supera TIEMPO_EXTRACCION se reemplaza el pool y los que quedaban se
+    devuelven en la próxima vuelta.
+    """
+    pool = _pool_procesos()
+    trabajos = []
+    for huella, nombre, paquete in pendientes:
+        try:
+            ruta = ruta_entrega({"hash_archivo": huella, "nombre_archivo": nombre})
+            if huella and not ruta.exists() and paquete:
+                ruta = restaurar_archivado(huella, paquete)
+            trabajo = pool.apply_async(extraer_texto, (str(ruta), TEXTO_MAXIMO))
+        except Exception as e:
+            trabajo = e
+        trabajos.append((huella, nombre, trabajo))
+
+    resultados = []
+    for huella, nombre, trabajo in trabajos:
+        if isinstance(trabajo, Exception):
+            resultados.append(
+                (huella, nombre, None, None, _error(trabajo), _pasajero(trabajo))
+            )
+            continue
+        try:
+            texto, paginas = trabajo.get(TIEMPO_EXTRACCION)
+        except multiprocessing.TimeoutError:
+            _terminar_pool()
+            resultados.append(
+                (huella, nombre, None, None, "Tiempo de extracción agotado", True)
+            )
+            break
+        except Exception as e:
+            resultados.append((huella, nombre, None, None, _error(e), _pasajero(e)))
+        else:
+            resultados.append((huella, nombre, texto, paginas, None, False))
+    return resultados
+
+
+def _pasajero(e):
+    # el archivo no estaba disponible en ese momento; un PDF dañado o que no
+    # es un PDF va a fallar igual la próxima vez
+    return isinstance(e, OSError)
+
+
+def _guardar_textos(conn, resultados, ahora):
+    hoy = date.today().isoformat()
+    for huella, nombre, texto, paginas, error, pasajero in resultados:
+        if huella:
+            clave, valor = "hash", huella
+            vigente = "SELECT 1 FROM Archivos WHERE hash = ?"
+        else:
+            clave, valor = "nombre_archivo", nombre
+            vigente = "SELECT 1 FROM Entregas WHERE hash_archivo IS NULL AND nombre_archivo = ?"
+        # el archivo pudo dejar de usarse mientras se extraía
+        if conn.execute(vigente, (valor,)).fetchone() is None:
+            continue
+        anterior = conn.execute(
+            f"SELECT idtexto, intentos FROM TextosArchivos WHERE {clave} = ?", (valor,)
+        ).fetchone()
+        intentos = anterior[1] + 1 if anterior else 1
+        reintentar = (
+            int(ahora + REINTENTO_EXTRACCION * 2 ** (intentos - 1))
+            if pasajero and intentos < INTENTOS_EXTRACCION
+            else None
+        )
+        datos = (
+            paginas,
+            None if texto is None else len(texto),
+            error,
+            hoy,
+            intentos,
+            reintentar,
+        )
+        if anterior is None:
+            idtexto = conn.execute(
+                f"""
+                INSERT INTO TextosArchivos (
+                  {clave}, paginas, caracteres, error, fecha_extraccion, intentos,
+                  reintentar_desde
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (valor, *datos),
+            ).lastrowid
+        else:
+            idtexto = anterior[0]
+            conn.execute(
+                """
+                UPDATE TextosArchivos
+                SET paginas = ?, caracteres = ?, error = ?, fecha_extraccion = ?,
+                    intentos = ?, reintentar_desde = ?
+                WHERE idtexto = ?
+                """,
+                (*datos, idtexto),
+            )
+            conn.execute("DELETE FROM BusquedaEntregas WHERE rowid = ?", (idtexto,))
+        if texto:
+            conn.execute(
+                "INSERT INTO BusquedaEntregas (rowid, texto) VALUES (?, ?)",
+                (idtexto, texto),
+            )
+
+
+def errores_definitivos(limite=100):
+    """
+    Archivos cuya extracción falló y no se va a reintentar sola (no es un
+    PDF, está dañado, o agotó los reintentos), del más reciente al más
+    antiguo.
+    """
+    conn = abrir_lectura()
+    try:
+        return [
+            dict(fila)
+            for fila in conn.execute(
+                """
+                SELECT hash, nombre_archivo, error, intentos, fecha_extraccion
+                FROM TextosArchivos
+                WHERE error IS NOT NULL AND reintentar_desde IS NULL
+                ORDER BY idtexto DESC
+                LIMIT ?
+                """,
+                (limite,),
+            )
+        ]
+    finally:
+        conn.close()
+
+
+def reintentar_errores(conn):
+    """
+    Dentro de un trabajo del escritor: volver a poner en cola los errores
+    definitivos (por ejemplo, después de actualizar pypdf), con todos sus
+    intentos disponibles. Devuelve cuántos archivos se reintentan.
+    """
+    reintentados = conn.execute("""
+        UPDATE TextosArchivos SET reintentar_desde = 0, intentos = 0
+        WHERE error IS NOT NULL AND reintentar_desde IS NULL
+        """).rowcount
+    if reintentados:
+        get_escritor().al_confirmar(_avisar)
+    return reintentados
+
+
+_metricas = {"extraidos": 0, "errores": 0, "reintentos": 0, "ultima": None}
+
+
+def extraer_pendientes(detener=None, lote=LOTE_EXTRACCION):
+    """
+    Extraer e indexar el texto de todos los archivos que todavía no lo
+    tienen, de a `lote` por transacción. Cada contenido se extrae una sola
+    vez aunque lo hayan subido varias entregas. Los errores pasajeros se
+    reintentan en pasadas posteriores, con esperas que se duplican, hasta
+    INTENTOS_EXTRACCION veces. Devuelve un resumen, o None si otro proceso
+    ya está extrayendo.
+    """
+    # un solo extractor a la vez entre todos los workers
+    with candado(Path(DIRECTORIO_PDF) / ".extraccion.lock") as propio:
+        if not propio:
+            return None
+        inicio = time.monotonic()
+        extraidos = errores = reintentos = 0
+        while detener is None or not detener.is_set():
+            ahora = time.time()
+            pendientes = _pendientes(lote, ahora)
+            if not pendientes:
+                break
+            resultados = _extraer_lote(pendientes)
+            get_escritor().ejecutar(_guardar_textos, resultados, ahora)
+            for huella, nombre, _, _, error, pasajero in resultados:
+                if error is None:
+                    extraidos += 1
+                    continue
+                logger.warning(
+                    "No se pudo extraer el texto de %s: %s", huella or nombre, error
+                )
+                if pasajero:
+                    reintentos += 1
+                else:
+                    errores += 1
+        if extraidos or errores or reintentos:
+            _metricas["extraidos"] += extraidos
+            _metricas["errores"] += errores
+            _metricas["reintentos"] += reintentos
+            _metricas["ultima"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "extraidos": extraidos,
+            "errores": errores,
+            "reintentos": reintentos,
+            "segundos": round(time.monotonic() - inicio, 3),
+        }
+
+
+def metricas_extraccion():
+    return dict(_metricas)
+
+
+class Extractor:
+    """
+    Hilo que extrae el texto de los archivos nuevos. Lo despierta cada
+    entrega confirmada en este proceso (avisar) y, para las que reciben
+    otros workers, una revisión cada `intervalo` segundos. La petición que
+    sube el archivo nunca espera la extracción.
+    """
+
+    def __init__(self, intervalo=INTERVALO_EXTRACCION):
+        self.intervalo = intervalo
+        self._aviso = threading.Event()
+        # revisar al arrancar lo que haya quedado pendiente
+        self._aviso.set()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="extraccion", daemon=True
+        )
+        self._hilo.start()
+
+    def avisar(self):
+        self._aviso.set()
+
+    def _bucle(self):
+        while True:
+            self._aviso.wait(self.intervalo)
+            if self._detener.is_set():
+                break
+            self._aviso.clear()
+            try:
+                extraer_pendientes(self._detener)
+            except Exception:
+                logger.exception("Falló la extracción de texto de las entregas")
+
+    def cerrar(self):
+        self._detener.set()
+        self._aviso.set()
+        self._hilo.join()
+        _terminar_pool()
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """
+    Extractor en segundo plano del proceso; None si COLEGIO_EXTRACCION_SEG
+    es 0.
+    """
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None and INTERVALO_EXTRACCION > 0:
+            _extractor = Extractor()
+        return _extractor
+
+
+def cerrar_extractor():
+    global _extractor
+    with _extractor_lock:
+        if _extractor is not None:
+            _extractor.cerrar()
+            _extractor = None
+
+
+def _avisar():
+    extractor = _extractor
+    if extractor is not None:
+        extractor.avisar()
+
+
+def extraer_al_confirmar():
+    """
+    Dentro de un trabajo del escritor: despertar al extractor después del
+    COMMIT, cuando el archivo nuevo ya está en Archivos.
+    """
+    get_escritor().al_confirmar(_avisar)
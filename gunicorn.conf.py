@@ -0,0 +1,60 @@
+# Configuración de gunicorn para producción:
+#   gunicorn -c gunicorn.conf.py app:app
+import os
+import secrets
+
+bind = os.environ.get("COLEGIO_BIND", "0.0.0.0:7860")
+# núcleos que el proceso puede usar (respeta los límites de cpuset del contenedor)
+NUCLEOS = (
+    len(os.sched_getaffinity(0))
+    if hasattr(os, "sched_getaffinity")
+    else os.cpu_count() or 1
+)
+workers = int(os.environ.get("COLEGIO_WORKERS", NUCLEOS))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.environ.get("COLEGIO_WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("COLEGIO_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("COLEGIO_KEEPALIVE", "5"))
+# la app se importa en cada worker después del fork: pool de lectura,
+# escritor y caché son propios de cada proceso y no se heredan abiertos
+preload_app = False
+accesslog = os.environ.get("COLEGIO_ACCESS_LOG") or None
+
+# sin Redis cada worker tiene su propia caché y no se entera de las
+# escrituras de los demás; se acorta el TTL para acotar el desfase (salvo
+# que COLEGIO_CACHE_TTL ya esté definido)
+SIN_CACHE_COMPARTIDA = workers > 1 and not os.environ.get("COLEGIO_CACHE_URL")
+TTL_SIN_CACHE_COMPARTIDA = "2"
+raw_env = (
+    [f"COLEGIO_CACHE_TTL={TTL_SIN_CACHE_COMPARTIDA}"]
+    if SIN_CACHE_COMPARTIDA and "COLEGIO_CACHE_TTL" not in os.environ
+    else []
+)
+
+
+def on_starting(server):
+    """
+    Una sola vez, en el proceso maestro y antes de crear los workers:
+    aplicar las migraciones y crear los directorios de archivos.
+    """
+    if SIN_CACHE_COMPARTIDA:
+        server.log.warning(
+            "%s workers sin COLEGIO_CACHE_URL: la caché de cada worker vence a "
+            "los %s s",
+            workers,
+            os.environ.get("COLEGIO_CACHE_TTL", TTL_SIN_CACHE_COMPARTIDA),
+        )
+
+    if not os.environ.get("COLEGIO_SECRETO"):
+        # los workers heredan el entorno del maestro: todos firman con la
+        # misma clave, pero los tokens no sobreviven a un reinicio
+        server.log.warning(
+            "COLEGIO_SECRETO no definido: se genera una clave de sesión temporal"
+        )
+        os.environ["COLEGIO_SECRETO"] = secrets.token_urlsafe(32)
+
+    from archivos import preparar_directorios
+    from migraciones import migrar
+
+    preparar_directorios()
+    migrar()
@@ -0,0 +1,164 @@
+import codecs
+import csv
+
+from lotes import insertar_lote
+from seguridad import hashear_lote
+
+COLUMNAS_ROSTER = ("nombre", "dni", "idclase", "contrasena")
+TAMANO_BLOQUE = 500
+MAXIMO_ERRORES_DETALLE = 1000
+ROL_ESTUDIANTE = "estudiante"
+
+
+class ArchivoInvalido(ValueError):
+    """
+    El archivo no es un CSV de estudiantes con las columnas esperadas.
+    """
+
+
+def leer_roster(binario, encoding="utf-8-sig"):
+    """
+    Abrir el CSV como lector de filas sin cargarlo completo en memoria.
+    Acepta ',' o ';' como separador (Excel en español exporta con ';').
+    """
+    texto = codecs.getreader(encoding)(binario)
+    encabezado = texto.readline()
+    if not encabezado.strip():
+        raise ArchivoInvalido("El archivo está vacío")
+    separador = ";" if encabezado.count(";") > encabezado.count(",") else ","
+    columnas = [
+        columna.strip().lower()
+        for columna in next(csv.reader([encabezado], delimiter=separador))
+    ]
+    faltantes = [columna for columna in COLUMNAS_ROSTER if columna not in columnas]
+    if faltantes:
+        raise ArchivoInvalido(f"Faltan columnas: {', '.join(faltantes)}")
+    return csv.DictReader(texto, fieldnames=columnas, delimiter=separador)
+
+
+def _validar_fila(fila):
+    valores = {
+        columna: (fila.get(columna) or "").strip() for columna in COLUMNAS_ROSTER
+    }
+    vacias = [columna for columna, valor in valores.items() if not valor]
+    if vacias:
+        raise ValueError(f"Columnas vacías: {', '.join(vacias)}")
+    try:
+        valores["idclase"] = int(valores["idclase"])
+    except ValueError:
+        raise ValueError("idclase debe ser un número")
+    return valores
+
+
+def _insertar_bloque(conn, bloque):
+    """
+    Crear los usuarios y estudiantes de un bloque. Devuelve los errores por
+    línea de las filas cuyo dni ya existía (en la base o en el mismo bloque).
+    """
+    dnis = [fila["dni"] for _, fila in bloque]
+    marcadores = ", ".join("?" for _ in dnis)
+    existentes = {
+        registro[0]
+        for registro in conn.execute(
+            f"SELECT dni FROM Usuarios WHERE dni IN ({marcadores})", dnis
+        )
+    }
+    errores = []
+    nuevos = []
+    for linea, fila in bloque:
+        if fila["dni"] in existentes:
+            errores.append(
+                {"linea": linea, "error": f"dni {fila['dni']} ya registrado"}
+            )
+            continue
+        existentes.add(fila["dni"])
+        nuevos.append(fila)
+
+    idusuarios = insertar_lote(
+        conn,
+        "Usuarios",
+        ("dni", "contrasena", "rol"),
+        [(fila["dni"], fila["contrasena"], ROL_ESTUDIANTE) for fila in nuevos],
+    )
+    conn.executemany(
+        "INSERT INTO Estudiantes (nombre, dni, idclase, idusuario) VALUES (?, ?, ?, ?)",
+        [
+            (fila["nombre"], fila["dni"], fila["idclase"], idusuario)
+            for fila, idusuario in zip(nuevos, idusuarios)
+        ],
+    )
+    return len(nuevos), errores
+
+
+def importar_roster(filas, escritor, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Recorrer el CSV fila por fila y confirmar cada `tamano_bloque` filas en
+    su propia transacción. Produce un resumen de avance por bloque y uno
+    final; las filas con errores se informan con su número de línea y no
+    detienen la importación.
+    """
+    procesadas = 0
+    creadas = 0
+    total_errores = 0
+    errores = []
+    bloque = []
+
+    def _anotar(nuevos_errores):
+        nonlocal total_errores
+        total_errores += len(nuevos_errores)
+        # solo se guarda el detalle de los primeros para acotar la memoria
+        espacio = MAXIMO_ERRORES_DETALLE - len(errores)
+        errores.extend(nuevos_errores[: max(espacio, 0)])
+
+    def _confirmar():
+        nonlocal creadas
+        if not bloque:
+            return
+        try:
+            # el hash se calcula fuera del escritor, en el pool de hashing
+            for (_, fila), huella in zip(
+                bloque, hashear_lote([fila["contrasena"] for _, fila in bloque])
+            ):
+                fila["contrasena"] = huella
+            insertadas, errores_bloque = escritor.ejecutar(
+                _insertar_bloque, list(bloque)
+            )
+        except Exception as e:
+            insertadas = 0
+            errores_bloque = [{"linea": linea, "error": str(e)} for linea, _ in bloque]
+        creadas += insertadas
+        _anotar(errores_bloque)
+        bloque.clear()
+
+    while True:
+        try:
+            fila = next(filas)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            # el resto del archivo no se puede leer; se confirma lo anterior
+            _anotar([{"linea": filas.line_num + 2, "error": f"Archivo ilegible: {e}"}])
+            break
+        procesadas += 1
+        # line_num cuenta desde la primera línea después del encabezado
+        linea = filas.line_num + 1
+        try:
+            bloque.append((linea, _validar_fila(fila)))
+        except ValueError as e:
+            _anotar([{"linea": linea, "error": str(e)}])
+        if len(bloque) >= tamano_bloque:
+            _confirmar()
+            yield {
+                "procesadas": procesadas,
+                "creadas": creadas,
+                "errores": total_errores,
+            }
+
+    _confirmar()
+    yield {
+        "procesadas": procesadas,
+        "creadas": creadas,
+        "errores": total_errores,
+        "detalle_errores": sorted(errores, key=lambda error: error["linea"]),
+        "terminado": True,
+    }
@@ -0,0 +1,156 @@
+from pydantic import ValidationError
+
+from consultas import TABLAS
+
+MAXIMO_POR_LOTE = 5000
+
+
+class LoteInvalido(ValueError):
+    """
+    El lote está vacío o supera MAXIMO_POR_LOTE.
+    """
+
+
+def _revisar_tamano(items):
+    if not items:
+        raise LoteInvalido("El lote está vacío")
+    if len(items) > MAXIMO_POR_LOTE:
+        raise LoteInvalido(f"El lote supera el máximo de {MAXIMO_POR_LOTE} elementos")
+
+
+def validar_lote(modelo, items):
+    """
+    Validar cada elemento con el modelo Pydantic por separado, para que un
+    elemento inválido no rechace todo el lote. Devuelve los válidos como
+    (indice, instancia) y los resultados de error ya armados.
+    """
+    _revisar_tamano(items)
+    validos = []
+    errores = []
+    for indice, item in enumerate(items):
+        try:
+            validos.append((indice, modelo(**item)))
+        except ValidationError as e:
+            detalle = "; ".join(
+                f"{'.'.join(str(parte) for parte in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            )
+            errores.append({"indice": indice, "ok": False, "error": detalle})
+        except TypeError:
+            errores.append(
+                {"indice": indice, "ok": False, "error": "Se esperaba un objeto"}
+            )
+    return validos, errores
+
+
+def _secuencia(conn, tabla):
+    fila = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla,)
+    ).fetchone()
+    return fila[0] if fila else 0
+
+
+def insertar_lote(conn, tabla, columnas, filas):
+    """
+    Insertar todas las filas con un solo executemany y devolver sus ids.
+
+    Las tablas usan AUTOINCREMENT y solo el escritor inserta, así que dentro
+    de su transacción los ids asignados son consecutivos a partir de
+    sqlite_sequence.
+    """
+    if not filas:
+        return []
+    antes = _secuencia(conn, tabla)
+    marcadores = ", ".join("?" for _ in columnas)
+    conn.executemany(
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})",
+        filas,
+    )
+    return list(range(antes + 1, _secuencia(conn, tabla) + 1))
+
+
+def _existentes(conn, tabla, ids):
+    clave, _ = TABLAS[tabla]
+    existentes = set()
+    # SQLite limita la cantidad de parámetros por sentencia
+    for inicio in range(0, len(ids), 500):
+        parte = ids[inicio : inicio + 500]
+        marcadores = ", ".join("?" for _ in parte)
+        existentes.update(
+            fila[0]
+            for fila in conn.execute(
+                f"SELECT {clave} FROM {tabla} WHERE {clave} IN ({marcadores})", parte
+            )
+        )
+    return existentes
+
+
+def actualizar_lote(conn, tabla, columnas, filas):
+    """
+    Actualizar filas completas con executemany. Cada fila trae los valores
+    de `columnas` seguidos de su id. Devuelve los ids que existían.
+    """
+    clave, _ = TABLAS[tabla]
+    existentes = _existentes(conn, tabla, [fila[-1] for fila in filas])
+    asignaciones = ", ".join(f"{columna} = ?" for columna in columnas)
+    conn.executemany(
+        f"UPDATE {tabla} SET {asignaciones} WHERE {clave} = ?",
+        [fila for fila in filas if fila[-1] in existentes],
+    )
+    return existentes
+
+
+def eliminar_lote(conn, tabla, ids):
+    """
+    Eliminar por lista de ids con executemany. Devuelve los ids que existían.
+    """
+    clave, _ = TABLAS[tabla]
+    existentes = _existentes(conn, tabla, ids)
+    conn.executemany(
+        f"DELETE FROM {tabla} WHERE {clave} = ?", [(i,) for i in existentes]
+    )
+    return existentes
+
+
+def resultados_insercion(validos, errores, ids):
+    """
+    Combinar los errores de validación con los ids asignados, en el orden
+    original del lote.
+    """
+    creados = [
+        {"indice": indice, "ok": True, "id": id_nuevo}
+        for (indice, _), id_nuevo in zip(validos, ids)
+    ]
+    return sorted(errores + creados, key=lambda resultado: resultado["indice"])
+
+
+def resultados_actualizacion(validos, errores, ids, existentes):
+    """
+    Combinar los errores de validación con el resultado de cada id
+    actualizado, en el orden original del lote.
+    """
+    actualizados = [
+        (
+            {"indice": indice, "id": i, "ok": True}
+            if i in existentes
+            else {"indice": indice, "id": i, "ok": False, "error": "No encontrado"}
+        )
+        for (indice, _), i in zip(validos, ids)
+    ]
+    return sorted(errores + actualizados, key=lambda resultado: resultado["indice"])
+
+
+def resultados_por_id(ids, existentes):
+    return [
+        (
+            {"id": i, "ok": True}
+            if i in existentes
+            else {"id": i, "ok": False, "error": "No encontrado"}
+        )
+        for i in ids
+    ]
+
+
+def revisar_ids(ids):
+    _revisar_tamano(ids)
+    return list(dict.fromkeys(ids))
@@ -0,0 +1,726 @@
+import sqlite3
+
+from conexion import DATABASE_NAME, configurar_conexion
+
+
+def _sentencias(sql):
+    """
+    Separar un script en sentencias completas (respeta los ';' dentro de
+    triggers).
+    """
+    actual = ""
+    for linea in sql.splitlines(keepends=True):
+        actual += linea
+        if sqlite3.complete_statement(actual):
+            if actual.strip():
+                yield actual.strip()
+            actual = ""
+    if actual.strip():
+        yield actual.strip()
+
+
+def _plantillas_de_tareas(conn):
+    """
+    Crear las tablas de plantillas y mover a ellas el texto repetido de las
+    tareas comunes que ya existían (mismo nombre, instrucciones, fecha y
+    clase en varias filas de Tareas).
+    """
+    for sentencia in _sentencias("""
+        CREATE TABLE IF NOT EXISTS PlantillasTarea (
+          idplantilla INTEGER PRIMARY KEY AUTOINCREMENT,
+          nombre_tarea VARCHAR,
+          instrucciones TEXT,
+          fecha_vencimiento DATE,
+          idclase INTEGER REFERENCES Clases(idclase)
+        );
+
+        ALTER TABLE Tareas ADD COLUMN idplantilla INTEGER REFERENCES PlantillasTarea(idplantilla);
+
+        CREATE INDEX IF NOT EXISTS idx_tareas_idplantilla ON Tareas(idplantilla);
+
+        CREATE VIEW IF NOT EXISTS VistaTareas AS
+        SELECT
+          t.idtarea,
+          COALESCE(t.nombre_tarea, p.nombre_tarea) AS nombre_tarea,
+          COALESCE(t.instrucciones, p.instrucciones) AS instrucciones,
+          COALESCE(t.fecha_vencimiento, p.fecha_vencimiento) AS fecha_vencimiento,
+          t.idclase,
+          t.idestudiante,
+          t.estado,
+          t.idplantilla
+        FROM Tareas t
+        LEFT JOIN PlantillasTarea p ON p.idplantilla = t.idplantilla;
+        """):
+        conn.execute(sentencia)
+
+    grupos = conn.execute("""
+        SELECT nombre_tarea, instrucciones, fecha_vencimiento, idclase
+        FROM Tareas
+        WHERE idplantilla IS NULL
+        GROUP BY nombre_tarea, instrucciones, fecha_vencimiento, idclase
+        HAVING COUNT(*) > 1
+        """).fetchall()
+    for grupo in grupos:
+        idplantilla = conn.execute(
+            "INSERT INTO PlantillasTarea (nombre_tarea, instrucciones, fecha_vencimiento, idclase) VALUES (?, ?, ?, ?)",
+            tuple(grupo),
+        ).lastrowid
+        conn.execute(
+            """
+            UPDATE Tareas
+            SET idplantilla = ?, nombre_tarea = NULL, instrucciones = NULL, fecha_vencimiento = NULL
+            WHERE idplantilla IS NULL
+              AND nombre_tarea IS ? AND instrucciones IS ? AND fecha_vencimiento IS ? AND idclase IS ?
+            """,
+            (idplantilla, *grupo),
+        )
+
+
+def reconstruir_estados(conn):
+    """
+    Volver a calcular EstadoActualTarea desde el historial completo de
+    CambiosEstado: el último cambio de cada tarea por (fecha_cambio,
+    idcambio). Las tareas borradas no vuelven aunque su historial siga ahí,
+    igual que con el trigger estado_actual_tarea_delete. Devuelve la
+    cantidad de tareas con estado.
+    """
+    conn.execute("DELETE FROM EstadoActualTarea")
+    return conn.execute("""
+        INSERT INTO EstadoActualTarea (idtarea, estado, fecha_cambio, idcambio)
+        SELECT idtarea, nuevo_estado, fecha_cambio, idcambio
+        FROM (
+          SELECT
+            idtarea, nuevo_estado, fecha_cambio, idcambio,
+            ROW_NUMBER() OVER (
+              PARTITION BY idtarea ORDER BY fecha_cambio DESC, idcambio DESC
+            ) AS orden
+          FROM CambiosEstado
+          WHERE idtarea IN (SELECT idtarea FROM Tareas)
+        )
+        WHERE orden = 1
+        """).rowcount
+
+
+def _estado_actual(conn):
+    """
+    Crear EstadoActualTarea con los triggers que la mantienen al día en la
+    misma transacción que cada cambio de estado, y llenarla desde el
+    historial existente.
+    """
+    for sentencia in _sentencias("""
+        CREATE TABLE IF NOT EXISTS EstadoActualTarea (
+          idtarea INTEGER PRIMARY KEY REFERENCES Tareas(idtarea),
+          estado VARCHAR,
+          fecha_cambio DATE,
+          idcambio INTEGER REFERENCES CambiosEstado(idcambio)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_estadoactual_estado ON EstadoActualTarea(estado);
+
+        -- un cambio con fecha anterior al último registrado no lo reemplaza
+        CREATE TRIGGER IF NOT EXISTS estado_actual_insert
+        AFTER INSERT ON CambiosEstado WHEN NEW.idtarea IS NOT NULL
+        BEGIN
+          INSERT INTO EstadoActualTarea (idtarea, estado, fecha_cambio, idcambio)
+          VALUES (NEW.idtarea, NEW.nuevo_estado, NEW.fecha_cambio, NEW.idcambio)
+          ON CONFLICT(idtarea) DO UPDATE SET
+            estado = excluded.estado,
+            fecha_cambio = excluded.fecha_cambio,
+            idcambio = excluded.idcambio
+          WHERE (excluded.fecha_cambio, excluded.idcambio) >= (fecha_cambio, idcambio)
+            OR fecha_cambio IS NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS estado_actual_update
+        AFTER UPDATE ON CambiosEstado
+        BEGIN
+          DELETE FROM EstadoActualTarea WHERE idtarea IN (OLD.idtarea, NEW.idtarea);
+          INSERT INTO EstadoActualTarea (idtarea, estado, fecha_cambio, idcambio)
+          SELECT idtarea, nuevo_estado, fecha_cambio, idcambio
+          FROM CambiosEstado c
+          WHERE c.idtarea IN (OLD.idtarea, NEW.idtarea)
+            AND c.idcambio = (
+              SELECT u.idcambio FROM CambiosEstado u
+              WHERE u.idtarea = c.idtarea
+              ORDER BY u.fecha_cambio DESC, u.idcambio DESC
+              LIMIT 1
+            );
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS estado_actual_delete
+        AFTER DELETE ON CambiosEstado WHEN OLD.idtarea IS NOT NULL
+        BEGIN
+          DELETE FROM EstadoActualTarea WHERE idtarea = OLD.idtarea;
+          INSERT INTO EstadoActualTarea (idtarea, estado, fecha_cambio, idcambio)
+          SELECT idtarea, nuevo_estado, fecha_cambio, idcambio
+          FROM CambiosEstado
+          WHERE idtarea = OLD.idtarea
+          ORDER BY fecha_cambio DESC, idcambio DESC
+          LIMIT 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS estado_actual_tarea_delete
+        AFTER DELETE ON Tareas
+        BEGIN
+          DELETE FROM EstadoActualTarea WHERE idtarea = OLD.idtarea;
+        END;
+        """):
+        conn.execute(sentencia)
+    reconstruir_estados(conn)
+
+
+# nombre en el feed, tabla y clave primaria de lo que registra Cambios
+TABLAS_CAMBIOS = (
+    ("usuarios", "Usuarios", "idusuario"),
+    ("profesores", "Profesores", "idprofesor"),
+    ("estudiantes", "Estudiantes", "idestudiante"),
+    ("clases", "Clases", "idclase"),
+    ("tareas", "Tareas", "idtarea"),
+    ("entregas", "Entregas", "identrega"),
+    ("cambios_estado", "CambiosEstado", "idcambio"),
+    ("estados_tareas", "EstadoActualTarea", "idtarea"),
+)
+
+
+def _registrar_cambio(nombre, clave):
+    # borrar y volver a insertar en lugar de INSERT OR REPLACE: dentro de un
+    # trigger, el OR REPLACE se ignora cuando la sentencia que lo disparó
+    # tiene su propia política de conflicto (por ejemplo un upsert sobre
+    # EstadoActualTarea) y la fila repetida hace fallar la escritura
+    return (
+        f"DELETE FROM Cambios WHERE tabla = '{nombre}' AND clave = {clave};\n"
+        f"  INSERT INTO Cambios (tabla, clave) VALUES ('{nombre}', {clave});"
+    )
+
+
+def _feed_de_cambios(conn):
+    """
+    Crear el registro de cambios para la sincronización incremental: una
+    fila por registro modificado con el número de secuencia de su último
+    cambio. Los triggers borran y vuelven a insertar la fila en cada alta,
+    cambio o baja (así recibe un seq nuevo), de modo que el feed crece con
+    la cantidad de registros y no con la de cambios. Se llena con todo lo
+    que ya existe para que since=0 sirva como sincronización completa.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Cambios (
+          seq INTEGER PRIMARY KEY AUTOINCREMENT,
+          tabla VARCHAR NOT NULL,
+          clave INTEGER NOT NULL,
+          UNIQUE (tabla, clave)
+        )
+        """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cambios_tabla_seq ON Cambios(tabla, seq)"
+    )
+    for nombre, tabla, clave in TABLAS_CAMBIOS:
+        for sentencia in _sentencias(f"""
+            CREATE TRIGGER IF NOT EXISTS cambios_{nombre}_insert
+            AFTER INSERT ON {tabla}
+            BEGIN
+              {_registrar_cambio(nombre, f"NEW.{clave}")}
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS cambios_{nombre}_update
+            AFTER UPDATE ON {tabla}
+            BEGIN
+              DELETE FROM Cambios WHERE tabla = '{nombre}' AND clave = OLD.{clave};
+              INSERT INTO Cambios (tabla, clave)
+              SELECT '{nombre}', OLD.{clave} WHERE OLD.{clave} IS NOT NEW.{clave};
+              {_registrar_cambio(nombre, f"NEW.{clave}")}
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS cambios_{nombre}_delete
+            AFTER DELETE ON {tabla}
+            BEGIN
+              {_registrar_cambio(nombre, f"OLD.{clave}")}
+            END;
+            """):
+            conn.execute(sentencia)
+        conn.execute(
+            f"INSERT OR REPLACE INTO Cambios (tabla, clave) SELECT '{nombre}', {clave} FROM {tabla} ORDER BY {clave}"
+        )
+
+    # las tareas comunes leen su texto de la plantilla: cambiarla cambia
+    # todas sus tareas
+    for sentencia in _sentencias("""
+        CREATE TRIGGER IF NOT EXISTS cambios_plantillas_update
+        AFTER UPDATE ON PlantillasTarea
+        BEGIN
+          DELETE FROM Cambios
+          WHERE tabla = 'tareas'
+            AND clave IN (SELECT idtarea FROM Tareas WHERE idplantilla = NEW.idplantilla);
+          INSERT INTO Cambios (tabla, clave)
+          SELECT 'tareas', idtarea FROM Tareas WHERE idplantilla = NEW.idplantilla;
+        END;
+        """):
+        conn.execute(sentencia)
+
+
+# tareas con texto propio en BusquedaTareas: las sueltas y las comunes que
+# cambian el nombre o las instrucciones de su plantilla
+_TEXTO_PROPIO = (
+    "({t}.idplantilla IS NULL OR {t}.nombre_tarea IS NOT NULL"
+    " OR {t}.instrucciones IS NOT NULL)"
+)
+
+
+def _busqueda_de_tareas(conn):
+    """
+    Crear el índice de texto completo de las tareas. Cada texto se indexa
+    una sola vez: el de una tarea común con rowid -idplantilla y el de una
+    tarea suelta con rowid idtarea. Una tarea común que cambia su nombre o
+    sus instrucciones se indexa además con rowid idtarea, con sus valores
+    efectivos (los de VistaTareas). Los triggers lo mantienen en la misma
+    transacción que cada alta, cambio o baja.
+    """
+    for sentencia in _sentencias(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS BusquedaTareas USING fts5(
+          nombre_tarea,
+          instrucciones,
+          idclase UNINDEXED,
+          tokenize = 'unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS busqueda_tareas_insert
+        AFTER INSERT ON Tareas
+        WHEN {_TEXTO_PROPIO.format(t="NEW")}
+        BEGIN
+          INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+          SELECT idtarea, nombre_tarea, instrucciones, idclase
+          FROM VistaTareas WHERE idtarea = NEW.idtarea;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS busqueda_tareas_update
+        AFTER UPDATE OF nombre_tarea, instrucciones, idclase, idplantilla, idtarea ON Tareas
+        BEGIN
+          DELETE FROM BusquedaTareas WHERE rowid = OLD.idtarea;
+          INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+          SELECT idtarea, nombre_tarea, instrucciones, idclase
+          FROM VistaTareas
+          WHERE idtarea = NEW.idtarea AND {_TEXTO_PROPIO.format(t="NEW")};
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS busqueda_tareas_delete
+        AFTER DELETE ON Tareas
+        BEGIN
+          DELETE FROM BusquedaTareas WHERE rowid = OLD.idtarea;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS busqueda_plantillas_insert
+        AFTER INSERT ON PlantillasTarea
+        BEGIN
+          INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+          VALUES (-NEW.idplantilla, NEW.nombre_tarea, NEW.instrucciones, NEW.idclase);
+        END;
+
+        -- las tareas que cambian solo el nombre o solo las instrucciones
+        -- toman el resto de la plantilla
+        CREATE TRIGGER IF NOT EXISTS busqueda_plantillas_update
+        AFTER UPDATE OF nombre_tarea, instrucciones, idclase, idplantilla ON PlantillasTarea
+        BEGIN
+          DELETE FROM BusquedaTareas WHERE rowid = -OLD.idplantilla;
+          INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+          VALUES (-NEW.idplantilla, NEW.nombre_tarea, NEW.instrucciones, NEW.idclase);
+          DELETE FROM BusquedaTareas
+          WHERE rowid IN (
+            SELECT idtarea FROM Tareas
+            WHERE idplantilla = NEW.idplantilla AND {_TEXTO_PROPIO.format(t="Tareas")}
+          );
+          INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+          SELECT v.idtarea, v.nombre_tarea, v.instrucciones, v.idclase
+          FROM Tareas t
+          JOIN VistaTareas v ON v.idtarea = t.idtarea
+          WHERE t.idplantilla = NEW.idplantilla AND {_TEXTO_PROPIO.format(t="t")};
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS busqueda_plantillas_delete
+        AFTER DELETE ON PlantillasTarea
+        BEGIN
+          DELETE FROM BusquedaTareas WHERE rowid = -OLD.idplantilla;
+        END;
+        """):
+        conn.execute(sentencia)
+
+    # el nombre pesa más que las instrucciones al ordenar por relevancia
+    conn.execute(
+        "INSERT INTO BusquedaTareas (BusquedaTareas, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')"
+    )
+    conn.execute("DELETE FROM BusquedaTareas")
+    conn.execute(f"""
+        INSERT INTO BusquedaTareas (rowid, nombre_tarea, instrucciones, idclase)
+        SELECT -idplantilla, nombre_tarea, instrucciones, idclase FROM PlantillasTarea
+        UNION ALL
+        SELECT v.idtarea, v.nombre_tarea, v.instrucciones, v.idclase
+        FROM Tareas t
+        JOIN VistaTareas v ON v.idtarea = t.idtarea
+        WHERE {_TEXTO_PROPIO.format(t="t")}
+        """)
+
+
+def _textos_reintentables(conn):
+    """
+    Rehacer TextosArchivos para que también guarde el texto de los archivos
+    de las entregas anteriores al almacén (pdf/<nombre_archivo>, sin hash) y
+    para reintentar las extracciones que fallaron por un error pasajero
+    (tiempo agotado, lectura del disco). Se conservan los idtexto, que son
+    los rowid de BusquedaEntregas. Los errores ya guardados se reintentan
+    una vez: antes no se distinguía cuáles eran pasajeros.
+    """
+    for sentencia in _sentencias("""
+        DROP TRIGGER IF EXISTS textos_archivos_delete;
+        DROP TRIGGER IF EXISTS textos_archivos_archivo_delete;
+
+        CREATE TABLE TextosArchivosNueva (
+          idtexto INTEGER PRIMARY KEY AUTOINCREMENT,
+          hash VARCHAR UNIQUE REFERENCES Archivos(hash),
+          nombre_archivo VARCHAR UNIQUE,
+          paginas INTEGER,
+          caracteres INTEGER,
+          error VARCHAR,
+          fecha_extraccion DATE,
+          intentos INTEGER NOT NULL DEFAULT 1,
+          reintentar_desde INTEGER,
+          CHECK ((hash IS NULL) <> (nombre_archivo IS NULL))
+        );
+
+        INSERT INTO TextosArchivosNueva (
+          idtexto, hash, paginas, caracteres, error, fecha_extraccion, reintentar_desde
+        )
+        SELECT idtexto, hash, paginas, caracteres, error, fecha_extraccion,
+               CASE WHEN error IS NOT NULL THEN 0 END
+        FROM TextosArchivos;
+
+        DROP TABLE TextosArchivos;
+        ALTER TABLE TextosArchivosNueva RENAME TO TextosArchivos;
+
+        CREATE INDEX IF NOT EXISTS idx_entregas_antiguas
+        ON Entregas(nombre_archivo) WHERE hash_archivo IS NULL;
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_delete
+        AFTER DELETE ON TextosArchivos
+        BEGIN
+          DELETE FROM BusquedaEntregas WHERE rowid = OLD.idtexto;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_archivo_delete
+        AFTER DELETE ON Archivos
+        BEGIN
+          DELETE FROM TextosArchivos WHERE hash = OLD.hash;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_entrega_delete
+        AFTER DELETE ON Entregas
+        WHEN OLD.hash_archivo IS NULL
+        BEGIN
+          DELETE FROM TextosArchivos
+          WHERE nombre_archivo = OLD.nombre_archivo
+            AND NOT EXISTS (
+              SELECT 1 FROM Entregas
+              WHERE hash_archivo IS NULL AND nombre_archivo = OLD.nombre_archivo
+            );
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_entrega_update
+        AFTER UPDATE OF hash_archivo, nombre_archivo ON Entregas
+        WHEN OLD.hash_archivo IS NULL
+        BEGIN
+          DELETE FROM TextosArchivos
+          WHERE nombre_archivo = OLD.nombre_archivo
+            AND NOT EXISTS (
+              SELECT 1 FROM Entregas
+              WHERE hash_archivo IS NULL AND nombre_archivo = OLD.nombre_archivo
+            );
+        END;
+        """):
+        conn.execute(sentencia)
+
+
+# Cada migración es (version, descripcion, sql o funcion(conn)).
+# Nunca editar una migración ya publicada: agregar una nueva al final.
+MIGRACIONES = [
+    (
+        1,
+        "esquema inicial",
+        """
+        CREATE TABLE IF NOT EXISTS Usuarios (
+          idusuario INTEGER PRIMARY KEY AUTOINCREMENT,
+          dni VARCHAR,
+          contrasena VARCHAR,
+          rol VARCHAR
+        );
+
+        CREATE TABLE IF NOT EXISTS Estudiantes (
+          idestudiante INTEGER PRIMARY KEY AUTOINCREMENT,
+          nombre VARCHAR,
+          dni VARCHAR,
+          idclase INTEGER,
+          idusuario INTEGER REFERENCES Usuarios(idusuario)
+        );
+
+        CREATE TABLE IF NOT EXISTS Profesores (
+          idprofesor INTEGER PRIMARY KEY AUTOINCREMENT,
+          nombre VARCHAR,
+          dni VARCHAR,
+          correo VARCHAR,
+          idusuario INTEGER REFERENCES Usuarios(idusuario)
+        );
+
+        CREATE TABLE IF NOT EXISTS Tareas (
+          idtarea INTEGER PRIMARY KEY AUTOINCREMENT,
+          nombre_tarea VARCHAR,
+          instrucciones TEXT,
+          fecha_vencimiento DATE,
+          idclase INTEGER REFERENCES Clases(idclase),
+          idestudiante INTEGER REFERENCES Estudiantes(idestudiante),
+          estado VARCHAR
+        );
+
+        CREATE TABLE IF NOT EXISTS Clases (
+          idclase INTEGER PRIMARY KEY AUTOINCREMENT,
+          nombre VARCHAR,
+          idprofesor INTEGER REFERENCES Profesores(idprofesor)
+        );
+
+        CREATE TABLE IF NOT EXISTS CambiosEstado (
+          idcambio INTEGER PRIMARY KEY AUTOINCREMENT,
+          idtarea INTEGER REFERENCES Tareas(idtarea),
+          nuevo_estado VARCHAR,
+          fecha_cambio DATE
+        );
+
+        CREATE TABLE IF NOT EXISTS Entregas (
+          identrega INTEGER PRIMARY KEY AUTOINCREMENT,
+          fecha_entrega DATE,
+          nombre_archivo VARCHAR,
+          tipo_archivo VARCHAR,
+          idtarea INTEGER REFERENCES Tareas(idtarea),
+          idestudiante INTEGER REFERENCES Estudiantes(idestudiante)
+        );
+        """,
+    ),
+    (
+        2,
+        "indices secundarios",
+        """
+        CREATE INDEX IF NOT EXISTS idx_tareas_idestudiante ON Tareas(idestudiante);
+        CREATE INDEX IF NOT EXISTS idx_tareas_idclase_estado ON Tareas(idclase, estado);
+        CREATE INDEX IF NOT EXISTS idx_clases_idprofesor ON Clases(idprofesor);
+        CREATE INDEX IF NOT EXISTS idx_usuarios_dni ON Usuarios(dni);
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_idclase ON Estudiantes(idclase);
+        CREATE INDEX IF NOT EXISTS idx_entregas_idtarea ON Entregas(idtarea);
+        CREATE INDEX IF NOT EXISTS idx_cambiosestado_idtarea_fecha ON CambiosEstado(idtarea, fecha_cambio);
+        """,
+    ),
+    (3, "plantillas de tareas comunes", _plantillas_de_tareas),
+    (
+        4,
+        "almacen de archivos por contenido",
+        """
+        CREATE TABLE IF NOT EXISTS Archivos (
+          hash VARCHAR PRIMARY KEY,
+          tamano INTEGER,
+          referencias INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        ALTER TABLE Entregas ADD COLUMN hash_archivo VARCHAR REFERENCES Archivos(hash);
+        """,
+    ),
+    (
+        5,
+        "resumen de entregas por tarea",
+        """
+        CREATE TABLE IF NOT EXISTS ResumenEntregas (
+          idtarea INTEGER PRIMARY KEY REFERENCES Tareas(idtarea),
+          entregas INTEGER NOT NULL DEFAULT 0,
+          ultima_entrega INTEGER REFERENCES Entregas(identrega),
+          fecha_ultima DATE
+        );
+
+        -- con un solo max() SQLite toma fecha_entrega de la fila del máximo
+        INSERT INTO ResumenEntregas (idtarea, entregas, ultima_entrega, fecha_ultima)
+        SELECT idtarea, COUNT(*), MAX(identrega), fecha_entrega
+        FROM Entregas
+        WHERE idtarea IS NOT NULL
+        GROUP BY idtarea;
+
+        CREATE TRIGGER IF NOT EXISTS resumen_entregas_insert
+        AFTER INSERT ON Entregas WHEN NEW.idtarea IS NOT NULL
+        BEGIN
+          INSERT INTO ResumenEntregas (idtarea, entregas, ultima_entrega, fecha_ultima)
+          VALUES (NEW.idtarea, 1, NEW.identrega, NEW.fecha_entrega)
+          ON CONFLICT(idtarea) DO UPDATE SET
+            entregas = entregas + 1,
+            ultima_entrega = excluded.ultima_entrega,
+            fecha_ultima = excluded.fecha_ultima;
+        END;
+
+        -- borrar o cambiar una entrega recalcula solo las tareas afectadas
+        CREATE TRIGGER IF NOT EXISTS resumen_entregas_delete
+        AFTER DELETE ON Entregas WHEN OLD.idtarea IS NOT NULL
+        BEGIN
+          DELETE FROM ResumenEntregas WHERE idtarea = OLD.idtarea;
+          INSERT INTO ResumenEntregas (idtarea, entregas, ultima_entrega, fecha_ultima)
+          SELECT idtarea, COUNT(*), MAX(identrega), fecha_entrega
+          FROM Entregas WHERE idtarea = OLD.idtarea GROUP BY idtarea;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS resumen_entregas_update
+        AFTER UPDATE OF idtarea, fecha_entrega ON Entregas
+        BEGIN
+          DELETE FROM ResumenEntregas WHERE idtarea IN (OLD.idtarea, NEW.idtarea);
+          INSERT INTO ResumenEntregas (idtarea, entregas, ultima_entrega, fecha_ultima)
+          SELECT idtarea, COUNT(*), MAX(identrega), fecha_entrega
+          FROM Entregas WHERE idtarea IN (OLD.idtarea, NEW.idtarea) GROUP BY idtarea;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS resumen_entregas_tarea_delete
+        AFTER DELETE ON Tareas
+        BEGIN
+          DELETE FROM ResumenEntregas WHERE idtarea = OLD.idtarea;
+        END;
+        """,
+    ),
+    (6, "estado actual de cada tarea", _estado_actual),
+    (
+        7,
+        "resumen de cambios de estado y archivo de entregas",
+        """
+        CREATE TABLE IF NOT EXISTS ResumenCambiosEstado (
+          idtarea INTEGER REFERENCES Tareas(idtarea),
+          nuevo_estado VARCHAR,
+          cambios INTEGER NOT NULL,
+          primera_fecha DATE,
+          ultima_fecha DATE,
+          PRIMARY KEY (idtarea, nuevo_estado)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS ArchivosArchivados (
+          hash VARCHAR PRIMARY KEY REFERENCES Archivos(hash),
+          paquete VARCHAR NOT NULL,
+          fecha_archivado DATE
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_archivosarchivados_paquete ON ArchivosArchivados(paquete);
+        CREATE INDEX IF NOT EXISTS idx_entregas_hash_archivo ON Entregas(hash_archivo);
+
+        CREATE TRIGGER IF NOT EXISTS resumen_cambios_tarea_delete
+        AFTER DELETE ON Tareas
+        BEGIN
+          DELETE FROM ResumenCambiosEstado WHERE idtarea = OLD.idtarea;
+        END;
+        """,
+    ),
+    (
+        8,
+        "tokens de sesion revocados",
+        """
+        CREATE TABLE IF NOT EXISTS TokensRevocados (
+          jti VARCHAR PRIMARY KEY,
+          expira INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_tokensrevocados_expira ON TokensRevocados(expira);
+        """,
+    ),
+    (9, "registro de cambios para sincronizacion", _feed_de_cambios),
+    (10, "busqueda de texto completo en tareas", _busqueda_de_tareas),
+    (
+        11,
+        "texto extraido de los archivos entregados",
+        """
+        CREATE TABLE IF NOT EXISTS TextosArchivos (
+          idtexto INTEGER PRIMARY KEY AUTOINCREMENT,
+          hash VARCHAR NOT NULL UNIQUE REFERENCES Archivos(hash),
+          paginas INTEGER,
+          caracteres INTEGER,
+          error VARCHAR,
+          fecha_extraccion DATE
+        );
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS BusquedaEntregas USING fts5(
+          texto,
+          tokenize = 'unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_delete
+        AFTER DELETE ON TextosArchivos
+        BEGIN
+          DELETE FROM BusquedaEntregas WHERE rowid = OLD.idtexto;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS textos_archivos_archivo_delete
+        AFTER DELETE ON Archivos
+        BEGIN
+          DELETE FROM TextosArchivos WHERE hash = OLD.hash;
+        END;
+        """,
+    ),
+    (12, "reintentos y entregas antiguas en la extraccion", _textos_reintentables),
+]
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(database=DATABASE_NAME, hasta=None):
+    """
+    Aplicar en orden las migraciones pendientes. Cada migración corre en su
+    propia transacción junto con el cambio de user_version, así que una
+    migración fallida no deja la base a medias. Devuelve la versión final.
+    """
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        conn.row_factory = sqlite3.Row
+        configurar_conexion(conn)
+        if not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+            # en una base vacía auto_vacuum se fija sin VACUUM: rige desde la
+            # primera tabla
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        for version, descripcion, migracion in MIGRACIONES:
+            if hasta is not None and version > hasta:
+                break
+            if version_actual(conn) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # otro proceso pudo haberla aplicado mientras esperábamos
+                if version_actual(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                if callable(migracion):
+                    migracion(conn)
+                else:
+                    for sentencia in _sentencias(migracion):
+                        conn.execute(sentencia)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            print(f"migracion {version} aplicada: {descripcion}")
+        return version_actual(conn)
+    finally:
+        conn.close()
+
+
+def convertir_auto_vacuum(database=DATABASE_NAME):
+    """
+    Pasar una base existente a auto_vacuum=INCREMENTAL, que la compactación
+    necesita para devolver páginas libres al sistema. Requiere un VACUUM
+    completo, que reescribe todo el archivo y bloquea las escrituras
+    mientras dura, así que se hace sin la API en marcha (python tablas.py).
+    Devuelve True si hubo que convertirla.
+    """
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        configurar_conexion(conn)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
@@ -0,0 +1,318 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from conexion import abrir_lectura
+
+# parámetros de scrypt: ~16 MiB y unas decenas de ms por contraseña
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PREFIJO_HASH = "scrypt$"
+# hilos dedicados a hashear; acotan cuánta CPU pueden tomar los logins
+HILOS_HASH = int(os.environ.get("COLEGIO_HASH_HILOS", "2"))
+
+# duración de los tokens de sesión
+DURACION_TOKEN = int(os.environ.get("COLEGIO_TOKEN_SEG", str(8 * 3600)))
+# cada cuántos segundos se relee la lista de tokens revocados
+INTERVALO_REVOCACIONES = float(os.environ.get("COLEGIO_REVOCACION_SEG", "5"))
+
+# hash con el que se compara cuando el dni no existe, para que la respuesta
+# tarde lo mismo que con un dni válido
+HASH_FICTICIO = f"{PREFIJO_HASH}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${'A' * 22}${'A' * 43}"
+
+Sesion = namedtuple("Sesion", ["idusuario", "rol", "jti", "expira"])
+
+
+class TokenInvalido(ValueError):
+    """
+    Token mal formado, con firma incorrecta, vencido o revocado.
+    """
+
+
+_clave = None
+
+
+def _secreto():
+    """
+    Clave de firma de los tokens. Con varios workers debe ser la misma en
+    todos: gunicorn.conf.py genera una al arrancar si no se definió
+    COLEGIO_SECRETO. Sin ella cada proceso usa una propia y los tokens
+    dejan de valer al reiniciar.
+    """
+    global _clave
+    if _clave is None:
+        secreto = os.environ.get("COLEGIO_SECRETO")
+        _clave = secreto.encode("utf-8") if secreto else secrets.token_bytes(32)
+    return _clave
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def hashear_contrasena(contrasena):
+    """
+    scrypt$N$r$p$sal$hash, con sal aleatoria de 16 bytes.
+    """
+    sal = secrets.token_bytes(16)
+    huella = hashlib.scrypt(
+        contrasena.encode("utf-8"), salt=sal, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P
+    )
+    return f"{PREFIJO_HASH}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(huella)}"
+
+
+def es_hash(guardada):
+    return bool(guardada) and guardada.startswith(PREFIJO_HASH)
+
+
+def verificar_contrasena(contrasena, guardada):
+    """
+    Comparar en tiempo constante con el hash guardado. Las contraseñas
+    anteriores a los hashes están en texto plano y se comparan tal cual;
+    login las reemplaza por su hash.
+    """
+    if not guardada:
+        return False
+    if not es_hash(guardada):
+        return hmac.compare_digest(contrasena.encode("utf-8"), guardada.encode("utf-8"))
+    try:
+        _, n, r, p, sal, huella = guardada.split("$")
+        calculada = hashlib.scrypt(
+            contrasena.encode("utf-8"),
+            salt=_desde_b64(sal),
+            n=int(n),
+            r=int(r),
+            p=int(p),
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculada, _desde_b64(huella))
+
+
+_pool_hash = None
+_pool_hash_lock = threading.Lock()
+
+
+def _pool():
+    global _pool_hash
+    with _pool_hash_lock:
+        if _pool_hash is None:
+            _pool_hash = ThreadPoolExecutor(
+                max_workers=HILOS_HASH, thread_name_prefix="hash"
+            )
+        return _pool_hash
+
+
+async def hashear_async(contrasena):
+    """
+    Hashear en el pool de hashing, sin ocupar el event loop ni el
+    threadpool de FastAPI (hashlib.scrypt suelta el GIL).
+    """
+    return await asyncio.wrap_future(_pool().submit(hashear_contrasena, contrasena))
+
+
+async def verificar_async(contrasena, guardada):
+    return await asyncio.wrap_future(
+        _pool().submit(verificar_contrasena, contrasena, guardada)
+    )
+
+
+def hashear_lote(contrasenas):
+    """
+    Hashear varias contraseñas desde código síncrono (la importación, que
+    corre en el threadpool) usando el mismo pool acotado. No llamarla desde
+    un hilo del pool de hashing: esperaría a tareas de su propio pool.
+    """
+    return list(_pool().map(hashear_contrasena, contrasenas))
+
+
+async def hashear_lote_async(contrasenas):
+    """
+    Cada contraseña es una tarea del pool, encolada desde el event loop:
+    ningún hilo del pool espera a otro, así que los lotes concurrentes y
+    los logins comparten los hilos sin bloquearse.
+    """
+    return list(await asyncio.gather(*(hashear_async(c) for c in contrasenas)))
+
+
+def emitir_token(idusuario, rol, duracion=DURACION_TOKEN):
+    """
+    Token firmado con HMAC-SHA256: base64url(datos).base64url(firma). Los
+    datos llevan idusuario, rol, vencimiento e identificador (para revocar).
+    Devuelve (token, vencimiento).
+    """
+    expira = int(time.time()) + duracion
+    datos = _b64(
+        json.dumps(
+            {
+                "sub": idusuario,
+                "rol": rol,
+                "exp": expira,
+                "jti": _b64(secrets.token_bytes(12)),
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+    )
+    firma = _b64(hmac.new(_secreto(), datos.encode("ascii"), hashlib.sha256).digest())
+    return f"{datos}.{firma}", expira
+
+
+def leer_token(token, revocados=None):
+    """
+    Verificar firma, vencimiento y revocación sin consultar la base.
+    """
+    try:
+        datos, firma = token.split(".")
+        esperada = hmac.new(_secreto(), datos.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(esperada, _desde_b64(firma)):
+            raise TokenInvalido("Firma inválida")
+        contenido = json.loads(_desde_b64(datos))
+        sesion = Sesion(
+            contenido["sub"], contenido["rol"], contenido["jti"], contenido["exp"]
+        )
+    except TokenInvalido:
+        raise
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise TokenInvalido("Token mal formado")
+    if sesion.expira <= time.time():
+        raise TokenInvalido("Token vencido")
+    if revocados is not None and revocados.contiene(sesion.jti):
+        raise TokenInvalido("Token revocado")
+    return sesion
+
+
+class Revocaciones:
+    """
+    Conjunto en memoria de los tokens revocados que todavía no vencieron.
+
+    La tabla TokensRevocados es la fuente compartida entre workers: un hilo
+    la relee cada INTERVALO_REVOCACIONES segundos, y las revocaciones de
+    este proceso se agregan al conjunto en el momento. Verificar un token
+    nunca toca la base.
+    """
+
+    def __init__(self, intervalo=INTERVALO_REVOCACIONES):
+        self.intervalo = intervalo
+        self._revocados = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self.recargar()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="revocaciones", daemon=True
+        )
+        self._hilo.start()
+
+    def contiene(self, jti):
+        return jti in self._revocados
+
+    def agregar(self, jti, expira):
+        with self._lock:
+            self._revocados[jti] = expira
+
+    def recargar(self):
+        ahora = int(time.time())
+        conn = abrir_lectura()
+        try:
+            filas = conn.execute(
+                "SELECT jti, expira FROM TokensRevocados WHERE expira > ?", (ahora,)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            # conservar las locales que la lectura todavía no ve
+            locales = {
+                jti: expira for jti, expira in self._revocados.items() if expira > ahora
+            }
+            locales.update((fila[0], fila[1]) for fila in filas)
+            self._revocados = locales
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.recargar()
+            except Exception as e:
+                print(e)
+
+    def metricas(self):
+        return {"revocados": len(self._revocados)}
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join()
+
+
+def revocar(conn, sesion):
+    """
+    Dentro de un trabajo del escritor: registrar la revocación y, de paso,
+    borrar las que ya vencieron.
+    """
+    conn.execute(
+        "INSERT OR IGNORE INTO TokensRevocados (jti, expira) VALUES (?, ?)",
+        (sesion.jti, sesion.expira),
+    )
+    conn.execute("DELETE FROM TokensRevocados WHERE expira <= ?", (int(time.time()),))
+
+
+_revocaciones = None
+_revocaciones_lock = threading.Lock()
+
+
+def get_revocaciones():
+    global _revocaciones
+    with _revocaciones_lock:
+        if _revocaciones is None:
+            _revocaciones = Revocaciones()
+        return _revocaciones
+
+
+def cerrar_seguridad():
+    global _revocaciones, _pool_hash
+    with _revocaciones_lock:
+        if _revocaciones is not None:
+            _revocaciones.cerrar()
+            _revocaciones = None
+    with _pool_hash_lock:
+        if _pool_hash is not None:
+            _pool_hash.shutdown()
+            _pool_hash = None
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def usuario_actual(
+    credenciales: HTTPAuthorizationCredentials = Depends(_bearer),
+):
+    """
+    Dependencia para los endpoints autenticados: lee el token del
+    encabezado `Authorization: Bearer ...` y devuelve la Sesion
+    (idusuario, rol) sin consultar Usuarios.
+    """
+    if credenciales is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Falta el token de sesión",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return leer_token(credenciales.credentials, get_revocaciones())
+    except TokenInvalido as e:
+        raise HTTPException(
+            status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"}
+        )
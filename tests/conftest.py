@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Las pruebas usan una base y un directorio de archivos temporales, nunca
+# colegio.db ni pdf/. Los módulos leen la configuración al importarse, así
+# que se define antes de importar cualquiera de ellos.
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+DIRECTORIO_PRUEBAS = Path(tempfile.mkdtemp(prefix="colegio-pruebas-"))
+os.environ["COLEGIO_DB"] = str(DIRECTORIO_PRUEBAS / "colegio.db")
+os.environ["COLEGIO_DIRECTORIO_PDF"] = str(DIRECTORIO_PRUEBAS / "pdf")
+os.environ["COLEGIO_COMPACTACION_SEG"] = "0"
+os.environ["COLEGIO_EXTRACCION_SEG"] = "0"
+os.environ.pop("COLEGIO_CACHE_URL", None)
+
+
+@pytest.fixture
+def cliente():
+    from fastapi.testclient import TestClient
+
+    import app
+
+    with TestClient(app.app) as cliente:
+        yield cliente
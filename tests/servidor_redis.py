@@ -0,0 +1,234 @@
+import socket
+import socketserver
+import threading
+import time
+
+
+class ServidorRedis:
+    """
+    Servidor RESP2 en memoria para las pruebas de cliente_redis y de
+    CacheRedis: implementa solo los comandos que usa la caché (GET, SET con
+    PX, SADD, SMEMBERS, PEXPIRE, DEL, INCR, WATCH/MULTI/EXEC, PUBLISH,
+    SUBSCRIBE, AUTH, SELECT, PING). Cada conexión se atiende en su propio
+    hilo. `cortar_conexiones()` cierra las conexiones abiertas, como un
+    reinicio de Redis, para probar la reconexión.
+    """
+
+    def __init__(self, clave=None):
+        self.clave = clave
+        self._lock = threading.Lock()
+        # las publicaciones escriben en conexiones de otros hilos
+        self._escritura = threading.Lock()
+        self._datos = {}
+        self._vencimientos = {}
+        # versión de cada clave, para WATCH
+        self._versiones = {}
+        # canal -> conexiones suscritas
+        self._suscriptores = {}
+        self._conexiones = set()
+        servidor = self
+
+        class Manejador(socketserver.StreamRequestHandler):
+            def handle(self):
+                servidor._atender(self)
+
+        self._tcp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Manejador)
+        self._tcp.daemon_threads = True
+        self._hilo = threading.Thread(target=self._tcp.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        puerto = self._tcp.server_address[1]
+        if self.clave:
+            return f"redis://:{self.clave}@127.0.0.1:{puerto}/0"
+        return f"redis://127.0.0.1:{puerto}/0"
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def cortar_conexiones(self):
+        with self._lock:
+            conexiones = list(self._conexiones)
+            self._suscriptores.clear()
+        for conexion in conexiones:
+            # close() solo no alcanza: rfile y wfile mantienen el socket abierto
+            try:
+                conexion.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conexion.request.close()
+
+    def cerrar(self):
+        self._tcp.shutdown()
+        self.cortar_conexiones()
+        self._tcp.server_close()
+
+    # protocolo
+
+    @staticmethod
+    def _codificar(valor):
+        if valor is None:
+            return b"$-1\r\n"
+        if isinstance(valor, Exception):
+            return b"-ERR " + str(valor).encode("utf-8") + b"\r\n"
+        if isinstance(valor, int):
+            return b":%d\r\n" % valor
+        if isinstance(valor, str):
+            return b"+" + valor.encode("utf-8") + b"\r\n"
+        if isinstance(valor, (list, set)):
+            return b"*%d\r\n" % len(valor) + b"".join(
+                ServidorRedis._codificar(elemento) for elemento in valor
+            )
+        return b"$%d\r\n%s\r\n" % (len(valor), valor)
+
+    @staticmethod
+    def _leer_comando(lector):
+        linea = lector.readline()
+        if not linea:
+            return None
+        argumentos = []
+        for _ in range(int(linea[1:])):
+            largo = int(lector.readline()[1:])
+            argumentos.append(lector.read(largo + 2)[:-2])
+        return argumentos
+
+    def _atender(self, conexion):
+        with self._lock:
+            self._conexiones.add(conexion)
+        vigiladas = {}
+        transaccion = None
+        autenticado = self.clave is None
+        try:
+            while True:
+                try:
+                    argumentos = self._leer_comando(conexion.rfile)
+                except (OSError, ValueError):
+                    return
+                if argumentos is None:
+                    return
+                nombre = argumentos[0].upper()
+                if nombre == b"AUTH":
+                    autenticado = argumentos[-1].decode("utf-8") == self.clave
+                    respuesta = "OK" if autenticado else ValueError("invalid password")
+                elif not autenticado:
+                    respuesta = ValueError("NOAUTH Authentication required")
+                elif nombre == b"WATCH":
+                    with self._lock:
+                        vigiladas = {
+                            clave: self._versiones.get(clave, 0)
+                            for clave in argumentos[1:]
+                        }
+                    respuesta = "OK"
+                elif nombre == b"UNWATCH":
+                    vigiladas = {}
+                    respuesta = "OK"
+                elif nombre == b"MULTI":
+                    transaccion = []
+                    respuesta = "OK"
+                elif nombre == b"EXEC":
+                    with self._lock:
+                        if any(
+                            self._versiones.get(clave, 0) != version
+                            for clave, version in vigiladas.items()
+                        ):
+                            respuesta = None
+                        else:
+                            respuesta = [
+                                self._ejecutar(comando) for comando in transaccion
+                            ]
+                    transaccion = None
+                    vigiladas = {}
+                elif transaccion is not None:
+                    transaccion.append(argumentos)
+                    respuesta = "QUEUED"
+                elif nombre == b"SUBSCRIBE":
+                    with self._lock:
+                        for canal in argumentos[1:]:
+                            self._suscriptores.setdefault(canal, []).append(conexion)
+                    for numero, canal in enumerate(argumentos[1:], 1):
+                        self._escribir(conexion, [b"subscribe", canal, numero])
+                    continue
+                elif nombre == b"PUBLISH":
+                    with self._lock:
+                        destinos = list(self._suscriptores.get(argumentos[1], ()))
+                    for destino in destinos:
+                        self._escribir(
+                            destino, [b"message", argumentos[1], argumentos[2]]
+                        )
+                    respuesta = len(destinos)
+                else:
+                    with self._lock:
+                        respuesta = self._ejecutar(argumentos)
+                self._escribir(conexion, respuesta)
+        finally:
+            with self._lock:
+                self._conexiones.discard(conexion)
+                for suscriptores in self._suscriptores.values():
+                    if conexion in suscriptores:
+                        suscriptores.remove(conexion)
+
+    def _escribir(self, conexion, valor):
+        try:
+            with self._escritura:
+                conexion.wfile.write(self._codificar(valor))
+                conexion.wfile.flush()
+        except OSError:
+            pass
+
+    # comandos (con self._lock tomado)
+
+    def _vigente(self, clave):
+        vence = self._vencimientos.get(clave)
+        if vence is not None and vence <= time.monotonic():
+            self._datos.pop(clave, None)
+            self._vencimientos.pop(clave, None)
+        return clave in self._datos
+
+    def _modificar(self, clave):
+        self._versiones[clave] = self._versiones.get(clave, 0) + 1
+
+    def _ejecutar(self, argumentos):
+        nombre, claves = argumentos[0].upper(), argumentos[1:]
+        if nombre in (b"PING", b"SELECT"):
+            return "PONG" if nombre == b"PING" else "OK"
+        if nombre == b"GET":
+            return self._datos[claves[0]] if self._vigente(claves[0]) else None
+        if nombre == b"SET":
+            clave = claves[0]
+            self._datos[clave] = claves[1]
+            self._vencimientos.pop(clave, None)
+            if len(claves) >= 4 and claves[2].upper() == b"PX":
+                self._vencimientos[clave] = time.monotonic() + int(claves[3]) / 1000
+            self._modificar(clave)
+            return "OK"
+        if nombre == b"SADD":
+            if not self._vigente(claves[0]):
+                self._datos[claves[0]] = set()
+            conjunto = self._datos[claves[0]]
+            nuevos = len(set(claves[1:]) - conjunto)
+            conjunto.update(claves[1:])
+            self._modificar(claves[0])
+            return nuevos
+        if nombre == b"SMEMBERS":
+            return self._datos[claves[0]] if self._vigente(claves[0]) else []
+        if nombre == b"PEXPIRE":
+            if not self._vigente(claves[0]):
+                return 0
+            self._vencimientos[claves[0]] = time.monotonic() + int(claves[1]) / 1000
+            return 1
+        if nombre == b"DEL":
+            borradas = 0
+            for clave in claves:
+                if self._vigente(clave):
+                    borradas += 1
+                    del self._datos[clave]
+                    self._vencimientos.pop(clave, None)
+                self._modificar(clave)
+            return borradas
+        if nombre == b"INCR":
+            valor = int(self._datos[claves[0]]) + 1 if self._vigente(claves[0]) else 1
+            self._datos[claves[0]] = str(valor).encode("ascii")
+            self._modificar(claves[0])
+            return valor
+        return ValueError(f"unknown command '{nombre.decode('utf-8')}'")
@@ -0,0 +1,122 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from archivos import DIRECTORIO_PDF, guardar_blob, ruta_blob
+from conexion import abrir_lectura
+from escritor import get_escritor
+
+
+def _temporal(datos):
+    ruta = Path(DIRECTORIO_PDF) / f".subida-{hashlib.md5(datos).hexdigest()}.tmp"
+    ruta.write_bytes(datos)
+    return ruta, hashlib.sha256(datos).hexdigest()
+
+
+def _referencias(huella):
+    conn = abrir_lectura()
+    try:
+        fila = conn.execute(
+            "SELECT referencias FROM Archivos WHERE hash = ?", (huella,)
+        ).fetchone()
+        return fila and fila[0]
+    finally:
+        conn.close()
+
+
+def test_blob_se_mueve_tras_el_commit(cliente):
+    ruta, huella = _temporal(b"contenido confirmado")
+    get_escritor().ejecutar(guardar_blob, ruta, huella, 20)
+    assert ruta_blob(huella).read_bytes() == b"contenido confirmado"
+    assert not ruta.exists()
+    assert _referencias(huella) == 1
+
+
+def test_blob_no_queda_si_se_revierte(cliente):
+    ruta, huella = _temporal(b"contenido revertido")
+
+    def _fallar(conn):
+        guardar_blob(conn, ruta, huella, 19)
+        raise RuntimeError("falla después de guardar el blob")
+
+    with pytest.raises(RuntimeError):
+        get_escritor().ejecutar(_fallar)
+    assert not ruta_blob(huella).exists()
+    assert _referencias(huella) is None
+    # el temporal sigue ahí para que lo borre quien lo subió
+    assert ruta.exists()
+    ruta.unlink()
+
+
+def _entrega_antigua(nombre):
+    def _insertar(conn):
+        cursor = conn.execute(
+            "INSERT INTO Entregas (fecha_entrega, nombre_archivo, tipo_archivo, idtarea, idestudiante) VALUES ('2024-01-01', ?, 'application/pdf', 1, 1)",
+            (nombre,),
+        )
+        return cursor.lastrowid
+
+    return get_escritor().ejecutar(_insertar)
+
+
+def test_etag_de_archivo_antiguo_sale_del_contenido(cliente):
+    ruta = Path(DIRECTORIO_PDF) / "antigua-etag.pdf"
+    ruta.write_bytes(b"%PDF-1.4 version uno")
+    identrega = _entrega_antigua(ruta.name)
+
+    respuesta = cliente.get(f"/entregas/ver/{identrega}")
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["etag"]
+    assert etag == f'"{hashlib.sha256(b"%PDF-1.4 version uno").hexdigest()}"'
+    assert (
+        cliente.get(
+            f"/entregas/ver/{identrega}", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
+
+    # mismo tamaño y misma fecha de modificación, otro contenido
+    estado = os.stat(ruta)
+    ruta.write_bytes(b"%PDF-1.4 version dos")
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+
+    respuesta = cliente.get(
+        f"/entregas/ver/{identrega}", headers={"If-None-Match": etag}
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.content == b"%PDF-1.4 version dos"
+    assert respuesta.headers["etag"] != etag
+
+
+def test_archivo_antiguo_compartido_no_se_borra(cliente):
+    ruta = Path(DIRECTORIO_PDF) / "antigua-compartida.pdf"
+    ruta.write_bytes(b"%PDF-1.4 compartida")
+    primera = _entrega_antigua(ruta.name)
+    segunda = _entrega_antigua(ruta.name)
+
+    assert cliente.delete(f"/entregas/{primera}").status_code == 200
+    assert ruta.exists()
+
+    cliente.put(
+        f"/entregas/{segunda}",
+        files={"archivo": ("nueva.pdf", b"%PDF-1.4 reemplazo", "application/pdf")},
+    )
+    assert not ruta.exists()
+
+
+def test_error_al_mover_el_blob_revierte_el_trabajo(cliente):
+    ruta, huella = _temporal(b"contenido sin lugar en el almacen")
+    # un archivo donde debería ir el directorio del blob hace fallar el mkdir
+    bloqueo = ruta_blob(huella).parent
+    bloqueo.parent.mkdir(parents=True, exist_ok=True)
+    bloqueo.write_bytes(b"")
+    try:
+        with pytest.raises(OSError):
+            get_escritor().ejecutar(guardar_blob, ruta, huella, 33)
+        assert _referencias(huella) is None
+        assert ruta.exists()
+    finally:
+        bloqueo.unlink()
+        ruta.unlink()
@@ -0,0 +1,148 @@
+from escritor import get_escritor
+
+
+def _estudiantes(idclase, cantidad):
+    def _crear(conn):
+        return [
+            conn.execute(
+                "INSERT INTO Estudiantes (nombre, dni, idclase) VALUES (?, ?, ?)",
+                (f"Estudiante {i}", str(i), idclase),
+            ).lastrowid
+            for i in range(cantidad)
+        ]
+
+    return get_escritor().ejecutar(_crear)
+
+
+def _buscar(cliente, q, **filtros):
+    respuesta = cliente.get("/tareas/buscar", params={"q": q, **filtros})
+    assert respuesta.status_code == 200
+    return respuesta.json()["datos"]
+
+
+def test_tarea_comun_con_texto_propio_se_encuentra(cliente):
+    idclase = 7301
+    _estudiantes(idclase, 3)
+    idplantilla = cliente.post(
+        "/tareas/comun",
+        json={
+            "nombre_tarea": "Guia de fotosintesis",
+            "instrucciones": "Responder el cuestionario de clorofila",
+            "fecha_vencimiento": "2030-05-01",
+            "idclase": idclase,
+            "estado": "pendiente",
+        },
+    ).json()["idplantilla"]
+    tareas = cliente.get("/tareas", params={"idplantilla": idplantilla}).json()
+    propia = tareas["datos"][0]
+
+    # la plantilla aparece una sola vez
+    resultados = _buscar(cliente, "fotosintesis", idclase=idclase)
+    assert [(r["tipo"], r["idplantilla"]) for r in resultados] == [
+        ("comun", idplantilla)
+    ]
+
+    cliente.put(
+        f"/tareas/{propia['idtarea']}",
+        json={
+            "nombre_tarea": "Guia de respiracion celular",
+            "instrucciones": "Responder el cuestionario de mitocondrias",
+            "fecha_vencimiento": "2030-05-08",
+            "idclase": idclase,
+            "idestudiante": propia["idestudiante"],
+            "estado": "pendiente",
+        },
+    )
+    resultados = _buscar(cliente, "mitocondrias", idclase=idclase)
+    assert [(r["tipo"], r["idtarea"]) for r in resultados] == [
+        ("tarea", propia["idtarea"])
+    ]
+    assert resultados[0]["nombre_tarea"] == "Guia de respiracion celular"
+    assert resultados[0]["fecha_vencimiento"] == "2030-05-08"
+
+    # solo el nombre propio: las instrucciones se siguen leyendo de la plantilla
+    get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "UPDATE Tareas SET instrucciones = NULL WHERE idtarea = ?",
+            (propia["idtarea"],),
+        )
+    )
+    get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "UPDATE PlantillasTarea SET instrucciones = 'Dibujar estomas' WHERE idplantilla = ?",
+            (idplantilla,),
+        )
+    )
+    resultados = _buscar(cliente, "respiracion estomas", idclase=idclase)
+    assert [r["idtarea"] for r in resultados] == [propia["idtarea"]]
+    assert _buscar(cliente, "mitocondrias", idclase=idclase) == []
+
+
+def _tareas(idclase, *textos):
+    def _crear(conn):
+        return [
+            conn.execute(
+                "INSERT INTO Tareas (nombre_tarea, instrucciones, fecha_vencimiento, idclase, idestudiante, estado) VALUES (?, ?, '2030-06-01', ?, 1, 'pendiente')",
+                (nombre, instrucciones, idclase),
+            ).lastrowid
+            for nombre, instrucciones in textos
+        ]
+
+    return get_escritor().ejecutar(_crear)
+
+
+def test_prefijos_tildes_y_relevancia(cliente):
+    idclase = 7302
+    en_instrucciones, en_nombre = _tareas(
+        idclase,
+        ("Lectura", "Leer el capítulo de Geografía"),
+        ("Mapa de geografía", "Pintar los ríos"),
+    )
+    # sin distinguir tildes ni mayúsculas, y cada palabra como prefijo
+    resultados = _buscar(cliente, "GEOGRAF", idclase=idclase)
+    # el nombre pesa más que las instrucciones
+    assert [r["idtarea"] for r in resultados] == [en_nombre, en_instrucciones]
+    assert resultados[0]["tipo"] == "tarea"
+    assert "<b>" in resultados[0]["fragmento"]
+    # todas las palabras son obligatorias; la sintaxis de FTS5 es texto
+    assert [r["idtarea"] for r in _buscar(cliente, "rios geo", idclase=idclase)] == [
+        en_nombre
+    ]
+    assert _buscar(cliente, 'geografia OR "lectura', idclase=idclase) == []
+
+
+def test_paginas_y_filtros(cliente):
+    idclase = 7303
+    idprofesor = 7303
+    otra = get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES ('Busqueda', ?)",
+            (idprofesor,),
+        ).lastrowid
+    )
+    ids = _tareas(idclase, *[(f"Volcanes {i}", "Maqueta") for i in range(3)])
+    (propia,) = _tareas(otra, ("Volcanes activos", "Maqueta"))
+
+    pagina = cliente.get(
+        "/tareas/buscar", params={"q": "volcanes", "idclase": idclase, "limite": 2}
+    ).json()
+    assert pagina["next_cursor"] == 2
+    resto = cliente.get(
+        "/tareas/buscar",
+        params={"q": "volcanes", "idclase": idclase, "limite": 2, "cursor": 2},
+    ).json()
+    assert resto["next_cursor"] is None
+    assert sorted(r["idtarea"] for r in pagina["datos"] + resto["datos"]) == ids
+
+    assert [
+        r["idtarea"] for r in _buscar(cliente, "volcanes", idprofesor=idprofesor)
+    ] == [propia]
+
+
+def test_consultas_no_validas(cliente):
+    for parametros in (
+        {"q": "  -- "},
+        {"q": "x", "limite": 0},
+        {"q": "x", "cursor": -1},
+    ):
+        assert cliente.get("/tareas/buscar", params=parametros).status_code == 400
@@ -0,0 +1,78 @@
+import time
+
+from cache import CacheMemoria
+from escritor import get_escritor
+
+
+def test_invalidar_por_etiqueta():
+    cache = CacheMemoria(ttl=60, maximo=10)
+    cache.guardar("a", 1, ["clase:1", "profesor:2"])
+    cache.guardar("b", 2, ["clase:3"])
+    cache.invalidar(["profesor:2"])
+    assert cache.obtener("a") == (False, None)
+    assert cache.obtener("b") == (True, 2)
+    assert cache.metricas()["invalidadas"] == 1
+
+
+def test_lectura_anterior_a_una_invalidacion_no_se_guarda():
+    cache = CacheMemoria(ttl=60, maximo=10)
+    generacion = cache.generacion
+    # una escritura confirma mientras la lectura consultaba la base
+    cache.invalidar(["clase:1"])
+    assert cache.guardar("a", "viejo", ["clase:1"], generacion) is False
+    assert cache.obtener("a") == (False, None)
+    assert cache.guardar("a", "nuevo", ["clase:1"], cache.generacion) is True
+
+
+def test_vencimiento_y_expulsion_lru():
+    cache = CacheMemoria(ttl=0.05, maximo=2)
+    cache.guardar("a", 1, [])
+    cache.guardar("b", 2, [])
+    cache.obtener("a")
+    cache.guardar("c", 3, [])
+    # "b" era la menos usada
+    assert cache.obtener("b") == (False, None)
+    assert cache.obtener("a") == (True, 1)
+    time.sleep(0.06)
+    assert cache.obtener("c") == (False, None)
+    metricas = cache.metricas()
+    assert metricas["expulsadas"] == 1 and metricas["vencidas"] == 1
+
+
+def _tarea(cliente, idclase, idestudiante, nombre):
+    return cliente.post(
+        "/tareas",
+        json={
+            "nombre_tarea": nombre,
+            "instrucciones": "-",
+            "fecha_vencimiento": "2030-01-01",
+            "idclase": idclase,
+            "idestudiante": idestudiante,
+            "estado": "pendiente",
+        },
+    )
+
+
+def test_escritura_invalida_los_listados_afectados(cliente):
+    idprofesor = 8501
+    idclase = get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES ('Cache', ?)",
+            (idprofesor,),
+        ).lastrowid
+    )
+    _tarea(cliente, idclase, 8502, "Primera")
+    rutas = [
+        f"/tareas_clase/{idclase}",
+        f"/tareas_profesor/{idprofesor}",
+        "/tareas_estudiante/8502",
+    ]
+    for ruta in rutas:
+        assert [t["nombre_tarea"] for t in cliente.get(ruta).json()] == ["Primera"]
+
+    _tarea(cliente, idclase, 8502, "Segunda")
+    for ruta in rutas:
+        assert [t["nombre_tarea"] for t in cliente.get(ruta).json()] == [
+            "Primera",
+            "Segunda",
+        ]
@@ -0,0 +1,105 @@
+from conexion import abrir_lectura
+from escritor import get_escritor
+
+
+def _seq_actual():
+    conn = abrir_lectura()
+    try:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM Cambios").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _feed(cliente, since, **parametros):
+    respuesta = cliente.get("/cambios", params={"since": since, **parametros})
+    assert respuesta.status_code == 200
+    return respuesta.json()
+
+
+def test_un_cambio_por_registro_con_lapidas(cliente):
+    since = _seq_actual()
+
+    def _escribir(conn):
+        queda = conn.execute(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES ('Feed', 1)"
+        ).lastrowid
+        borrada = conn.execute(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES ('Borrar', 1)"
+        ).lastrowid
+        conn.execute("UPDATE Clases SET nombre = 'Feed 2' WHERE idclase = ?", (queda,))
+        conn.execute("DELETE FROM Clases WHERE idclase = ?", (borrada,))
+        return queda, borrada
+
+    queda, borrada = get_escritor().ejecutar(_escribir)
+    feed = _feed(cliente, since, tablas="clases")
+    assert [(c["id"], c["operacion"], c["datos"]) for c in feed["datos"]] == [
+        (queda, "upsert", {"idclase": queda, "nombre": "Feed 2", "idprofesor": 1}),
+        (borrada, "delete", None),
+    ]
+    assert feed["hay_mas"] is False
+    assert feed["next_since"] == feed["datos"][-1]["seq"]
+    # sin cambios nuevos, el mismo since
+    assert _feed(cliente, feed["next_since"]) == {
+        "datos": [],
+        "next_since": feed["next_since"],
+        "hay_mas": False,
+    }
+
+
+def test_paginas_y_upsert_de_estado(cliente):
+    since = _seq_actual()
+    idtarea = get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Tareas (nombre_tarea, idclase, idestudiante) VALUES ('Feed', 1, 1)"
+        ).lastrowid
+    )
+    # el cambio de estado actualiza EstadoActualTarea con un upsert
+    for estado in ("entregado", "calificado"):
+        respuesta = cliente.post(
+            "/cambios_estado",
+            json={
+                "idtarea": idtarea,
+                "nuevo_estado": estado,
+                "fecha_cambio": "2024-01-01",
+            },
+        )
+        assert respuesta.json() == {"mensaje": "Cambio de estado creado exitosamente"}
+
+    vistos = []
+    while True:
+        feed = _feed(cliente, since, limit=1)
+        vistos += [(c["tabla"], c["id"]) for c in feed["datos"]]
+        since = feed["next_since"]
+        if not feed["hay_mas"]:
+            break
+    assert ("tareas", idtarea) in vistos
+    assert vistos.count(("estados_tareas", idtarea)) == 1
+    assert len([v for v in vistos if v[0] == "cambios_estado"]) == 2
+
+
+def test_plantilla_marca_sus_tareas(cliente):
+    def _crear(conn):
+        idplantilla = conn.execute(
+            "INSERT INTO PlantillasTarea (nombre_tarea, idclase) VALUES ('Comun', 8801)"
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO Tareas (idclase, idestudiante, idplantilla) VALUES (8801, ?, ?)",
+            [(1, idplantilla), (2, idplantilla)],
+        )
+        return idplantilla
+
+    idplantilla = get_escritor().ejecutar(_crear)
+    since = _seq_actual()
+    get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "UPDATE PlantillasTarea SET nombre_tarea = 'Comun 2' WHERE idplantilla = ?",
+            (idplantilla,),
+        )
+    )
+    feed = _feed(cliente, since, tablas="tareas")
+    assert [c["datos"]["nombre_tarea"] for c in feed["datos"]] == ["Comun 2", "Comun 2"]
+
+
+def test_parametros_invalidos(cliente):
+    assert cliente.get("/cambios", params={"tablas": "Archivos"}).status_code == 400
+    assert cliente.get("/cambios", params={"limit": 0}).status_code == 400
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import CacheRedis, dejar_de_recibir, recibir_difusiones
+from cliente_redis import ConexionRedis, ErrorRedis, parsear_url
+from servidor_redis import ServidorRedis
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorRedis().iniciar()
+    yield servidor
+    servidor.cerrar()
+
+
+@pytest.fixture
+def caches(servidor):
+    abiertas = []
+
+    def abrir():
+        cache_redis = CacheRedis(servidor.url, ttl=30, prefijo="prueba:")
+        abiertas.append(cache_redis)
+        _esperar(cache_redis._suscrito.is_set)
+        return cache_redis
+
+    yield abrir
+    for cache_redis in abiertas:
+        cache_redis.cerrar()
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        assert time.monotonic() < limite, "la condición no se cumplió a tiempo"
+        time.sleep(0.01)
+
+
+def test_parsear_url():
+    assert parsear_url("redis://:cl%40ve@cache:6380/2") == ("cache", 6380, 2, "cl@ve")
+    assert parsear_url("redis://localhost") == ("localhost", 6379, 0, None)
+    with pytest.raises(ValueError):
+        parsear_url("http://localhost")
+
+
+def test_get_set_y_errores(servidor):
+    conexion = ConexionRedis(servidor.url)
+    try:
+        assert conexion.comando("GET", "no-existe") is None
+        assert conexion.comando("SET", "clave", "válido", "PX", 60000) == "OK"
+        assert conexion.comando("GET", "clave") == "válido".encode("utf-8")
+        assert conexion.comando("INCR", "contador") == 1
+        with pytest.raises(ErrorRedis):
+            conexion.comando("NOEXISTE")
+        # pipeline con transacción: los errores no cortan la lectura
+        respuestas = conexion.canalizar(
+            [("MULTI",), ("SADD", "s", "a", "b"), ("SMEMBERS", "s"), ("EXEC",)]
+        )
+        assert respuestas[:3] == ["OK", "QUEUED", "QUEUED"]
+        assert respuestas[3][0] == 2 and sorted(respuestas[3][1]) == [b"a", b"b"]
+    finally:
+        conexion.cerrar()
+
+
+def test_watch_aborta_exec(servidor):
+    primera = ConexionRedis(servidor.url)
+    segunda = ConexionRedis(servidor.url)
+    try:
+        primera.comando("WATCH", "generacion")
+        segunda.comando("INCR", "generacion")
+        respuestas = primera.canalizar([("MULTI",), ("SET", "x", "1"), ("EXEC",)])
+        assert respuestas[-1] is None
+        assert primera.comando("GET", "x") is None
+    finally:
+        primera.cerrar()
+        segunda.cerrar()
+
+
+def test_auth():
+    servidor = ServidorRedis(clave="secreta").iniciar()
+    try:
+        conexion = ConexionRedis(servidor.url)
+        assert conexion.comando("SET", "a", "1") == "OK"
+        conexion.cerrar()
+        with pytest.raises(ErrorRedis):
+            ConexionRedis(servidor.url.replace("secreta", "otra"))
+    finally:
+        servidor.cerrar()
+
+
+def test_publish_subscribe(servidor):
+    suscripcion = ConexionRedis(servidor.url)
+    publicador = ConexionRedis(servidor.url)
+    try:
+        suscripcion.enviar("SUBSCRIBE", "canal")
+        assert suscripcion.leer() == [b"subscribe", b"canal", 1]
+        assert publicador.comando("PUBLISH", "canal", "hola") == 1
+        assert suscripcion.leer() == [b"message", b"canal", b"hola"]
+    finally:
+        suscripcion.cerrar()
+        publicador.cerrar()
+
+
+def test_invalidacion_entre_workers(caches):
+    primera, segunda = caches(), caches()
+    generacion = segunda.generacion
+    assert segunda.guardar(("tareas", 1), [1, 2], ["estudiante:1"], generacion)
+    # la otra copia la lee de Redis y la guarda en su copia local
+    assert primera.obtener(("tareas", 1)) == (True, [1, 2])
+    assert primera.local.obtener(("tareas", 1)) == (True, [1, 2])
+
+    segunda.invalidar(["estudiante:1"])
+    _esperar(lambda: primera.metricas()["redis"]["mensajes"] >= 1)
+    assert primera.local.obtener(("tareas", 1)) == (False, None)
+    assert primera.obtener(("tareas", 1)) == (False, None)
+
+    # una lectura que empezó antes de la invalidación no guarda su resultado
+    vieja = primera.generacion
+    segunda.invalidar(["estudiante:1"])
+    assert not primera.guardar(("tareas", 1), [1], ["estudiante:1"], vieja)
+
+
+def test_difundir_entre_workers(caches):
+    primera, segunda = caches(), caches()
+    recibidos = []
+    llegaron = threading.Event()
+
+    def receptor(mensaje):
+        recibidos.append(mensaje)
+        llegaron.set()
+
+    recibir_difusiones(receptor)
+    try:
+        primera.difundir(json.dumps({"tipo": "prueba"}))
+        assert llegaron.wait(5)
+        # cada worker suscrito entrega el mensaje a sus receptores
+        _esperar(lambda: len(recibidos) == 2)
+        assert json.loads(recibidos[0]) == {"tipo": "prueba"}
+    finally:
+        dejar_de_recibir(receptor)
+
+
+def test_reconexion(servidor, caches, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ESPERA_REINTENTO", 0.2)
+    primera, segunda = caches(), caches()
+    assert primera.guardar(("a",), 1, ["clase:1"], primera.generacion)
+
+    servidor.cortar_conexiones()
+    # la conexión del pool estaba cortada: la lectura de una clave que no
+    # está en la copia local falla sin lanzar y va directo a la base
+    assert primera.obtener(("b",)) == (False, None)
+    assert primera.metricas()["redis"]["errores"] == 1
+
+    # el oyente se vuelve a suscribir y la caché vuelve a usar Redis
+    _esperar(lambda: primera._suscrito.is_set() and segunda._suscrito.is_set())
+    time.sleep(0.25)
+    assert primera.guardar(("a",), 2, ["clase:1"], primera.generacion)
+    assert segunda.obtener(("a",)) == (True, 2)
+    segunda.local.guardar(("a",), 2, ["clase:1"])
+    primera.invalidar(["clase:1"])
+    _esperar(lambda: segunda.local.obtener(("a",)) == (False, None))
+
+
+def test_sin_redis_no_falla():
+    cache_redis = CacheRedis("redis://127.0.0.1:1/0", prefijo="prueba:")
+    try:
+        assert cache_redis.obtener(("a",)) == (False, None)
+        assert not cache_redis.guardar(("a",), 1, [], cache_redis.generacion)
+        cache_redis.invalidar(["clase:1"])
+        assert cache_redis.metricas()["redis"]["suscrito"] is False
+    finally:
+        cache_redis.cerrar()
@@ -0,0 +1,44 @@
+import sqlite3
+
+import compactacion
+from conftest import DIRECTORIO_PRUEBAS
+from migraciones import convertir_auto_vacuum, migrar
+
+
+def _auto_vacuum(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_base_nueva_en_auto_vacuum_incremental():
+    ruta = str(DIRECTORIO_PRUEBAS / "nueva.db")
+    migrar(ruta)
+    assert _auto_vacuum(ruta) == 2
+    assert convertir_auto_vacuum(ruta) is False
+
+
+def test_convertir_base_existente():
+    ruta = str(DIRECTORIO_PRUEBAS / "anterior.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE Previa (id INTEGER PRIMARY KEY)")
+    conn.close()
+    migrar(ruta)
+    assert _auto_vacuum(ruta) == 0
+
+    # la compactación no la convierte: eso bloquearía las escrituras
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    assert compactacion._vacuum_incremental(conn, 100) == 0
+    conn.close()
+    assert _auto_vacuum(ruta) == 0
+
+    assert convertir_auto_vacuum(ruta) is True
+    assert _auto_vacuum(ruta) == 2
+
+
+def test_sin_archivado_por_defecto(cliente):
+    assert compactacion.ARCHIVAR_ENTREGAS_DIAS == 0
+    resultado = cliente.post("/compactacion").json()
+    assert resultado["archivos_archivados"] == 0
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from conexion import DATABASE_NAME, PoolAgotado, PoolAsync
+
+
+def test_cancelar_despues_de_recibir_la_conexion():
+    async def prueba():
+        pool = PoolAsync(DATABASE_NAME, size=1, timeout=5)
+        try:
+            conexion = await pool.acquire()
+            esperando = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            # release() le entrega la conexión y la tarea se cancela antes
+            # de retomarla. Según la versión de Python, wait_for devuelve la
+            # conexión o propaga la cancelación; en ningún caso se pierde
+            pool.release(conexion)
+            esperando.cancel()
+            try:
+                pool.release(await esperando)
+            except asyncio.CancelledError:
+                pass
+            assert pool.metricas()["libres"] == 1
+            assert pool.metricas()["en_uso"] == 0
+            assert await pool.acquire(timeout=0.1) is conexion
+        finally:
+            pool.close()
+
+    asyncio.run(prueba())
+
+
+def test_timeout_sin_conexiones_libres():
+    async def prueba():
+        pool = PoolAsync(DATABASE_NAME, size=1, timeout=5)
+        try:
+            conexion = await pool.acquire()
+            with pytest.raises(PoolAgotado):
+                await pool.acquire(timeout=0.05)
+            pool.release(conexion)
+            metricas = pool.metricas()
+            assert metricas["timeouts"] == 1
+            assert metricas["libres"] == 1 and metricas["esperando"] == 0
+        finally:
+            pool.close()
+
+    asyncio.run(prueba())
+
+
+def test_conexion_rota_se_reemplaza():
+    async def prueba():
+        pool = PoolAsync(DATABASE_NAME, size=1, timeout=5)
+        try:
+            conexion = await pool.acquire()
+            # el trabajo deja la conexión inservible: el siguiente recibe otra
+            await conexion.run(lambda conn: conn.close())
+            assert tuple(await conexion.fetchone("SELECT 1")) == (1,)
+            pool.release(conexion)
+            assert pool.metricas()["descartadas"] == 1
+        finally:
+            pool.close()
+
+    asyncio.run(prueba())
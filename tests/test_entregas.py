@@ -0,0 +1,48 @@
+from cache import get_cache
+from escritor import get_escritor
+
+
+def test_put_de_entrega_inexistente_responde_404(cliente):
+    respuesta = cliente.put(
+        "/entregas/987654",
+        files={"archivo": ("nueva.pdf", b"%PDF-1.4 nueva", "application/pdf")},
+    )
+    assert respuesta.status_code == 404
+    assert respuesta.json() == {"detail": "Entrega no encontrada"}
+
+
+def _tarea(idestudiante):
+    return get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Tareas (nombre_tarea, idclase, idestudiante, estado) VALUES ('Cache', 77, ?, 'pendiente')",
+            (idestudiante,),
+        ).lastrowid
+    )
+
+
+def _en_cache(idestudiante):
+    vigente, _ = get_cache().obtener(("tareas_estudiante", idestudiante))
+    return vigente
+
+
+def test_put_y_delete_de_entrega_invalidan_los_listados(cliente):
+    idestudiante = 4321
+    idtarea = _tarea(idestudiante)
+    archivo = {"archivo": ("tarea.pdf", b"%PDF-1.4 cache", "application/pdf")}
+    cliente.post(
+        f"/entregas?idtarea={idtarea}&idestudiante={idestudiante}", files=archivo
+    )
+    identrega = cliente.get(f"/entregas?idtarea={idtarea}").json()["datos"][0][
+        "identrega"
+    ]
+
+    cliente.get(f"/tareas_estudiante/{idestudiante}")
+    assert _en_cache(idestudiante)
+    archivo = {"archivo": ("tarea.pdf", b"%PDF-1.4 cache v2", "application/pdf")}
+    assert cliente.put(f"/entregas/{identrega}", files=archivo).status_code == 200
+    assert not _en_cache(idestudiante)
+
+    cliente.get(f"/tareas_estudiante/{idestudiante}")
+    assert _en_cache(idestudiante)
+    assert cliente.delete(f"/entregas/{identrega}").status_code == 200
+    assert not _en_cache(idestudiante)
@@ -0,0 +1,48 @@
+import pytest
+
+from escritor import EscritorSQLite
+
+
+@pytest.fixture
+def escritor(tmp_path):
+    escritor = EscritorSQLite(str(tmp_path / "escritor.db"))
+    escritor.ejecutar_sql("CREATE TABLE t (x INTEGER)")
+    yield escritor
+    escritor.cerrar()
+
+
+def test_falla_de_accion_posterior_llega_al_trabajo(escritor):
+    def _fallar():
+        raise OSError("sin espacio")
+
+    def _trabajo(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        escritor.al_confirmar(_fallar)
+        return "ok"
+
+    futuro_fallido = escritor.enviar(_trabajo)
+    futuro_sano = escritor.enviar(lambda conn: conn.execute("INSERT INTO t VALUES (2)"))
+    with pytest.raises(OSError, match="sin espacio"):
+        futuro_fallido.result(10)
+    futuro_sano.result(10)
+    # los cambios ya estaban confirmados
+    assert (
+        escritor.ejecutar(
+            lambda conn: conn.execute("SELECT count(*) FROM t").fetchone()[0]
+        )
+        == 2
+    )
+
+
+def test_reversiones_corren_solo_si_el_trabajo_falla(escritor):
+    revertidos = []
+
+    def _trabajo(conn, nombre, fallar):
+        escritor.al_revertir(lambda: revertidos.append(nombre))
+        if fallar:
+            raise RuntimeError(nombre)
+
+    escritor.ejecutar(_trabajo, "confirmado", False)
+    with pytest.raises(RuntimeError):
+        escritor.ejecutar(_trabajo, "revertido", True)
+    assert revertidos == ["revertido"]
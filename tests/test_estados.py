@@ -0,0 +1,83 @@
+from escritor import get_escritor
+
+
+def _tarea():
+    return get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Tareas (nombre_tarea, idclase, idestudiante, estado) VALUES ('Estados', 8701, 8701, 'pendiente')"
+        ).lastrowid
+    )
+
+
+def _cambio(cliente, idtarea, estado, fecha):
+    cliente.post(
+        "/cambios_estado",
+        json={"idtarea": idtarea, "nuevo_estado": estado, "fecha_cambio": fecha},
+    )
+    historial = cliente.get(f"/tareas/{idtarea}/historial").json()
+    return max(c["idcambio"] for c in historial if c["nuevo_estado"] == estado)
+
+
+def _estado(cliente, idtarea):
+    respuesta = cliente.get(f"/tareas/{idtarea}/estado")
+    return respuesta.json()["estado"] if respuesta.status_code == 200 else None
+
+
+def test_estado_actual_sigue_al_historial(cliente):
+    idtarea = _tarea()
+    assert cliente.get(f"/tareas/{idtarea}/estado").status_code == 404
+
+    _cambio(cliente, idtarea, "entregado", "2024-03-01")
+    # un cambio con fecha anterior no reemplaza al vigente
+    anterior = _cambio(cliente, idtarea, "asignado", "2024-01-01")
+    assert _estado(cliente, idtarea) == "entregado"
+
+    ultimo = _cambio(cliente, idtarea, "calificado", "2024-03-10")
+    assert cliente.get(f"/tareas/{idtarea}/estado").json() == {
+        "idtarea": idtarea,
+        "estado": "calificado",
+        "fecha_cambio": "2024-03-10",
+        "idcambio": ultimo,
+    }
+
+    # corregir la fecha de un cambio viejo lo vuelve el vigente
+    cliente.put(
+        f"/cambios_estado/{anterior}",
+        json={
+            "idtarea": idtarea,
+            "nuevo_estado": "reabierto",
+            "fecha_cambio": "2024-04-01",
+        },
+    )
+    assert _estado(cliente, idtarea) == "reabierto"
+
+    # al borrarlo vuelve el anterior
+    cliente.delete(f"/cambios_estado/{anterior}")
+    assert _estado(cliente, idtarea) == "calificado"
+
+    historial = cliente.get(
+        f"/tareas/{idtarea}/historial",
+        params={"desde": "2024-03-01", "hasta": "2024-03-01"},
+    ).json()
+    assert [c["nuevo_estado"] for c in historial] == ["entregado"]
+
+    get_escritor().ejecutar(
+        lambda conn: conn.execute("DELETE FROM Tareas WHERE idtarea = ?", (idtarea,))
+    )
+    assert _estado(cliente, idtarea) is None
+
+
+def test_reconstruir_coincide_con_los_triggers(cliente):
+    idtarea = _tarea()
+    _cambio(cliente, idtarea, "entregado", "2024-05-01")
+    _cambio(cliente, idtarea, "calificado", "2024-05-02")
+    antes = cliente.get("/estados_tareas", params={"limite": 500}).json()["datos"]
+
+    # se rompe a mano y se repara
+    get_escritor().ejecutar(lambda conn: conn.execute("DELETE FROM EstadoActualTarea"))
+    respuesta = cliente.post("/estados_tareas/reconstruir")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["tareas"] >= 1
+    assert (
+        cliente.get("/estados_tareas", params={"limite": 500}).json()["datos"] == antes
+    )
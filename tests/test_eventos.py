@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+
+from escritor import get_escritor
+from eventos import Broker, _flujo, publicar_al_confirmar
+
+
+def _mensaje(seq, canales, tipo="tarea_creada", **datos):
+    return json.dumps({"tipo": tipo, "seq": seq, "canales": canales, "datos": datos})
+
+
+def _con_broker(prueba, **opciones):
+    async def _correr():
+        broker = Broker(**opciones)
+        try:
+            return await prueba(broker)
+        finally:
+            broker.cerrar()
+
+    return asyncio.run(_correr())
+
+
+def test_reparte_solo_a_los_canales_del_evento():
+    async def _prueba(broker):
+        estudiante = broker.suscribir("estudiante:8801")
+        otro = broker.suscribir("estudiante:8802")
+        broker.recibir(_mensaje(7, ["estudiante:8801", "profesor:8801"], idtarea=3))
+        marco = await asyncio.wait_for(estudiante.cola.get(), 5)
+        assert otro.cola.empty()
+        return marco, broker.metricas()
+
+    marco, metricas = _con_broker(_prueba)
+    # los canales no viajan al cliente
+    assert marco == 'id: 7\nevent: tarea_creada\ndata: {"seq":7,"idtarea":3}\n\n'
+    assert metricas["suscriptores"] == 2
+    assert metricas["recibidos"] == 1
+    assert metricas["entregados"] == 1
+
+
+def test_cola_llena_reinicia_el_stream():
+    async def _prueba(broker):
+        flujo = _flujo(broker, "estudiante:8803", 0, 5)
+        assert (await flujo.__anext__()).startswith("id: 0\nevent: conectado\n")
+        for seq in range(1, 5):
+            broker.recibir(_mensaje(seq, ["estudiante:8803"]))
+        marcos = [marco async for marco in flujo]
+        return marcos, broker.metricas()
+
+    marcos, metricas = _con_broker(_prueba, maximo=2)
+    # los eventos pendientes se descartan y el stream termina
+    assert marcos == ["event: reiniciar\ndata: {}\n\n"]
+    assert metricas["desbordes"] == 1
+    assert metricas["suscriptores"] == 0
+
+
+def test_latido_y_desuscripcion_al_cerrar():
+    async def _prueba(broker):
+        flujo = _flujo(broker, "profesor:8801", 12, 0.01)
+        conectado = await flujo.__anext__()
+        latido = await flujo.__anext__()
+        suscriptores = broker.metricas()["suscriptores"]
+        # como al desconectarse el cliente
+        await flujo.aclose()
+        return conectado, latido, suscriptores, broker.metricas()["suscriptores"]
+
+    conectado, latido, abiertos, cerrados = _con_broker(_prueba)
+    assert conectado == (
+        'id: 12\nevent: conectado\ndata: {"canal": "profesor:8801", "seq": 12}\n\n'
+    )
+    assert latido == ": latido\n\n"
+    assert (abiertos, cerrados) == (1, 0)
+
+
+def test_demasiados_suscriptores():
+    async def _prueba(broker):
+        assert broker.suscribir("estudiante:8804") is not None
+        assert broker.lleno
+        assert broker.suscribir("estudiante:8805") is None
+        return [marco async for marco in _flujo(broker, "estudiante:8805", 0, 5)]
+
+    assert _con_broker(_prueba, maximo_suscriptores=1) == [
+        "event: reiniciar\ndata: {}\n\n"
+    ]
+
+
+def _escribir_y_publicar(conn, falla=False):
+    idclase = conn.execute(
+        "INSERT INTO Clases (nombre, idprofesor) VALUES ('Eventos', 8806)"
+    ).lastrowid
+    idtarea = conn.execute(
+        "INSERT INTO Tareas (nombre_tarea, idclase, idestudiante) VALUES ('Eventos', ?, 8806)",
+        (idclase,),
+    ).lastrowid
+    publicar_al_confirmar(conn, "tarea_creada", [(idclase, 8806)], {"idtarea": idtarea})
+    if falla:
+        raise RuntimeError("falla a propósito")
+    return idtarea
+
+
+def test_publica_despues_del_commit(cliente):
+    async def _prueba(broker):
+        estudiante = broker.suscribir("estudiante:8806")
+        profesor = broker.suscribir("profesor:8806")
+        escritor = get_escritor()
+        with pytest.raises(RuntimeError):
+            await asyncio.to_thread(escritor.ejecutar, _escribir_y_publicar, True)
+        idtarea = await asyncio.to_thread(escritor.ejecutar, _escribir_y_publicar)
+        marcos = [
+            await asyncio.wait_for(suscriptor.cola.get(), 5)
+            for suscriptor in (estudiante, profesor)
+        ]
+        # el trabajo que falló no publicó nada
+        assert estudiante.cola.empty() and profesor.cola.empty()
+        return idtarea, marcos
+
+    idtarea, marcos = _con_broker(_prueba)
+    assert marcos[0] == marcos[1]
+    assert f'"idtarea":{idtarea}' in marcos[0]
+    seq = int(marcos[0].split("\n")[0].removeprefix("id: "))
+    # el seq es el del feed que ya incluye la tarea
+    cambios = cliente.get(
+        "/cambios", params={"since": seq - 1, "tablas": "tareas"}
+    ).json()
+    assert idtarea in [c["id"] for c in cambios["datos"]]
+
+
+def test_stream_de_desconocidos_es_404(cliente):
+    assert cliente.get("/stream/estudiante/987654").status_code == 404
+    assert cliente.get("/stream/profesor/987654").status_code == 404
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from conexion import DATABASE_NAME, PoolAsync
+from consultas import exportar_ndjson
+from escritor import get_escritor
+
+
+def _clases(idprofesor, cantidad):
+    def _crear(conn):
+        return [
+            conn.execute(
+                "INSERT INTO Clases (nombre, idprofesor) VALUES (?, ?)",
+                (f"Clase {i}", idprofesor),
+            ).lastrowid
+            for i in range(cantidad)
+        ]
+
+    return get_escritor().ejecutar(_crear)
+
+
+def test_exporta_ndjson_con_fields_y_filtros(cliente):
+    ids = _clases(8201, 3)
+    respuesta = cliente.get(
+        "/export/clases", params={"idprofesor": 8201, "fields": "nombre"}
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    filas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert filas == [
+        {"idclase": idclase, "nombre": f"Clase {i}"} for i, idclase in enumerate(ids)
+    ]
+
+
+def test_exportacion_invalida(cliente):
+    assert cliente.get("/export/Archivos").status_code == 404
+    assert cliente.get("/export/clases", params={"fields": "x"}).status_code == 400
+
+
+def test_exporta_por_bloques_y_devuelve_la_conexion(cliente):
+    ids = _clases(8202, 5)
+
+    async def prueba():
+        pool = PoolAsync(DATABASE_NAME, size=1, timeout=5)
+        try:
+            bloques = [
+                bloque
+                async for bloque in exportar_ndjson(
+                    pool, "Clases", "nombre", {"idprofesor": 8202}, lote=2
+                )
+            ]
+            assert pool.metricas()["en_uso"] == 0
+            return bloques
+        finally:
+            pool.close()
+
+    bloques = asyncio.run(prueba())
+    assert [bloque.count(b"\n") for bloque in bloques] == [2, 2, 1]
+    lineas = b"".join(bloques).decode("utf-8").splitlines()
+    assert [json.loads(linea)["idclase"] for linea in lineas] == ids
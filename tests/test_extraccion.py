@@ -0,0 +1,134 @@
+import hashlib
+import time
+from pathlib import Path
+
+import pytest
+
+import extraccion
+from archivos import DIRECTORIO_PDF, ruta_blob
+from conexion import abrir_lectura
+from escritor import get_escritor
+
+PDF = (
+    Path(__file__).resolve().parent.parent / "pdf" / "ADS tablas principales (1).pdf"
+).read_bytes()
+
+
+@pytest.fixture(autouse=True)
+def pool_de_extraccion():
+    yield
+    extraccion._terminar_pool()
+
+
+def _subir(cliente, idtarea, datos, nombre="entrega.pdf"):
+    respuesta = cliente.post(
+        f"/entregas?idtarea={idtarea}&idestudiante=1",
+        files={"archivo": (nombre, datos, "application/pdf")},
+    )
+    assert respuesta.status_code == 200
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _texto(clave, valor):
+    conn = abrir_lectura()
+    try:
+        return conn.execute(
+            f"SELECT * FROM TextosArchivos WHERE {clave} = ?", (valor,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def _buscar(cliente, idtarea):
+    respuesta = cliente.get(f"/entregas/buscar?q=varchar&idtarea={idtarea}")
+    assert respuesta.status_code == 200
+    return respuesta.json()["datos"]
+
+
+def test_indexa_entregas_nuevas_y_antiguas(cliente):
+    huella = _subir(cliente, 901, PDF)
+    no_pdf = _subir(cliente, 901, b"no es un pdf", "notas.txt")
+
+    # entrega anterior al almacén por contenido: sin hash, en pdf/<nombre>
+    (Path(DIRECTORIO_PDF) / "antigua.pdf").write_bytes(PDF)
+    identrega = get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Entregas (fecha_entrega, nombre_archivo, idtarea, idestudiante) "
+            "VALUES ('2020-03-01', 'antigua.pdf', 902, 1)"
+        ).lastrowid
+    )
+
+    resumen = extraccion.extraer_pendientes()
+    assert resumen["extraidos"] >= 2 and resumen["errores"] >= 1
+
+    assert _texto("hash", huella)["caracteres"] > 0
+    error = _texto("hash", no_pdf)
+    assert error["error"] == "El archivo no es un PDF"
+    assert error["reintentar_desde"] is None
+    assert [r["hash_archivo"] for r in _buscar(cliente, 901)] == [huella]
+    antiguas = _buscar(cliente, 902)
+    assert [r["identrega"] for r in antiguas] == [identrega]
+    assert "<b>varchar</b>" in antiguas[0]["fragmento"]
+
+    # sin entregas que lo usen, el texto del archivo antiguo se borra
+    get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "DELETE FROM Entregas WHERE identrega = ?", (identrega,)
+        )
+    )
+    assert _texto("nombre_archivo", "antigua.pdf") is None
+    assert _buscar(cliente, 902) == []
+
+
+def test_error_pasajero_se_reintenta(cliente):
+    huella = _subir(cliente, 903, PDF + b"\n% copia\n")
+    blob = ruta_blob(huella)
+    apartado = blob.with_suffix(".apartado")
+    blob.rename(apartado)
+
+    resumen = extraccion.extraer_pendientes()
+    assert resumen["reintentos"] == 1
+    fila = _texto("hash", huella)
+    assert fila["error"] and fila["intentos"] == 1
+    assert fila["reintentar_desde"] > time.time()
+    # hasta que venza la espera no se vuelve a intentar
+    assert extraccion.extraer_pendientes()["reintentos"] == 0
+
+    apartado.rename(blob)
+    get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "UPDATE TextosArchivos SET reintentar_desde = 0 WHERE hash = ?", (huella,)
+        )
+    )
+    assert extraccion.extraer_pendientes()["extraidos"] == 1
+    fila = _texto("hash", huella)
+    assert fila["error"] is None and fila["intentos"] == 2
+    assert fila["reintentar_desde"] is None
+    assert [r["hash_archivo"] for r in _buscar(cliente, 903)] == [huella]
+
+
+def test_errores_definitivos_se_listan_y_se_reintentan(cliente):
+    no_pdf = _subir(cliente, 904, b"tampoco es un pdf", "otro.txt")
+    extraccion.extraer_pendientes()
+
+    errores = cliente.get("/entregas/textos/errores").json()
+    assert {
+        "hash": no_pdf,
+        "nombre_archivo": None,
+        "error": "El archivo no es un PDF",
+        "intentos": 1,
+        "fecha_extraccion": _texto("hash", no_pdf)["fecha_extraccion"],
+    } in errores
+
+    respuesta = cliente.post("/entregas/textos/reintentar")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["archivos"] >= 1
+    fila = _texto("hash", no_pdf)
+    assert fila["reintentar_desde"] == 0 and fila["intentos"] == 0
+    assert no_pdf not in [
+        e["hash"] for e in cliente.get("/entregas/textos/errores").json()
+    ]
+
+    assert extraccion.extraer_pendientes()["errores"] >= 1
+    fila = _texto("hash", no_pdf)
+    assert fila["intentos"] == 1 and fila["reintentar_desde"] is None
@@ -0,0 +1,58 @@
+import io
+import json
+
+from escritor import get_escritor
+from importacion import importar_roster, leer_roster
+
+ROSTER = (
+    "\ufeffnombre;dni;idclase;contrasena\n"
+    "Ana;imp-1;8401;clave1\n"
+    "Beto;;8401;clave2\n"
+    "Caro;imp-2;tercero;clave3\n"
+    "Dani;imp-1;8401;clave4\n"
+    "Eva;imp-3;8401;clave5\n"
+).encode("utf-8")
+
+
+def test_importa_csv_con_errores_por_linea(cliente):
+    respuesta = cliente.post(
+        "/estudiantes/importar",
+        files={"archivo": ("roster.csv", ROSTER, "text/csv")},
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    resumen = json.loads(respuesta.text.splitlines()[-1])
+    assert resumen["terminado"] is True
+    assert (resumen["procesadas"], resumen["creadas"], resumen["errores"]) == (5, 2, 3)
+    assert resumen["detalle_errores"] == [
+        {"linea": 3, "error": "Columnas vacías: dni"},
+        {"linea": 4, "error": "idclase debe ser un número"},
+        {"linea": 5, "error": "dni imp-1 ya registrado"},
+    ]
+
+    estudiantes = cliente.get("/estudiantes", params={"idclase": 8401}).json()
+    assert [e["nombre"] for e in estudiantes["datos"]] == ["Ana", "Eva"]
+    login = cliente.post("/login", json={"dni": "imp-3", "contrasena": "clave5"})
+    assert login.status_code == 200
+
+
+def test_faltan_columnas(cliente):
+    respuesta = cliente.post(
+        "/estudiantes/importar",
+        files={"archivo": ("roster.csv", b"nombre,dni\nAna,1\n", "text/csv")},
+    )
+    assert respuesta.status_code == 400
+    assert "idclase" in respuesta.json()["detail"]
+
+
+def test_confirma_por_bloques(cliente):
+    filas = "".join(f"Alumno {i},blq-{i},8402,clave\n" for i in range(5))
+    roster = leer_roster(io.BytesIO(f"nombre,dni,idclase,contrasena\n{filas}".encode()))
+    avance = list(importar_roster(roster, get_escritor(), tamano_bloque=2))
+    # un avance por bloque completo y el resumen final
+    assert [(a["procesadas"], a["creadas"]) for a in avance] == [
+        (2, 2),
+        (4, 4),
+        (5, 5),
+    ]
+    assert avance[-1]["terminado"] is True and avance[-1]["detalle_errores"] == []
@@ -0,0 +1,57 @@
+from escritor import get_escritor
+
+
+def _clases(idprofesor, nombres):
+    def _crear(conn):
+        return [
+            conn.execute(
+                "INSERT INTO Clases (nombre, idprofesor) VALUES (?, ?)",
+                (nombre, idprofesor),
+            ).lastrowid
+            for nombre in nombres
+        ]
+
+    return get_escritor().ejecutar(_crear)
+
+
+def test_paginacion_por_cursor(cliente):
+    ids = _clases(8101, ["A", "B", "C", "D", "E"])
+    vistos = []
+    cursor = None
+    paginas = 0
+    while True:
+        parametros = {"idprofesor": 8101, "limite": 2}
+        if cursor is not None:
+            parametros["cursor"] = cursor
+        pagina = cliente.get("/clases", params=parametros).json()
+        vistos += [clase["idclase"] for clase in pagina["datos"]]
+        paginas += 1
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            break
+        assert cursor == vistos[-1]
+    assert vistos == ids
+    assert paginas == 3
+
+
+def test_fields_y_filtros(cliente):
+    (idclase,) = _clases(8102, ["Historia"])
+    datos = cliente.get(
+        "/clases", params={"idprofesor": 8102, "fields": "nombre"}
+    ).json()["datos"]
+    # la clave primaria siempre viene
+    assert datos == [{"idclase": idclase, "nombre": "Historia"}]
+
+    # los parámetros que no son columnas se ignoran
+    datos = cliente.get("/clases", params={"idprofesor": 8102, "otro": "x"}).json()[
+        "datos"
+    ]
+    assert [clase["idclase"] for clase in datos] == [idclase]
+
+
+def test_parametros_invalidos(cliente):
+    respuesta = cliente.get("/clases", params={"fields": "nombre,clave"})
+    assert respuesta.status_code == 400
+    assert "clave" in respuesta.json()["detail"]
+    assert cliente.get("/clases", params={"limite": 0}).status_code == 400
+    assert cliente.get("/clases", params={"limite": 501}).status_code == 400
@@ -0,0 +1,93 @@
+def test_elementos_que_no_son_objetos_tienen_su_propio_error(cliente):
+    respuesta = cliente.post(
+        "/usuarios/bulk",
+        json=[
+            {
+                "dni": "55443322",
+                "nombre": "Ana",
+                "apellido": "Lote",
+                "contrasena": "secreta123",
+                "rol": "admin",
+            },
+            5,
+            "texto",
+            [1, 2],
+            None,
+        ],
+    )
+    assert respuesta.status_code == 200
+    resultados = respuesta.json()["resultados"]
+    assert [r["indice"] for r in resultados] == [0, 1, 2, 3, 4]
+    assert resultados[0]["ok"] is True
+    for resultado in resultados[1:]:
+        assert resultado == {
+            "indice": resultado["indice"],
+            "ok": False,
+            "error": "Se esperaba un objeto",
+        }
+
+
+def test_lote_de_tareas_con_elemento_invalido(cliente):
+    respuesta = cliente.post("/tareas/bulk", json=[7])
+    assert respuesta.status_code == 200
+    assert respuesta.json()["resultados"] == [
+        {"indice": 0, "ok": False, "error": "Se esperaba un objeto"}
+    ]
+
+
+def test_cuerpo_que_no_es_lista_sigue_siendo_422(cliente):
+    assert cliente.post("/estudiantes/bulk", json={"nombre": "x"}).status_code == 422
+
+
+def test_put_por_lotes_con_elementos_invalidos(cliente):
+    creado = cliente.post(
+        "/usuarios/bulk",
+        json=[
+            {
+                "dni": "55443311",
+                "nombre": "Beto",
+                "apellido": "Lote",
+                "contrasena": "secreta123",
+                "rol": "admin",
+            }
+        ],
+    ).json()["resultados"][0]["id"]
+
+    respuesta = cliente.put(
+        "/usuarios/bulk",
+        json=[
+            "texto",
+            {
+                "idusuario": creado,
+                "dni": "55443311",
+                "contrasena": "otra-clave",
+                "rol": "profesor",
+            },
+            {"idusuario": creado},
+            {
+                "idusuario": 999999,
+                "dni": "1",
+                "contrasena": "x",
+                "rol": "admin",
+            },
+        ],
+    )
+    assert respuesta.status_code == 200
+    resultados = respuesta.json()["resultados"]
+    assert resultados[0] == {"indice": 0, "ok": False, "error": "Se esperaba un objeto"}
+    assert resultados[1] == {"indice": 1, "id": creado, "ok": True}
+    assert resultados[2]["indice"] == 2 and resultados[2]["ok"] is False
+    assert "dni" in resultados[2]["error"]
+    assert resultados[3] == {
+        "indice": 3,
+        "id": 999999,
+        "ok": False,
+        "error": "No encontrado",
+    }
+
+
+def test_put_por_lotes_solo_invalidos(cliente):
+    for ruta in ("/estudiantes/bulk", "/tareas/bulk"):
+        respuesta = cliente.put(ruta, json=[1, None])
+        assert respuesta.status_code == 200
+        assert [r["ok"] for r in respuesta.json()["resultados"]] == [False, False]
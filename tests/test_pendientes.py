@@ -0,0 +1,98 @@
+from datetime import date
+
+from escritor import get_escritor
+
+
+def _profesor_con_clase(cantidad_estudiantes):
+    def _crear(conn):
+        idprofesor = conn.execute(
+            "INSERT INTO Profesores (nombre, dni) VALUES ('Corrige', 'p')"
+        ).lastrowid
+        idclase = conn.execute(
+            "INSERT INTO Clases (nombre, idprofesor) VALUES ('Pendientes', ?)",
+            (idprofesor,),
+        ).lastrowid
+        estudiantes = [
+            conn.execute(
+                "INSERT INTO Estudiantes (nombre, dni, idclase) VALUES (?, 'e', ?)",
+                (f"Estudiante {i}", idclase),
+            ).lastrowid
+            for i in range(cantidad_estudiantes)
+        ]
+        return idprofesor, idclase, estudiantes
+
+    return get_escritor().ejecutar(_crear)
+
+
+def _entregar(cliente, idtarea, idestudiante, contenido):
+    cliente.post(
+        f"/entregas?idtarea={idtarea}&idestudiante={idestudiante}",
+        files={"archivo": ("tp.pdf", contenido, "application/pdf")},
+    )
+
+
+def test_contadores_y_cola_de_correccion(cliente):
+    idprofesor, idclase, estudiantes = _profesor_con_clase(3)
+    idplantilla = cliente.post(
+        "/tareas/comun",
+        json={
+            "nombre_tarea": "Vencida",
+            "instrucciones": "-",
+            "fecha_vencimiento": "2000-01-01",
+            "idclase": idclase,
+            "estado": "pendiente",
+        },
+    ).json()["idplantilla"]
+    tareas = {
+        t["idestudiante"]: t["idtarea"]
+        for t in cliente.get("/tareas", params={"idplantilla": idplantilla}).json()[
+            "datos"
+        ]
+    }
+    primero, segundo, _ = estudiantes
+    _entregar(cliente, tareas[primero], primero, b"%PDF-1.4 pendientes 1")
+    _entregar(cliente, tareas[segundo], segundo, b"%PDF-1.4 pendientes 2")
+
+    pendientes = cliente.get(f"/profesores/{idprofesor}/pendientes").json()
+    # la tarea común aparece una vez, con los contadores de todas sus tareas
+    assert [
+        (
+            t["idplantilla"],
+            t["asignadas"],
+            t["entregadas"],
+            t["pendientes"],
+            t["tardias"],
+        )
+        for t in pendientes["tareas"]
+    ] == [(idplantilla, 3, 2, 1, 2)]
+    por_revisar = pendientes["por_revisar"]
+    assert [e["idtarea"] for e in por_revisar] == [tareas[primero], tareas[segundo]]
+    assert all(e["tardia"] and e["nombre_tarea"] == "Vencida" for e in por_revisar)
+
+    # corregida: sale de la cola pero sigue contando como entregada
+    cliente.post(
+        "/cambios_estado",
+        json={
+            "idtarea": tareas[primero],
+            "nuevo_estado": "calificado",
+            "fecha_cambio": date.today().isoformat(),
+        },
+    )
+    pendientes = cliente.get(f"/profesores/{idprofesor}/pendientes").json()
+    assert [e["idtarea"] for e in pendientes["por_revisar"]] == [tareas[segundo]]
+    assert pendientes["tareas"][0]["entregadas"] == 2
+
+    # borrar la entrega actualiza los contadores
+    identrega = pendientes["por_revisar"][0]["identrega"]
+    cliente.delete(f"/entregas/{identrega}")
+    pendientes = cliente.get(f"/profesores/{idprofesor}/pendientes").json()
+    assert pendientes["tareas"][0]["entregadas"] == 1
+    assert pendientes["por_revisar"] == []
+
+
+def test_pendientes_de_profesor_inexistente(cliente):
+    assert cliente.get("/profesores/987654/pendientes").status_code == 404
+    assert (
+        cliente.get("/profesores/987654/pendientes", params={"limite": 0}).status_code
+        == 400
+    )
@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import seguridad
+
+
+@pytest.fixture
+def un_hilo_de_hash(monkeypatch):
+    # pool de hashing nuevo con un solo hilo: el caso en que un trabajo que
+    # espera a otro del mismo pool se bloquea para siempre
+    monkeypatch.setattr(seguridad, "HILOS_HASH", 1)
+    monkeypatch.setattr(seguridad, "_pool_hash", None)
+    yield
+    if seguridad._pool_hash is not None:
+        seguridad._pool_hash.shutdown()
+
+
+def test_hashear_y_verificar():
+    huella = seguridad.hashear_contrasena("secreta")
+    assert seguridad.es_hash(huella)
+    assert seguridad.verificar_contrasena("secreta", huella)
+    assert not seguridad.verificar_contrasena("otra", huella)
+    # contraseñas anteriores a los hashes, en texto plano
+    assert seguridad.verificar_contrasena("plana", "plana")
+
+
+def test_lotes_concurrentes_con_un_hilo(un_hilo_de_hash):
+    async def lotes():
+        return await asyncio.wait_for(
+            asyncio.gather(
+                seguridad.hashear_lote_async(["a", "b"]),
+                seguridad.hashear_lote_async(["c"]),
+                seguridad.verificar_async("x", seguridad.HASH_FICTICIO),
+            ),
+            timeout=30,
+        )
+
+    primero, segundo, verificado = asyncio.run(lotes())
+    assert len(primero) == 2 and len(segundo) == 1
+    assert seguridad.verificar_contrasena("c", segundo[0])
+    assert verificado is False
+
+
+def test_bulk_concurrentes_con_un_hilo(un_hilo_de_hash, cliente):
+    def crear(prefijo):
+        return cliente.post(
+            "/usuarios/bulk",
+            json=[
+                {"dni": f"{prefijo}{i}", "contrasena": "clave", "rol": "estudiante"}
+                for i in range(3)
+            ],
+        )
+
+    with ThreadPoolExecutor(2) as hilos:
+        pedidos = [hilos.submit(crear, prefijo) for prefijo in ("bulk-a-", "bulk-b-")]
+        respuestas = [pedido.result(timeout=60) for pedido in pedidos]
+
+    for respuesta in respuestas:
+        assert respuesta.status_code == 200
+        assert all("id" in r for r in respuesta.json()["resultados"])
+    # el login sigue respondiendo después de los lotes
+    login = cliente.post("/login", json={"dni": "bulk-a-0", "contrasena": "clave"})
+    assert login.status_code == 200
+
+
+def test_login_con_contrasena_incorrecta(cliente):
+    creado = cliente.post(
+        "/usuarios/bulk",
+        json=[{"dni": "login-1", "contrasena": "clave", "rol": "profesor"}],
+    )
+    assert creado.status_code == 200
+
+    for dni, contrasena in (("login-1", "otra"), ("no-existe", "clave")):
+        respuesta = cliente.post("/login", json={"dni": dni, "contrasena": contrasena})
+        assert respuesta.status_code == 401
+        assert respuesta.headers["WWW-Authenticate"] == "Bearer"
+
+    token = cliente.post(
+        "/login", json={"dni": "login-1", "contrasena": "clave"}
+    ).json()["token"]
+    sesion = cliente.get("/sesion", headers={"Authorization": f"Bearer {token}"})
+    assert sesion.status_code == 200 and sesion.json()["rol"] == "profesor"
+    assert cliente.get("/sesion").status_code == 401
@@ -0,0 +1,64 @@
+from escritor import get_escritor
+
+
+def _estudiante(nombre):
+    return get_escritor().ejecutar(
+        lambda conn: conn.execute(
+            "INSERT INTO Estudiantes (nombre, dni, idclase) VALUES (?, 'x', 8601)",
+            (nombre,),
+        ).lastrowid
+    )
+
+
+def _tarea(cliente, idestudiante, nombre, vence):
+    cliente.post(
+        "/tareas",
+        json={
+            "nombre_tarea": nombre,
+            "instrucciones": "-",
+            "fecha_vencimiento": vence,
+            "idclase": 8601,
+            "idestudiante": idestudiante,
+            "estado": "pendiente",
+        },
+    )
+    datos = cliente.get(
+        "/tareas", params={"idestudiante": idestudiante, "nombre_tarea": nombre}
+    ).json()["datos"]
+    return datos[0]["idtarea"]
+
+
+def _entregar(cliente, idtarea, idestudiante, contenido):
+    cliente.post(
+        f"/entregas?idtarea={idtarea}&idestudiante={idestudiante}",
+        files={"archivo": ("tp.pdf", contenido, "application/pdf")},
+    )
+
+
+def test_tablero_con_ultima_entrega_y_ultimo_cambio(cliente):
+    idestudiante = _estudiante("Tablero")
+    tardia = _tarea(cliente, idestudiante, "Informe", "2030-02-01")
+    temprana = _tarea(cliente, idestudiante, "Cuestionario", "2030-01-01")
+    _entregar(cliente, tardia, idestudiante, b"%PDF-1.4 primera")
+    _entregar(cliente, tardia, idestudiante, b"%PDF-1.4 segunda")
+    # una entrega de otro estudiante a la misma tarea no cuenta
+    _entregar(cliente, tardia, idestudiante + 1000, b"%PDF-1.4 ajena")
+
+    respuesta = cliente.get(f"/estudiantes/{idestudiante}/dashboard")
+    assert respuesta.status_code == 200
+    tablero = respuesta.json()
+    assert tablero["estudiante"]["nombre"] == "Tablero"
+    # ordenadas por vencimiento
+    assert [t["idtarea"] for t in tablero["tareas"]] == [temprana, tardia]
+
+    sin_entrega, con_entrega = tablero["tareas"]
+    assert sin_entrega["entrega"] is None and sin_entrega["ultimo_cambio"] is None
+    entregas = cliente.get(
+        "/entregas", params={"idtarea": tardia, "idestudiante": idestudiante}
+    ).json()["datos"]
+    assert con_entrega["entrega"]["identrega"] == max(e["identrega"] for e in entregas)
+    assert con_entrega["ultimo_cambio"]["nuevo_estado"] == "entregado"
+
+
+def test_tablero_de_estudiante_inexistente(cliente):
+    assert cliente.get("/estudiantes/987654/dashboard").status_code == 404
@@ -0,0 +1,86 @@
+import sqlite3
+
+from escritor import get_escritor
+from migraciones import migrar
+
+
+def _estudiantes(idclase, cantidad):
+    def _crear(conn):
+        return [
+            conn.execute(
+                "INSERT INTO Estudiantes (nombre, dni, idclase) VALUES (?, ?, ?)",
+                (f"Estudiante {i}", str(i), idclase),
+            ).lastrowid
+            for i in range(cantidad)
+        ]
+
+    return get_escritor().ejecutar(_crear)
+
+
+def test_tarea_comun_asigna_una_tarea_por_estudiante(cliente):
+    estudiantes = _estudiantes(8301, 4)
+    respuesta = cliente.post(
+        "/tareas/comun",
+        json={
+            "nombre_tarea": "Lectura del capitulo 3",
+            "instrucciones": "Leer y resumir",
+            "fecha_vencimiento": "2030-04-01",
+            "idclase": 8301,
+            "estado": "pendiente",
+        },
+    )
+    assert respuesta.status_code == 201
+    cuerpo = respuesta.json()
+    assert cuerpo["tareas"] == 4
+
+    tareas = cliente.get("/tareas", params={"idplantilla": cuerpo["idplantilla"]})
+    datos = tareas.json()["datos"]
+    assert sorted(tarea["idestudiante"] for tarea in datos) == estudiantes
+    # las lecturas toman los datos compartidos de la plantilla
+    assert {
+        (t["nombre_tarea"], t["instrucciones"], t["fecha_vencimiento"]) for t in datos
+    } == {("Lectura del capitulo 3", "Leer y resumir", "2030-04-01")}
+
+    propias = cliente.get(f"/tareas_estudiante/{estudiantes[0]}").json()
+    assert [tarea["nombre_tarea"] for tarea in propias] == ["Lectura del capitulo 3"]
+
+
+def test_migracion_agrupa_tareas_repetidas(tmp_path):
+    base = str(tmp_path / "plantillas.db")
+    migrar(base, hasta=2)
+    conn = sqlite3.connect(base)
+    with conn:
+        conn.executemany(
+            "INSERT INTO Tareas (nombre_tarea, instrucciones, fecha_vencimiento, idclase, idestudiante, estado) VALUES (?, ?, ?, ?, ?, 'pendiente')",
+            [
+                ("Mapa", "Dibujar", "2024-05-01", 1, 1),
+                ("Mapa", "Dibujar", "2024-05-01", 1, 2),
+                ("Mapa", "Dibujar", "2024-05-01", 2, 3),
+                ("Ensayo", "Escribir", "2024-06-01", 1, 1),
+            ],
+        )
+    conn.close()
+    migrar(base, hasta=3)
+
+    conn = sqlite3.connect(base)
+    try:
+        plantillas = conn.execute(
+            "SELECT idplantilla, nombre_tarea, idclase FROM PlantillasTarea"
+        ).fetchall()
+        assert [(nombre, idclase) for _, nombre, idclase in plantillas] == [("Mapa", 1)]
+        filas = conn.execute(
+            "SELECT idestudiante, nombre_tarea, idplantilla FROM Tareas ORDER BY idtarea"
+        ).fetchall()
+        idplantilla = plantillas[0][0]
+        # las repetidas quedan sin datos propios; las únicas no cambian
+        assert filas == [
+            (1, None, idplantilla),
+            (2, None, idplantilla),
+            (3, "Mapa", None),
+            (1, "Ensayo", None),
+        ]
+        assert conn.execute(
+            "SELECT nombre_tarea FROM VistaTareas WHERE idtarea = 1"
+        ).fetchone() == ("Mapa",)
+    finally:
+        conn.close()
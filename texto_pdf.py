@@ -0,0 +1,34 @@
+import re
+
+from pypdf import PdfReader
+
+# Este módulo corre en los procesos del pool de extracción: solo importa
+# pypdf y la biblioteca estándar.
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def es_pdf(ruta):
+    with open(ruta, "rb") as archivo:
+        return b"%PDF-" in archivo.read(1024)
+
+
+def extraer_texto(ruta, maximo):
+    """
+    Texto de un PDF, página por página, con los espacios normalizados y
+    cortado a `maximo` caracteres. Devuelve (texto, paginas). Los PDF
+    escaneados o con el texto convertido en curvas devuelven texto vacío.
+    """
+    if not es_pdf(ruta):
+        raise ValueError("El archivo no es un PDF")
+    lector = PdfReader(ruta)
+    partes = []
+    total = 0
+    for pagina in lector.pages:
+        texto = pagina.extract_text() or ""
+        partes.append(texto)
+        total += len(texto)
+        if total >= maximo:
+            break
+    texto = _ESPACIOS.sub(" ", "\n".join(partes).replace("\x00", "")).strip()
+    return texto[:maximo], len(lector.pages)